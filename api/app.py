@@ -1,15 +1,37 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Blueprint, Response, request, jsonify, send_from_directory
 import threading
+import concurrent.futures
+import csv
+import io
 import ipaddress
 import json
+import math
 import os
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
 from functools import wraps
-from modules.scanner import NetworkScanner
-from modules.db import DatabaseManager
+from modules.scanner import NetworkScanner, ProbeBudget
+from modules.db import PortResultBuffer, create_database_manager
+from modules.webhooks import WebhookDispatcher
+from modules.planner import ScanPlanner
+from modules.scheduler import ScanScheduler
+from modules.fingerprint import ServiceFingerprinter
+from modules.liveness import HostLiveness
+from modules.sweep import StatelessSweep, TargetSpace
+from modules.packetio import parse_sources, resolve_sources
+from modules.estimator import ScanEstimator
+from modules.export import ParquetExporter, parse_timestamp
 
-app = Flask(__name__)
-db_manager = DatabaseManager()
+# Routes are registered on a blueprint so that create_app() can build one app
+# per WSGI worker process. The services below are built at import time but only
+# read their settings; connections are opened on first use, and the schema
+# setup and scheduler start are left to create_app()
+api = Blueprint('api', __name__)
+db_manager = create_database_manager()
+webhook_dispatcher = WebhookDispatcher(db_manager)
+host_liveness = HostLiveness(db_manager)
+scan_estimator = ScanEstimator(db_manager, host_liveness)
+parquet_exporter = ParquetExporter(db_manager)
 
 # Security middleware for API key authentication
 def require_api_key(f):
@@ -30,45 +52,33 @@ def require_api_key(f):
     return decorated_function
 
 # Add CORS support for integration with web applications and automation tools
-@app.after_request
+@api.after_app_request
 def add_cors_headers(response):
     # Check if automation friendly mode is enabled
     if os.environ.get('AUTOMATION_FRIENDLY', 'false').lower() == 'true':
         response.headers['Access-Control-Allow-Origin'] = '*'
-        response.headers['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
+        response.headers['Access-Control-Allow-Methods'] = 'GET, POST, DELETE, OPTIONS'
         response.headers['Access-Control-Allow-Headers'] = 'Content-Type, X-API-Key, x-api-key'
     return response
 
 # Handle OPTIONS requests for CORS preflight
-@app.route('/', defaults={'path': ''}, methods=['OPTIONS'])
-@app.route('/<path:path>', methods=['OPTIONS'])
+@api.route('/', defaults={'path': ''}, methods=['OPTIONS'])
+@api.route('/<path:path>', methods=['OPTIONS'])
 def handle_options(path):
     return '', 204
 
-# Initialize database when the app starts
-@app.before_first_request
-def init_app():
-    db_manager.init_db()
+# Safety limits
+MAX_PORTS_PER_SCAN = 10000  # Maximum number of ports allowed in a single scan
+MAX_TARGETS_PER_GROUP = int(os.environ.get('BULK_MAX_TARGETS', 65536))  # Maximum hosts in one bulk submission
+MAX_BATCH_KEYS = 10000  # Maximum scan IDs plus targets in one batch results query
+MAX_SWEEP_HOSTS = int(os.environ.get('SWEEP_MAX_HOSTS', 1 << 20))  # Maximum hosts in one stateless sweep (a /12)
+PASSIVE_MAX_AGE = float(os.environ.get('PASSIVE_MAX_AGE', 900))  # Seconds a passive sighting spares a host from ARP
 
-@app.route('/api/scan/ports', methods=['POST'])
-@require_api_key
-def scan_ports():
-    data = request.json
-    target_ip = data.get('target')
-    ports_input = data.get('ports', [])
-    scan_type = data.get('scan_type', 'stealth')
-    timeout = data.get('timeout', 1)
-    
-    # Safety limits
-    MAX_PORTS_PER_SCAN = 10000  # Maximum number of ports allowed in a single scan
-    
-    # Validate input
-    try:
-        ipaddress.ip_address(target_ip)
-    except ValueError:
-        return jsonify({"error": "Invalid IP address"}), 400
-    
-    # Parse port specifications (both individual ports and ranges)
+def parse_ports(ports_input, limit_ranges=True):
+    """
+    Parse port specifications (individual ports and "start-end" ranges) into a
+    sorted list of unique ports. Raises ValueError with a user-facing message.
+    """
     ports = []
     
     # Convert to list if it's not already
@@ -89,71 +99,546 @@ def scan_ports():
         if '-' in port_str:
             try:
                 start, end = map(int, port_str.split('-', 1))
-                
-                # Safety check for port range size
-                range_size = end - start + 1
-                if range_size > MAX_PORTS_PER_SCAN:
-                    return jsonify({
-                        "error": f"Port range {start}-{end} contains {range_size} ports, which exceeds the maximum of {MAX_PORTS_PER_SCAN} ports per scan. Please use a smaller range or multiple scans."
-                    }), 400
-                
-                ports.extend(range(start, end + 1))  # +1 to include the end port
             except ValueError:
-                return jsonify({"error": f"Invalid port range format: {port_str}"}), 400
+                raise ValueError(f"Invalid port range format: {port_str}")
+            
+            # Safety check for port range size
+            range_size = end - start + 1
+            if limit_ranges and range_size > MAX_PORTS_PER_SCAN:
+                raise ValueError(
+                    f"Port range {start}-{end} contains {range_size} ports, which exceeds the maximum of {MAX_PORTS_PER_SCAN} ports per scan. Please use a smaller range or multiple scans."
+                )
+            
+            ports.extend(range(start, end + 1))  # +1 to include the end port
         else:
             # Try to parse as a single port number
             try:
                 ports.append(int(port_str))
             except ValueError:
-                return jsonify({"error": f"Invalid port specification: {port_str}"}), 400
+                raise ValueError(f"Invalid port specification: {port_str}")
     
     # Validate ports
     if not ports:
-        return jsonify({"error": "No valid ports specified"}), 400
+        raise ValueError("No valid ports specified")
     
     # Remove any duplicate ports and ensure they're all in valid range
     ports = sorted(list(set(ports)))
     
-    # Safety check for total ports count after removing duplicates
-    if len(ports) > MAX_PORTS_PER_SCAN:
-        return jsonify({
-            "error": f"Requested scan contains {len(ports)} ports, which exceeds the maximum of {MAX_PORTS_PER_SCAN} ports per scan. Please use a smaller range or multiple scans."
-        }), 400
-    
     invalid_ports = [p for p in ports if p < 1 or p > 65535]
     if invalid_ports:
-        return jsonify({"error": f"Invalid port numbers: {invalid_ports}. Ports must be between 1 and 65535"}), 400
+        raise ValueError(f"Invalid port numbers: {invalid_ports}. Ports must be between 1 and 65535")
     
-    # Create scan record in database
-    scan_id = db_manager.create_scan(
-        f"port_scan_{scan_type}", target_ip, {"ports": ports, "timeout": timeout}
-    )
+    return ports
+
+def parse_targets(entries, limit=MAX_TARGETS_PER_GROUP):
+    """
+    Expand IP addresses and CIDR networks into a list of unique host addresses,
+    in submission order. Raises ValueError with a user-facing message.
+    """
+    targets = {}
     
-    # Start scanning in a separate thread
-    scan_thread = threading.Thread(
-        target=perform_port_scan,
-        args=(scan_id, target_ip, ports, scan_type, timeout)
-    )
-    scan_thread.start()
+    for entry in entries:
+        entry = str(entry).strip()
+        if not entry:
+            continue
+        try:
+            network = ipaddress.ip_network(entry, strict=False)
+        except ValueError:
+            raise ValueError(f"Invalid target: {entry}")
+        
+        # Check the size before expanding so a huge network is not materialized
+        if len(targets) + network.num_addresses > limit + 2:
+            raise ValueError(f"Too many targets: at most {limit} hosts can be submitted at once")
+        
+        hosts = [network.network_address] if network.num_addresses == 1 else network.hosts()
+        for host in hosts:
+            targets[str(host)] = None
+    
+    if not targets:
+        raise ValueError("No valid targets specified")
+    if len(targets) > limit:
+        raise ValueError(f"Too many targets: at most {limit} hosts can be submitted at once")
+    
+    return list(targets)
+
+def read_target_csv(upload):
+    """
+    Read targets from the first column of an uploaded CSV file, such as the
+    asset lists in docs/ip/. A header row is skipped.
+    """
+    rows = csv.reader(io.StringIO(upload.read().decode('utf-8-sig')))
+    entries = [row[0].strip() for row in rows if row and row[0].strip()]
+    
+    if entries:
+        try:
+            ipaddress.ip_network(entries[0], strict=False)
+        except ValueError:
+            entries = entries[1:]
+    return entries
+
+def parse_scan_sources(value, scan_type='stealth', local=None):
+    """
+    Validate the `sources` of a scan request: local IPv4 addresses and/or
+    interfaces to spread probes over (a list, or a comma-separated string).
+    Returns the entries, or None when not given. They are checked against
+    this host when it runs the scan; scanner workers check their own.
+    """
+    if value is None or value in ('', []):
+        return None
+    entries = value.split(',') if isinstance(value, str) else value
+    if not isinstance(entries, list):
+        raise ValueError("sources must be a list of IPv4 addresses and/or interface names")
+    if scan_type == 'connect':
+        raise ValueError("sources only apply to stealth and udp scans")
+    if local is None:
+        local = os.environ.get('SCAN_EXECUTION', 'local').lower() != 'queue'
+    (resolve_sources if local else parse_sources)(entries)
+    return [entry.strip() for entry in entries]
+
+def plan_port_scan(target_ip, ports, scan_type, timeout, mode='full', slices=None, check_limit=True):
+    """
+    Decide which ports a scan probes and the parameters recorded for it.
+    Returns (ports, scan_parameters, mode); mode falls back to "full" when a
+    recheck has no history to diff against.
+    """
+    scan_parameters = {"ports": ports, "timeout": timeout}
+    
+    # Differential rescan: only re-probe ports last seen open plus a rotating slice of the rest
+    if mode == 'recheck':
+        slices = slices or int(os.environ.get('RECHECK_SLICES', ScanPlanner.DEFAULT_RECHECK_SLICES))
+        last_open, last_slice_index = db_manager.get_last_known_open_ports(
+            target_ip, f"port_scan_{scan_type}", ports
+        )
+        
+        # Without history there is nothing to diff against, so run a full baseline
+        # (subject to the port limit below like any full scan)
+        if last_open is None:
+            mode = 'full'
+        else:
+            requested_count = len(ports)
+            ports, slice_index = ScanPlanner.plan_recheck(ports, last_open, last_slice_index, slices)
+            scan_parameters = {
+                "ports": ports,
+                "timeout": timeout,
+                "mode": "recheck",
+                "slice_index": slice_index,
+                "slices": slices,
+                "requested_port_count": requested_count
+            }
+    
+    # Safety check for total ports count after removing duplicates
+    if check_limit and len(ports) > MAX_PORTS_PER_SCAN:
+        raise ValueError(
+            f"Requested scan contains {len(ports)} ports, which exceeds the maximum of {MAX_PORTS_PER_SCAN} ports per scan. Please use a smaller range or multiple scans."
+        )
+    
+    return ports, scan_parameters, mode
+
+@api.route('/api/scan/ports', methods=['POST'])
+@require_api_key
+def scan_ports():
+    data = request.json
+    target_ip = data.get('target')
+    ports_input = data.get('ports', [])
+    scan_type = data.get('scan_type', 'stealth')
+    timeout = data.get('timeout', 1)
+    mode = data.get('mode', 'full')
+    slices = data.get('slices')
+    fingerprint = bool(data.get('fingerprint', False))
+    retries = data.get('retries', int(os.environ.get('SCAN_RETRIES', NetworkScanner.DEFAULT_RETRIES)))
+    
+    if not isinstance(retries, int) or not 0 <= retries <= 10:
+        return jsonify({"error": "retries must be an integer between 0 and 10"}), 400
+    
+    if mode not in ('full', 'recheck'):
+        return jsonify({"error": f"Invalid mode: {mode}. Use 'full' or 'recheck'"}), 400
+    
+    liveness = data.get('liveness', HostLiveness.default_policy())
+    if liveness not in HostLiveness.POLICIES:
+        return jsonify({"error": f"Invalid liveness policy: {liveness}. Use one of {list(HostLiveness.POLICIES)}"}), 400
+    
+    if slices is not None and (not isinstance(slices, int) or slices < 1):
+        return jsonify({"error": "slices must be a positive integer"}), 400
+    
+    # Validate input
+    try:
+        ipaddress.ip_address(target_ip)
+    except ValueError:
+        return jsonify({"error": "Invalid IP address"}), 400
+    
+    try:
+        sources = parse_scan_sources(data.get('sources'), scan_type)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    # Recheck scans only probe part of the range, so the limit applies after planning.
+    # A dry run reports oversized scans instead of rejecting them.
+    dry_run = bool(data.get('dry_run', False))
+    try:
+        ports = parse_ports(ports_input, limit_ranges=(mode != 'recheck' and not dry_run))
+        ports, scan_parameters, mode = plan_port_scan(
+            target_ip, ports, scan_type, timeout, mode, slices, check_limit=not dry_run
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    # Banner grabbing only applies to TCP scans
+    scan_options = {"fingerprint": fingerprint and scan_type != 'udp', "retries": retries}
+    if scan_options["fingerprint"]:
+        scan_parameters["fingerprint"] = True
+    # Recorded so estimates calibrate against the settings the scan ran with
+    scan_parameters["retries"] = retries
+    scan_parameters["backend"] = ScanEstimator.backend(scan_type, target_ip, sources)
+    if sources:
+        scan_options["sources"] = sources
+        scan_parameters["sources"] = sources
+    
+    # Reuse an identical scan that is still running or finished within the
+    # freshness window (0 = only in-flight scans), unless the caller forces a new one.
+    # A forced scan also runs against hosts believed to be down.
+    force = bool(data.get('force', False))
+    scan_options["liveness"] = "off" if force else liveness
+    scan_parameters["liveness"] = scan_options["liveness"]
+    freshness = data.get('freshness', int(os.environ.get('SCAN_FRESHNESS_WINDOW', 300)))
+    
+    if not isinstance(freshness, (int, float)) or freshness < 0:
+        return jsonify({"error": "freshness must be a non-negative number of seconds"}), 400
+    
+    if dry_run:
+        estimate = estimate_port_scan([target_ip], ports, scan_type, timeout, retries, scan_options["liveness"], sources)
+        estimate.update({"target": target_ip, "mode": mode})
+        return dry_run_response(estimate, len(ports), data.get('max_duration'))
+    
+    dedup_reason = None
+    if force:
+        scan_id = db_manager.create_scan(
+            f"port_scan_{scan_type}", target_ip, scan_parameters
+        )
+    else:
+        scan_id, dedup_reason = db_manager.create_scan_coalesced(
+            f"port_scan_{scan_type}", target_ip, scan_parameters, freshness
+        )
+    
+    if dedup_reason:
+        return jsonify({
+            "message": "Identical scan already in progress" if dedup_reason == "in_flight" else "Recent identical scan reused",
+            "scan_id": scan_id,
+            "deduplicated": True,
+            "dedup_reason": dedup_reason,
+            "timestamp": datetime.now().isoformat(),
+            "target": target_ip,
+            "ports": ports,
+            "port_count": len(ports)
+        })
+    
+    start_port_scan(scan_id, target_ip, ports, scan_type, timeout, scan_options)
     
     return jsonify({
         "message": "Scan started",
         "scan_id": scan_id,
+        "deduplicated": False,
+        "mode": mode,
         "timestamp": datetime.now().isoformat(),
         "target": target_ip,
         "ports": ports,
         "port_count": len(ports)
     })
 
-def perform_port_scan(scan_id, target_ip, ports, scan_type, timeout):
-    """Execute port scan in background thread and store results."""
+def estimate_port_scan(targets, ports, scan_type, timeout, retries, liveness, sources=None):
+    """Estimate a port scan the way it would be executed, without sending anything."""
+    queued = os.environ.get('SCAN_EXECUTION', 'local').lower() == 'queue'
+    if queued:
+        # Shards of every target are spread over the live scanner workers
+        shards = len(targets) * math.ceil(len(ports) / int(os.environ.get('SCAN_SHARD_SIZE', 1000)))
+        workers = db_manager.count_active_workers(int(os.environ.get('WORKER_STALE_AFTER', 60)))
+        concurrency = max(1, min(workers, shards))
+    else:
+        concurrency = min(int(os.environ.get('BULK_SCAN_CONCURRENCY', 8)), len(targets)) if len(targets) > 1 else 1
+    return scan_estimator.estimate(
+        targets, len(ports), scan_type, timeout, retries, liveness, concurrency, sharded=queued, sources=sources
+    )
+
+def dry_run_response(estimate, port_count, max_duration=None):
+    """
+    Answer a dry run with a scan estimate and how the scan would have to be
+    split to stay within the port limit and the optional `max_duration`.
+    """
+    parts = math.ceil(port_count / MAX_PORTS_PER_SCAN) if port_count else 1
+    if isinstance(max_duration, (int, float)) and max_duration > 0:
+        parts = max(parts, math.ceil(estimate["estimated_seconds"] / max_duration))
+    
+    estimate.update({
+        "dry_run": True,
+        "port_count": port_count,
+        "limits": {
+            "max_ports_per_scan": MAX_PORTS_PER_SCAN,
+            "max_duration": max_duration,
+            "within_limits": parts <= 1,
+            "suggested_parts": parts
+        },
+        "timestamp": datetime.now().isoformat()
+    })
+    return jsonify(estimate)
+
+def prioritize_ports(ports, scan_type):
+    """Order ports by the built-in frequency table and our own scan history."""
+    protocol = "TCP" if scan_type != 'udp' else "UDP"
+    learned = ScanPlanner.learned_port_frequency(db_manager, protocol)
+    return ScanPlanner.prioritize(ports, scan_type, learned)
+
+def start_port_scan(scan_id, target_ip, ports, scan_type, timeout, options=None, wait=False):
+    """
+    Run a port scan in this process, or queue it for scanner workers when
+    SCAN_EXECUTION=queue. With wait=True a local scan runs in the calling
+    thread, and a queued scan is waited for (up to SCAN_WAIT_TIMEOUT seconds).
+    """
+    if os.environ.get('SCAN_EXECUTION', 'local').lower() == 'queue':
+        # Shards are cut from the prioritized order, so the first shards hold the likeliest ports
+        db_manager.enqueue_scan_jobs(
+            scan_id, target_ip, prioritize_ports(ports, scan_type), scan_type, timeout,
+            int(os.environ.get('SCAN_SHARD_SIZE', 1000)), options
+        )
+        if wait:
+            wait_for_scan(scan_id, float(os.environ.get('SCAN_WAIT_TIMEOUT', 3600)))
+    elif wait:
+        perform_port_scan(scan_id, target_ip, ports, scan_type, timeout, options)
+    else:
+        # Start scanning in a separate thread
+        scan_thread = threading.Thread(
+            target=perform_port_scan,
+            args=(scan_id, target_ip, ports, scan_type, timeout, options)
+        )
+        scan_thread.start()
+
+def wait_for_scan(scan_id, max_wait, poll_interval=2):
+    """Poll until a scan is no longer running or `max_wait` seconds have passed. Returns its status."""
+    deadline = time.monotonic() + max_wait
+    while True:
+        try:
+            scan = db_manager.get_scan(scan_id)
+        except Exception as e:
+            print(f"Error polling scan {scan_id}: {e}")
+            scan = {"status": "running"}
+        if scan is None or scan['status'] != 'running':
+            return scan and scan['status']
+        if time.monotonic() >= deadline:
+            print(f"Stopped waiting for scan {scan_id} after {max_wait} seconds")
+            return 'running'
+        time.sleep(poll_interval)
+
+def perform_port_scan(scan_id, target_ip, ports, scan_type, timeout, options=None, budget=None):
+    """
+    Execute port scan in background thread and store results. `budget` is a
+    ProbeBudget shared with the other scans of a bulk group.
+    """
+    options = options or {}
     try:
-        results = NetworkScanner.scan_ports_async(scan_type, target_ip, ports, timeout)
-        db_manager.store_port_results(scan_id, target_ip, results, scan_type)
+        ports = prioritize_ports(ports, scan_type)
+        
+        # Hosts believed to be down are skipped, or get one fast pass when demoted
+        plan = host_liveness.plan(target_ip, ports, options.get("liveness"), scan_type)
+        if plan == "skip":
+            print(f"Skipping port scan {scan_id}: {target_ip} is not responding")
+            db_manager.complete_scan(scan_id, "skipped")
+            return
+        if plan == "demote":
+            timeout = min(timeout, NetworkScanner.FIRST_PASS_TIMEOUT)
+            options = {**options, "retries": 0}
+        
+        # Open ports are written in small batches as they are found, and
+        # fingerprinted while the rest of the scan is still running
+        result_buffer = PortResultBuffer(db_manager, scan_id, target_ip, scan_type)
+        fingerprinter = ServiceFingerprinter(target_ip) if options.get("fingerprint") else None
+        
+        def on_result(port, status):
+            result_buffer.on_result(port, status)
+            if fingerprinter:
+                fingerprinter.on_result(port, status)
+        
+        results = NetworkScanner.scan_ports_async(
+            scan_type, target_ip, ports, timeout,
+            on_result=on_result, retries=options.get("retries"), sources=options.get("sources"), budget=budget
+        )
+        result_buffer.close()
+        # A demoted scan's single short pass cannot tell closed ports from slow ones
+        if plan != "demote":
+            db_manager.remove_closed_exposure(target_ip, scan_type, results)
+        host_liveness.record_scan(target_ip, scan_type, results)
+        if fingerprinter:
+            db_manager.update_port_services(scan_id, fingerprinter.collect())
+        db_manager.complete_scan(scan_id)
+        webhook_dispatcher.notify_port_scan(scan_id, target_ip, ports, scan_type, results)
     except Exception as e:
         print(f"Error during port scan: {str(e)}")
+        db_manager.complete_scan(scan_id, "failed")
+
+@api.route('/api/scan/bulk', methods=['POST'])
+@require_api_key
+def scan_bulk():
+    """
+    Scan many targets with one request. Accepts JSON with a `targets` list of
+    IPs and CIDRs, or a multipart form with a CSV `file` of targets.
+    """
+    if request.files.get('file') is not None:
+        data = request.form
+        entries = read_target_csv(request.files['file'])
+        entries.extend(t for t in data.get('targets', '').split(',') if t.strip())
+        ports_input = [p for p in data.get('ports', '').split(',') if p.strip()]
+    else:
+        data = request.json or {}
+        entries = data.get('targets', [])
+        ports_input = data.get('ports', [])
+        if not isinstance(entries, list):
+            return jsonify({"error": "targets must be a list of IP addresses or CIDR networks"}), 400
+    
+    scan_type = data.get('scan_type', 'stealth')
+    fingerprint = str(data.get('fingerprint', False)).lower() in ('true', '1')
+    force = str(data.get('force', False)).lower() in ('true', '1')
+    liveness = data.get('liveness', HostLiveness.default_policy())
+    
+    if liveness not in HostLiveness.POLICIES:
+        return jsonify({"error": f"Invalid liveness policy: {liveness}. Use one of {list(HostLiveness.POLICIES)}"}), 400
+    
+    try:
+        timeout = float(data.get('timeout', 1))
+        retries = int(data.get('retries', os.environ.get('SCAN_RETRIES', NetworkScanner.DEFAULT_RETRIES)))
+    except (TypeError, ValueError):
+        return jsonify({"error": "timeout and retries must be numbers"}), 400
+    
+    if not math.isfinite(timeout) or timeout <= 0:
+        return jsonify({"error": "timeout must be a positive number of seconds"}), 400
+    
+    if not 0 <= retries <= 10:
+        return jsonify({"error": "retries must be an integer between 0 and 10"}), 400
+    
+    if scan_type not in ('stealth', 'connect', 'udp'):
+        return jsonify({"error": f"Invalid scan_type: {scan_type}"}), 400
+    
+    dry_run = str(data.get('dry_run', False)).lower() in ('true', '1')
+    
+    try:
+        targets = parse_targets(entries)
+        ports = parse_ports(ports_input, limit_ranges=not dry_run)
+        sources = parse_scan_sources(data.get('sources'), scan_type)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    if dry_run:
+        estimate = estimate_port_scan(targets, ports, scan_type, timeout, retries, "off" if force else liveness, sources)
+        # Per-target breakdowns are only returned for single-target dry runs
+        del estimate["targets"]
+        estimate["target_count"] = len(targets)
+        try:
+            max_duration = float(data['max_duration']) if data.get('max_duration') else None
+        except (TypeError, ValueError):
+            return jsonify({"error": "max_duration must be a number of seconds"}), 400
+        return dry_run_response(estimate, len(ports), max_duration)
+    
+    scan_options = {
+        "fingerprint": fingerprint and scan_type != 'udp',
+        "retries": retries,
+        "liveness": "off" if force else liveness
+    }
+    if sources:
+        scan_options["sources"] = sources
+    scan_parameters = {
+        "ports": ports,
+        "timeout": timeout,
+        "mode": "full",
+        "retries": retries,
+        "backend": ScanEstimator.backend(scan_type, targets[0], sources)
+    }
+    if scan_options["fingerprint"]:
+        scan_parameters["fingerprint"] = True
+    if sources:
+        scan_parameters["sources"] = sources
+    
+    # The group and every child scan (and their queue shards) are written in one transaction
+    jobs = None
+    if os.environ.get('SCAN_EXECUTION', 'local').lower() == 'queue':
+        jobs = {
+            "ports": prioritize_ports(ports, scan_type),
+            "scan_type": scan_type,
+            "timeout": timeout,
+            "shard_size": int(os.environ.get('SCAN_SHARD_SIZE', 1000)),
+            "options": scan_options
+        }
+    
+    group_id, children = db_manager.create_scan_group(f"port_scan_{scan_type}", targets, scan_parameters, jobs)
+    
+    if jobs is None:
+        group_thread = threading.Thread(
+            target=perform_group_scan,
+            args=(children, ports, scan_type, timeout, scan_options)
+        )
+        group_thread.daemon = True
+        group_thread.start()
+    
+    return jsonify({
+        "message": "Bulk scan started",
+        "group_id": group_id,
+        "target_count": len(children),
+        "scans": [{"scan_id": scan_id, "target": target} for scan_id, target in children],
+        "port_count": len(ports),
+        "timestamp": datetime.now().isoformat()
+    })
+
+def perform_group_scan(children, ports, scan_type, timeout, options=None):
+    """
+    Run every child scan of a group on one bounded pool instead of a thread
+    per target. BULK_SCAN_CONCURRENCY targets are scanned at a time, sharing
+    one ProbeBudget, so the group probes no faster than a single scan would.
+    """
+    max_targets = int(os.environ.get('BULK_SCAN_CONCURRENCY', 8))
+    
+    # Live and unknown hosts first, so dead ones do not hold up the rest of the group
+    if (options or {}).get("liveness", HostLiveness.default_policy()) != "off":
+        try:
+            children = host_liveness.order_targets(children, key=lambda child: child[1])
+        except Exception as e:
+            print(f"Error ordering targets by liveness: {e}")
+    
+    budget = ProbeBudget(min(max_targets, len(children)))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_targets) as executor:
+        for scan_id, target_ip in children:
+            executor.submit(perform_port_scan, scan_id, target_ip, ports, scan_type, timeout, options, budget)
+
+@api.route('/api/scan/groups/<int:group_id>', methods=['GET'])
+@require_api_key
+def get_scan_group(group_id):
+    """Get a bulk scan group and the progress of its child scans."""
+    consistent = request.args.get('consistent', '').lower() in ('true', '1')
+    group = db_manager.get_scan_group(group_id, consistent)
+    if group is None:
+        return jsonify({"error": "Scan group not found"}), 404
+    
+    if group.get('created_at'):
+        group['created_at'] = group['created_at'].isoformat()
+    group['finished'] = group['status_counts'].get('running', 0) == 0
+    
+    return jsonify(group)
 
-@app.route('/api/scan/hosts', methods=['POST'])
+def run_scheduled_scan(schedule, target_ip):
+    """Run one target of a recurring schedule to completion (called by the scheduler)."""
+    scan_type = schedule['scan_type']
+    timeout = schedule['timeout']
+    ports = parse_ports(schedule['ports'], limit_ranges=(schedule['mode'] != 'recheck'))
+    ports, scan_parameters, _ = plan_port_scan(target_ip, ports, scan_type, timeout, schedule['mode'])
+    scan_parameters["schedule_id"] = schedule['schedule_id']
+    scan_parameters["retries"] = NetworkScanner.DEFAULT_RETRIES
+    scan_parameters["backend"] = ScanEstimator.backend(scan_type, target_ip)
+    scan_parameters["liveness"] = HostLiveness.default_policy()
+    
+    scan_id, dedup_reason = db_manager.create_scan_coalesced(
+        f"port_scan_{scan_type}", target_ip, scan_parameters,
+        int(os.environ.get('SCAN_FRESHNESS_WINDOW', 300))
+    )
+    if dedup_reason is None:
+        start_port_scan(scan_id, target_ip, ports, scan_type, timeout, wait=True)
+
+scan_scheduler = ScanScheduler(db_manager, run_scheduled_scan)
+
+@api.route('/api/scan/hosts', methods=['POST'])
 @require_api_key
 def scan_hosts():
     data = request.json
@@ -165,13 +650,16 @@ def scan_hosts():
     except ValueError:
         return jsonify({"error": "Invalid network CIDR"}), 400
     
+    # Only ARP the addresses passive discovery has not seen recently
+    fill_gaps = str(data.get('fill_gaps', False)).lower() in ('true', '1')
+    
     # Create scan record
-    scan_id = db_manager.create_scan("host_discovery", network, {})
+    scan_id = db_manager.create_scan("host_discovery", network, {"fill_gaps": fill_gaps} if fill_gaps else {})
     
     # Start scanning in a separate thread
     scan_thread = threading.Thread(
         target=perform_host_scan,
-        args=(scan_id, network)
+        args=(scan_id, network, fill_gaps)
     )
     scan_thread.start()
     
@@ -181,22 +669,123 @@ def scan_hosts():
         "timestamp": datetime.now().isoformat()
     })
 
-def perform_host_scan(scan_id, network):
+def perform_host_scan(scan_id, network, fill_gaps=False):
     """Execute host discovery in background thread and store results."""
     try:
-        active_hosts = NetworkScanner.discover_hosts(network)
+        seen = []
+        if fill_gaps:
+            since = datetime.now() - timedelta(seconds=PASSIVE_MAX_AGE)
+            seen = [{"ip": host['ip'], "mac": host['mac']} for host in db_manager.get_host_inventory(network, since)]
+        active_hosts = seen + NetworkScanner.discover_hosts(network, exclude={host['ip'] for host in seen})
         db_manager.store_host_results(scan_id, active_hosts)
+        host_liveness.record_discovery(network, active_hosts)
+        db_manager.complete_scan(scan_id)
+        webhook_dispatcher.emit("scan.completed", {
+            "scan_id": scan_id,
+            "scan_type": "host_discovery",
+            "target": network,
+            "host_count": len(active_hosts)
+        })
     except Exception as e:
         print(f"Error during host scan: {str(e)}")
+        db_manager.complete_scan(scan_id, "failed")
 
-@app.route('/api/results', methods=['GET'])
+@api.route('/api/scan/sweep', methods=['POST'])
+@require_api_key
+def scan_sweep():
+    """
+    Stateless randomized SYN scan of the given ports on every host of one or
+    more networks, in a single scan record.
+    """
+    data = request.json or {}
+    entries = data.get('targets', [])
+    ports_input = data.get('ports', [])
+    rate = data.get('rate')
+    cooldown = data.get('cooldown')
+    
+    if not isinstance(entries, list) or not entries:
+        return jsonify({"error": "targets must be a non-empty list of IP addresses or CIDR networks"}), 400
+    if rate is not None and (not isinstance(rate, (int, float)) or rate <= 0):
+        return jsonify({"error": "rate must be a positive number of packets per second"}), 400
+    if cooldown is not None and (not isinstance(cooldown, (int, float)) or cooldown < 0):
+        return jsonify({"error": "cooldown must be a non-negative number of seconds"}), 400
+    
+    try:
+        ports = parse_ports(ports_input, limit_ranges=False)
+        space = TargetSpace(entries, ports)
+        # Sweeps always run on this host
+        sources = parse_scan_sources(data.get('sources'), local=True)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    if space.host_count > MAX_SWEEP_HOSTS:
+        return jsonify({"error": f"Too many hosts: at most {MAX_SWEEP_HOSTS} hosts can be swept at once"}), 400
+    
+    if data.get('dry_run'):
+        estimate = scan_estimator.estimate_sweep(space.host_count, len(ports), rate, cooldown, paths=len(sources or []) or 1)
+        estimate.update({
+            "dry_run": True,
+            "host_count": space.host_count,
+            "port_count": len(ports),
+            "available": StatelessSweep.available(),
+            "timestamp": datetime.now().isoformat()
+        })
+        return jsonify(estimate)
+    
+    if not StatelessSweep.available():
+        return jsonify({"error": "Stateless sweeps need raw packet access (Linux, CAP_NET_RAW)"}), 503
+    
+    target = ",".join(str(entry).strip() for entry in entries)
+    parameters = {"ports": ports, "rate": rate, "cooldown": cooldown}
+    if sources:
+        parameters["sources"] = sources
+    scan_id = db_manager.create_scan("port_sweep", target, parameters)
+    
+    sweep_thread = threading.Thread(
+        target=perform_sweep,
+        args=(scan_id, target, space, rate, cooldown, sources)
+    )
+    sweep_thread.start()
+    
+    return jsonify({
+        "message": "Sweep started",
+        "scan_id": scan_id,
+        "host_count": space.host_count,
+        "port_count": len(ports),
+        "probe_count": space.size,
+        "timestamp": datetime.now().isoformat()
+    })
+
+def perform_sweep(scan_id, target, space, rate=None, cooldown=None, sources=None):
+    """Run a stateless sweep in a background thread, storing open ports as replies arrive."""
+    try:
+        result_buffer = PortResultBuffer(db_manager, scan_id, None, "sweep")
+        counts = StatelessSweep(send_rate=rate, cooldown=cooldown).run(
+            space, on_result=result_buffer.on_target_result,
+            sources=resolve_sources(sources) if sources else None
+        )
+        result_buffer.close()
+        db_manager.complete_scan(scan_id)
+        webhook_dispatcher.emit("scan.completed", {
+            "scan_id": scan_id,
+            "scan_type": "port_sweep",
+            "target": target,
+            "probe_count": counts["probes"],
+            "open_count": counts["open"]
+        })
+    except Exception as e:
+        print(f"Error during sweep: {str(e)}")
+        db_manager.complete_scan(scan_id, "failed")
+
+@api.route('/api/results', methods=['GET'])
 @require_api_key
 def get_results():
     """Get scan results with optional filtering."""
     scan_id = request.args.get('scan_id')
     target = request.args.get('target')
+    consistent = request.args.get('consistent', '').lower() in ('true', '1')
     
-    results = db_manager.get_results(scan_id, target)
+    results = db_manager.get_results(scan_id, target, consistent)
     
     # Convert datetime objects to ISO format strings for JSON serialization
     for result in results:
@@ -205,22 +794,458 @@ def get_results():
     
     return jsonify(results)
 
-@app.route('/api/scans', methods=['GET'])
+@api.route('/api/results/batch', methods=['POST'])
+@require_api_key
+def get_results_batch():
+    """
+    Get the results of many scans and/or targets in one request. Sends
+    newline-delimited JSON, one result per line, when the client accepts
+    application/x-ndjson.
+    """
+    data = request.json or {}
+    scan_ids = data.get('scan_ids', [])
+    targets = data.get('targets', [])
+    
+    if not isinstance(scan_ids, list) or not all(isinstance(i, int) for i in scan_ids):
+        return jsonify({"error": "scan_ids must be a list of integers"}), 400
+    if not isinstance(targets, list) or not all(isinstance(t, str) for t in targets):
+        return jsonify({"error": "targets must be a list of strings"}), 400
+    if not scan_ids and not targets:
+        return jsonify({"error": "Provide scan_ids and/or targets"}), 400
+    if len(scan_ids) + len(targets) > MAX_BATCH_KEYS:
+        return jsonify({"error": f"At most {MAX_BATCH_KEYS} scan IDs and targets per request"}), 400
+    
+    consistent = str(data.get('consistent', False)).lower() in ('true', '1')
+    results = db_manager.iter_results_batch(scan_ids, targets, consistent=consistent)
+    
+    def serializable(result):
+        if result.get('discovered_at'):
+            result['discovered_at'] = result['discovered_at'].isoformat()
+        return result
+    
+    if request.accept_mimetypes.best == 'application/x-ndjson':
+        def generate():
+            for result in results:
+                yield json.dumps(serializable(result)) + "\n"
+        return Response(generate(), mimetype='application/x-ndjson')
+    
+    results = [serializable(result) for result in results]
+    return jsonify({
+        "results": results,
+        "count": len(results),
+        "timestamp": datetime.now().isoformat()
+    })
+
+@api.route('/api/exposure', methods=['GET'])
+@require_api_key
+def get_exposure():
+    """Get the hosts that currently expose the given ports, across all targets."""
+    protocol = request.args.get('protocol', 'TCP').upper()
+    limit = request.args.get('limit', type=int)
+    since = request.args.get('since')
+    
+    if protocol not in ('TCP', 'UDP'):
+        return jsonify({"error": "Protocol must be TCP or UDP"}), 400
+    
+    try:
+        ports = parse_ports([p for p in request.args.get('port', '').split(',') if p.strip()])
+    except ValueError as e:
+        return jsonify({"error": f"Invalid port: {e}"}), 400
+    
+    if since:
+        try:
+            since = datetime.fromisoformat(since)
+        except ValueError:
+            return jsonify({"error": "since must be an ISO 8601 timestamp"}), 400
+    
+    hosts = db_manager.get_exposure(ports, protocol, since, limit)
+    
+    for host in hosts:
+        for key in ('first_seen', 'last_seen'):
+            if host.get(key):
+                host[key] = host[key].isoformat()
+    
+    return jsonify({
+        "ports": ports,
+        "protocol": protocol,
+        "host_count": len({host['target'] for host in hosts}),
+        "hosts": hosts,
+        "timestamp": datetime.now().isoformat()
+    })
+
+def parse_state_query():
+    """
+    Validate the target and protocol of a port state query.
+    Returns (target, protocol); raises ValueError.
+    """
+    target = request.args.get('target')
+    protocol = request.args.get('protocol')
+    
+    if not target:
+        raise ValueError("target is required")
+    try:
+        ipaddress.ip_address(target)
+    except ValueError:
+        raise ValueError("Invalid IP address")
+    if protocol:
+        protocol = protocol.upper()
+        if protocol not in ('TCP', 'UDP'):
+            raise ValueError("Protocol must be TCP or UDP")
+    
+    return target, protocol
+
+def format_intervals(intervals):
+    for interval in intervals:
+        for key in ('opened_at', 'last_seen', 'closed_at'):
+            if interval.get(key):
+                interval[key] = interval[key].isoformat()
+    return intervals
+
+@api.route('/api/state', methods=['GET'])
+@require_api_key
+def get_port_state():
+    """Get the ports a target had open at a point in time (default: now)."""
+    at = request.args.get('at')
+    
+    try:
+        target, protocol = parse_state_query()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    try:
+        at = parse_timestamp(at) if at else datetime.now()
+    except ValueError:
+        return jsonify({"error": "at must be an ISO 8601 timestamp"}), 400
+    
+    ports = format_intervals(db_manager.get_port_intervals(target, since=at, until=at, protocol=protocol))
+    last_scan = db_manager.get_last_port_scan(target, before=at)
+    if last_scan and last_scan['completed_at']:
+        last_scan['completed_at'] = last_scan['completed_at'].isoformat()
+    
+    return jsonify({
+        "target": target,
+        "at": at.isoformat(),
+        "open_count": len(ports),
+        "ports": sorted(ports, key=lambda interval: (interval['protocol'], interval['port'])),
+        "last_scan": last_scan,
+        "timestamp": datetime.now().isoformat()
+    })
+
+@api.route('/api/state/timeline', methods=['GET'])
+@require_api_key
+def get_port_timeline():
+    """Get the intervals during which a target's ports were open, overlapping a time range."""
+    since = request.args.get('since')
+    until = request.args.get('until')
+    
+    try:
+        target, protocol = parse_state_query()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    ports = None
+    if request.args.get('port'):
+        try:
+            ports = parse_ports([p for p in request.args['port'].split(',') if p.strip()])
+        except ValueError as e:
+            return jsonify({"error": f"Invalid port: {e}"}), 400
+    
+    try:
+        since = parse_timestamp(since) if since else None
+        until = parse_timestamp(until) if until else None
+    except ValueError:
+        return jsonify({"error": "since and until must be ISO 8601 timestamps"}), 400
+    if since and until and since > until:
+        return jsonify({"error": "since must not be after until"}), 400
+    
+    intervals = format_intervals(db_manager.get_port_intervals(target, since, until, protocol, ports))
+    
+    return jsonify({
+        "target": target,
+        "since": since.isoformat() if since else None,
+        "until": until.isoformat() if until else None,
+        "interval_count": len(intervals),
+        "intervals": intervals,
+        "timestamp": datetime.now().isoformat()
+    })
+
+@api.route('/api/hosts', methods=['GET'])
+@require_api_key
+def get_hosts():
+    """Get the host inventory built by passive discovery (ARP and DHCP traffic)."""
+    network = request.args.get('network')
+    since = request.args.get('since')
+    limit = request.args.get('limit', type=int)
+    
+    if network:
+        try:
+            ipaddress.ip_network(network, strict=False)
+        except ValueError:
+            return jsonify({"error": "Invalid network CIDR"}), 400
+    
+    if since:
+        try:
+            since = datetime.fromisoformat(since)
+        except ValueError:
+            return jsonify({"error": "since must be an ISO 8601 timestamp"}), 400
+    
+    hosts = db_manager.get_host_inventory(network, since, limit)
+    
+    for host in hosts:
+        for key in ('first_seen', 'last_seen'):
+            if host.get(key):
+                host[key] = host[key].isoformat()
+    
+    return jsonify({
+        "hosts": hosts,
+        "count": len(hosts),
+        "timestamp": datetime.now().isoformat()
+    })
+
+@api.route('/api/scans', methods=['GET'])
 @require_api_key
 def get_scans():
     """Get information about previous scans."""
     limit = request.args.get('limit', 100, type=int)
     target = request.args.get('target')
-    scans = db_manager.get_scans(limit, target)
+    group_id = request.args.get('group_id', type=int)
+    consistent = request.args.get('consistent', '').lower() in ('true', '1')
+    scans = db_manager.get_scans(limit, target, group_id, consistent)
     
     # Convert datetime objects to ISO format strings for JSON serialization
     for scan in scans:
         if 'created_at' in scan and scan['created_at']:
             scan['created_at'] = scan['created_at'].isoformat()
+        if 'completed_at' in scan and scan['completed_at']:
+            scan['completed_at'] = scan['completed_at'].isoformat()
     
     return jsonify(scans)
 
-@app.route('/api/health', methods=['GET'])
+@api.route('/api/export', methods=['POST'])
+@require_api_key
+def start_export():
+    """
+    Export the scan history of a time range to partitioned Parquet files in
+    the background. Poll /api/export/<export_id> for the files.
+    """
+    data = request.json or {}
+    partition = data.get('partition', 'day')
+    
+    try:
+        since = parse_timestamp(data['since'])
+        until = parse_timestamp(data['until']) if data.get('until') else datetime.now()
+    except KeyError:
+        return jsonify({"error": "since is required"}), 400
+    except (TypeError, ValueError):
+        return jsonify({"error": "since and until must be ISO 8601 timestamps"}), 400
+    
+    if since >= until:
+        return jsonify({"error": "since must be before until"}), 400
+    if partition not in ParquetExporter.PARTITIONS:
+        return jsonify({"error": f"partition must be one of: {', '.join(ParquetExporter.PARTITIONS)}"}), 400
+    if not ParquetExporter.available():
+        return jsonify({"error": "Exports need pyarrow installed on the API server"}), 503
+    
+    export_id = parquet_exporter.new_export()
+    export_thread = threading.Thread(
+        target=parquet_exporter.run_export,
+        args=(export_id, since, until, partition)
+    )
+    export_thread.start()
+    
+    return jsonify({
+        "message": "Export started",
+        "export_id": export_id,
+        "since": since.isoformat(),
+        "until": until.isoformat(),
+        "partition": partition,
+        "timestamp": datetime.now().isoformat()
+    })
+
+@api.route('/api/export/<export_id>', methods=['GET'])
+@require_api_key
+def get_export(export_id):
+    """Get the status of an export and, once completed, its files."""
+    export = parquet_exporter.status(export_id)
+    if export is None:
+        return jsonify({"error": "Export not found"}), 404
+    
+    export["timestamp"] = datetime.now().isoformat()
+    return jsonify(export)
+
+@api.route('/api/export/<export_id>/files/<path:filename>', methods=['GET'])
+@require_api_key
+def get_export_file(export_id, filename):
+    """Download one Parquet file of a completed export."""
+    export = parquet_exporter.status(export_id)
+    if export is None or export["status"] != "completed":
+        return jsonify({"error": "Export not found or not completed"}), 404
+    if filename not in {entry["path"] for entry in export["files"]}:
+        return jsonify({"error": "File not found"}), 404
+    
+    return send_from_directory(
+        os.path.abspath(parquet_exporter.export_dir(export_id)), filename,
+        mimetype='application/vnd.apache.parquet', as_attachment=True
+    )
+
+@api.route('/api/schedules', methods=['POST'])
+@require_api_key
+def create_schedule():
+    """Create a recurring port scan schedule run by the built-in scheduler."""
+    data = request.json
+    name = data.get('name')
+    targets = data.get('targets', [])
+    ports_input = data.get('ports', [])
+    scan_type = data.get('scan_type', 'stealth')
+    mode = data.get('mode', 'full')
+    timeout = data.get('timeout', 1)
+    interval = data.get('interval_seconds')
+    
+    # Validate input
+    if not isinstance(targets, list):
+        targets = [targets]
+    
+    try:
+        for target in targets:
+            ipaddress.ip_address(target)
+    except ValueError:
+        return jsonify({"error": f"Invalid IP address: {target}"}), 400
+    
+    if not targets:
+        return jsonify({"error": "No targets specified"}), 400
+    
+    if scan_type not in ('stealth', 'connect', 'udp'):
+        return jsonify({"error": f"Unsupported scan type: {scan_type}"}), 400
+    
+    if mode not in ('full', 'recheck'):
+        return jsonify({"error": f"Invalid mode: {mode}. Use 'full' or 'recheck'"}), 400
+    
+    if not isinstance(interval, int) or interval < 60:
+        return jsonify({"error": "interval_seconds must be an integer of at least 60"}), 400
+    
+    try:
+        parse_ports(ports_input, limit_ranges=(mode != 'recheck'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    # Keep order but drop duplicate targets so each gets a single slot
+    targets = list(dict.fromkeys(targets))
+    
+    schedule_id = db_manager.create_schedule(name, targets, ports_input, scan_type, mode, timeout, interval)
+    
+    return jsonify({
+        "message": "Schedule created",
+        "schedule_id": schedule_id,
+        "target_count": len(targets),
+        "interval_seconds": interval,
+        "seconds_between_targets": interval / len(targets),
+        "timestamp": datetime.now().isoformat()
+    })
+
+@api.route('/api/schedules', methods=['GET'])
+@require_api_key
+def get_schedules():
+    """List recurring scan schedules."""
+    schedules = db_manager.get_schedules()
+    
+    for schedule in schedules:
+        if 'created_at' in schedule and schedule['created_at']:
+            schedule['created_at'] = schedule['created_at'].isoformat()
+    
+    return jsonify(schedules)
+
+@api.route('/api/schedules/<int:schedule_id>', methods=['POST'])
+@require_api_key
+def update_schedule(schedule_id):
+    """Enable or disable a schedule."""
+    data = request.json
+    enabled = data.get('enabled')
+    
+    if not isinstance(enabled, bool):
+        return jsonify({"error": "enabled must be true or false"}), 400
+    
+    if not db_manager.set_schedule_enabled(schedule_id, enabled):
+        return jsonify({"error": "Schedule not found"}), 404
+    
+    return jsonify({
+        "message": "Schedule enabled" if enabled else "Schedule disabled",
+        "schedule_id": schedule_id,
+        "timestamp": datetime.now().isoformat()
+    })
+
+@api.route('/api/schedules/<int:schedule_id>', methods=['DELETE'])
+@require_api_key
+def delete_schedule(schedule_id):
+    """Remove a schedule."""
+    if not db_manager.delete_schedule(schedule_id):
+        return jsonify({"error": "Schedule not found"}), 404
+    
+    return jsonify({
+        "message": "Schedule deleted",
+        "schedule_id": schedule_id,
+        "timestamp": datetime.now().isoformat()
+    })
+
+@api.route('/api/webhooks', methods=['POST'])
+@require_api_key
+def create_webhook():
+    """Register a URL to receive batched scan events."""
+    data = request.json
+    url = data.get('url')
+    events = data.get('events', [])
+    secret = data.get('secret')
+    
+    # Validate input
+    if not url or not url.startswith(('http://', 'https://')):
+        return jsonify({"error": "Invalid webhook URL"}), 400
+    
+    if not isinstance(events, list):
+        events = [events]
+    
+    unknown_events = [e for e in events if e not in WebhookDispatcher.EVENT_TYPES]
+    if unknown_events:
+        return jsonify({
+            "error": f"Unknown event types: {unknown_events}. Supported events are {list(WebhookDispatcher.EVENT_TYPES)}"
+        }), 400
+    
+    webhook_id = db_manager.create_webhook(url, events, secret)
+    
+    return jsonify({
+        "message": "Webhook registered",
+        "webhook_id": webhook_id,
+        "url": url,
+        "events": events or list(WebhookDispatcher.EVENT_TYPES),
+        "timestamp": datetime.now().isoformat()
+    })
+
+@api.route('/api/webhooks', methods=['GET'])
+@require_api_key
+def get_webhooks():
+    """List registered webhooks."""
+    webhooks = db_manager.get_webhooks()
+    
+    for webhook in webhooks:
+        # Never echo the signing secret back
+        webhook['secret'] = bool(webhook.get('secret'))
+        if 'created_at' in webhook and webhook['created_at']:
+            webhook['created_at'] = webhook['created_at'].isoformat()
+    
+    return jsonify(webhooks)
+
+@api.route('/api/webhooks/<int:webhook_id>', methods=['DELETE'])
+@require_api_key
+def delete_webhook(webhook_id):
+    """Remove a registered webhook."""
+    if not db_manager.delete_webhook(webhook_id):
+        return jsonify({"error": "Webhook not found"}), 404
+    
+    return jsonify({
+        "message": "Webhook deleted",
+        "webhook_id": webhook_id,
+        "timestamp": datetime.now().isoformat()
+    })
+
+@api.route('/api/health', methods=['GET'])
 def health_check():
     """Simple health check endpoint."""
     return jsonify({
@@ -229,7 +1254,25 @@ def health_check():
         "user": os.environ.get('CURRENT_USER', 'trinq')
     })
 
+def create_app():
+    """
+    Build the Flask application.
+    
+    Safe to call once per process under a preforking WSGI server
+    (e.g. gunicorn -c gunicorn.conf.py "app:create_app()"): schema setup is
+    serialized in the database and only one process runs the scheduler.
+    """
+    app = Flask(__name__)
+    app.register_blueprint(api)
+    
+    # Initialize database when the app starts
+    db_manager.init_db()
+    if os.environ.get('SCHEDULER_ENABLED', 'true').lower() == 'true':
+        scan_scheduler.start()
+    
+    return app
+
 if __name__ == '__main__':
     # Get port from environment variable or use default
     port = int(os.environ.get('API_PORT', 5000))
-    app.run(host='0.0.0.0', port=port, debug=False)
\ No newline at end of file
+    create_app().run(host='0.0.0.0', port=port, debug=False)
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Dalang Watcher ASGI server
+
+Serves the API from an asyncio event loop instead of a thread per request:
+
+    gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker "asgi:create_asgi_app()"
+    python asgi.py          # single process, for development
+
+Health, results, scan listings and scan group progress, the routes clients
+poll, stream or hold open, are served natively on an asyncpg connection pool,
+so an idle or slow client costs a coroutine rather than a thread. Every other
+route, including starting scans, is passed to the Flask app from app.py,
+which runs in a thread pool as under gunicorn. The Flask entry point
+("app:create_app()") stays available and behaves the same.
+"""
+
+import contextlib
+import json
+import os
+from datetime import datetime
+from functools import wraps
+from starlette.applications import Starlette
+from starlette.middleware.wsgi import WSGIMiddleware
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Mount, Route
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header
+from app import create_app, MAX_BATCH_KEYS
+from modules.async_db import AsyncDatabaseManager
+
+async_db = AsyncDatabaseManager()
+
+def add_cors_headers(response):
+    """Same CORS headers as the Flask app adds."""
+    if os.environ.get('AUTOMATION_FRIENDLY', 'false').lower() == 'true':
+        response.headers['Access-Control-Allow-Origin'] = '*'
+        response.headers['Access-Control-Allow-Methods'] = 'GET, POST, DELETE, OPTIONS'
+        response.headers['Access-Control-Allow-Headers'] = 'Content-Type, X-API-Key, x-api-key'
+    return response
+
+def jsonify(data, status_code=200):
+    """JSON response formatted like Flask's jsonify (sorted keys)."""
+    body = json.dumps(data, sort_keys=True) + "\n"
+    return add_cors_headers(Response(body, status_code=status_code, media_type="application/json"))
+
+def require_api_key(handler):
+    @wraps(handler)
+    async def decorated_function(request):
+        api_key = os.environ.get('API_KEY')
+        # Skip authentication if no API key is set (development mode); header names are case-insensitive
+        if api_key and request.headers.get('X-API-Key') != api_key:
+            return jsonify({"error": "Unauthorized - Invalid API key"}, 401)
+        return await handler(request)
+    return decorated_function
+
+def query_int(request, name, default=None):
+    """Integer query parameter, or `default` when missing or invalid (like Flask's type=int)."""
+    try:
+        return int(request.query_params[name])
+    except (KeyError, ValueError):
+        return default
+
+def query_flag(request, name):
+    """Boolean query parameter, parsed like the Flask routes do ("true" or "1")."""
+    return request.query_params.get(name, '').lower() in ('true', '1')
+
+def accepts_best(request, mimetype):
+    """Whether `mimetype` is the client's best match in Accept, like Flask's request.accept_mimetypes.best."""
+    return parse_accept_header(request.headers.get('Accept'), MIMEAccept).best == mimetype
+
+def isoformat(row, *keys):
+    for key in keys:
+        if row.get(key):
+            row[key] = row[key].isoformat()
+    return row
+
+async def health_check(request):
+    """Simple health check endpoint."""
+    return jsonify({
+        "status": "ok",
+        "timestamp": datetime.now().isoformat(),
+        "user": os.environ.get('CURRENT_USER', 'trinq')
+    })
+
+@require_api_key
+async def get_results(request):
+    """Get scan results with optional filtering."""
+    scan_id = request.query_params.get('scan_id')
+    target = request.query_params.get('target')
+    if scan_id:
+        try:
+            scan_id = int(scan_id)
+        except ValueError:
+            return jsonify({"error": "scan_id must be an integer"}, 400)
+
+    results = await async_db.get_results(scan_id, target, query_flag(request, 'consistent'))
+    return jsonify([isoformat(result, 'discovered_at') for result in results])
+
+@require_api_key
+async def get_results_batch(request):
+    """
+    Get the results of many scans and/or targets in one request. Sends
+    newline-delimited JSON, one result per line, when application/x-ndjson
+    is the client's preferred type in Accept.
+    """
+    try:
+        data = await request.json() or {}
+    except ValueError:
+        data = {}
+    scan_ids = data.get('scan_ids', [])
+    targets = data.get('targets', [])
+
+    if not isinstance(scan_ids, list) or not all(isinstance(i, int) for i in scan_ids):
+        return jsonify({"error": "scan_ids must be a list of integers"}, 400)
+    if not isinstance(targets, list) or not all(isinstance(t, str) for t in targets):
+        return jsonify({"error": "targets must be a list of strings"}, 400)
+    if not scan_ids and not targets:
+        return jsonify({"error": "Provide scan_ids and/or targets"}, 400)
+    if len(scan_ids) + len(targets) > MAX_BATCH_KEYS:
+        return jsonify({"error": f"At most {MAX_BATCH_KEYS} scan IDs and targets per request"}, 400)
+
+    consistent = str(data.get('consistent', False)).lower() in ('true', '1')
+    results = async_db.iter_results_batch(scan_ids, targets, consistent=consistent)
+
+    if accepts_best(request, 'application/x-ndjson'):
+        async def generate():
+            async for result in results:
+                yield json.dumps(isoformat(result, 'discovered_at')) + "\n"
+        return add_cors_headers(StreamingResponse(generate(), media_type='application/x-ndjson'))
+
+    results = [isoformat(result, 'discovered_at') async for result in results]
+    return jsonify({
+        "results": results,
+        "count": len(results),
+        "timestamp": datetime.now().isoformat()
+    })
+
+@require_api_key
+async def get_scans(request):
+    """Get information about previous scans."""
+    limit = query_int(request, 'limit', 100)
+    target = request.query_params.get('target')
+    group_id = query_int(request, 'group_id')
+
+    scans = await async_db.get_scans(limit, target, group_id, query_flag(request, 'consistent'))
+    return jsonify([isoformat(scan, 'created_at', 'completed_at') for scan in scans])
+
+@require_api_key
+async def get_scan_group(request):
+    """Get a bulk scan group and the progress of its child scans."""
+    group = await async_db.get_scan_group(request.path_params['group_id'], query_flag(request, 'consistent'))
+    if group is None:
+        return jsonify({"error": "Scan group not found"}, 404)
+
+    isoformat(group, 'created_at')
+    group['finished'] = group['status_counts'].get('running', 0) == 0
+    return jsonify(group)
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    await async_db.start()
+    try:
+        yield
+    finally:
+        await async_db.close()
+
+def create_asgi_app():
+    """
+    Build the ASGI application: the async routes, then the Flask app (built
+    with create_app(), so schema setup and the scheduler work as under WSGI)
+    for everything else, including CORS preflight requests.
+    """
+    flask_app = create_app()
+    return Starlette(
+        routes=[
+            Route('/api/health', health_check, methods=['GET']),
+            Route('/api/results', get_results, methods=['GET']),
+            Route('/api/results/batch', get_results_batch, methods=['POST']),
+            Route('/api/scans', get_scans, methods=['GET']),
+            Route('/api/scan/groups/{group_id:int}', get_scan_group, methods=['GET']),
+            Mount('/', app=WSGIMiddleware(flask_app))
+        ],
+        lifespan=lifespan
+    )
+
+if __name__ == '__main__':
+    import uvicorn
+    port = int(os.environ.get('API_PORT', 5000))
+    uvicorn.run("asgi:create_asgi_app", factory=True, host='0.0.0.0', port=port)
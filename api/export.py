@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Dalang Watcher Scan History Export
+
+Writes the scan results of a time range to partitioned Parquet files for
+analytics, reading from a read replica when DB_READ_DSN is set:
+
+    python export.py --since 2025-03-01 --until 2025-04-01 --output /data/march
+    duckdb -c "SELECT status, count(*) FROM '/data/march/*/*.parquet' GROUP BY 1"
+"""
+
+import argparse
+import sys
+from datetime import datetime
+from modules.db import create_database_manager
+from modules.export import ParquetExporter, parse_timestamp
+
+def main():
+    parser = argparse.ArgumentParser(description="Dalang Watcher Scan History Export")
+    parser.add_argument("--since", required=True, type=parse_timestamp,
+                        help="Export results discovered at or after this ISO 8601 time")
+    parser.add_argument("--until", type=parse_timestamp, default=None,
+                        help="Export results discovered before this ISO 8601 time (default: now)")
+    parser.add_argument("--output", required=True, help="Directory to write the Parquet files to")
+    parser.add_argument("--partition", choices=ParquetExporter.PARTITIONS, default="day",
+                        help="Partition files by discovery day, month, or not at all (default: day)")
+    parser.add_argument("--batch-size", type=int, help="Rows per chunk and row group (default: EXPORT_BATCH_SIZE or 50000)")
+    parser.add_argument("--compression", help="Parquet compression codec (default: EXPORT_COMPRESSION or zstd)")
+    args = parser.parse_args()
+
+    until = args.until or datetime.now()
+    if args.since >= until:
+        parser.error("--since must be before --until")
+    if not ParquetExporter.available():
+        sys.exit("Exports need pyarrow: pip install pyarrow")
+
+    exporter = ParquetExporter(create_database_manager(), batch_size=args.batch_size, compression=args.compression)
+    manifest = exporter.export(args.since, until, args.output, args.partition)
+    print(f"Exported {manifest['rows']} results to {len(manifest['files'])} files in {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Gunicorn configuration for the Dalang Watcher API
+
+    gunicorn -c gunicorn.conf.py "app:create_app()"
+    gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker "asgi:create_asgi_app()"
+
+Serves the API from several worker processes. Scans are not run inside the
+HTTP workers: they are queued (SCAN_EXECUTION=queue) and executed by a single
+scanner process started by the gunicorn master, so scan capacity is shared by
+all HTTP workers instead of being duplicated in each of them.
+"""
+
+import multiprocessing
+import os
+import signal
+
+bind = f"0.0.0.0:{os.environ.get('API_PORT', 5000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('WEB_THREADS', 4))
+timeout = 60
+
+# HTTP workers only queue scans; the embedded executor (or external workers) run them
+os.environ.setdefault('SCAN_EXECUTION', 'queue')
+
+_scan_executor = None
+
+def _run_scan_executor():
+    # Forked from the master: drop the arbiter's handlers, which only queue
+    # signals for the master's loop, so terminate() actually stops this process
+    for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGQUIT, signal.SIGHUP, signal.SIGCHLD):
+        signal.signal(signum, signal.SIG_DFL)
+    from worker import ScanWorker
+    from modules.db import create_database_manager
+    ScanWorker(create_database_manager(), worker_id=f"embedded-{os.getpid()}").run()
+
+def when_ready(server):
+    """Start one scanner process next to the HTTP workers."""
+    global _scan_executor
+    if os.environ.get('EMBEDDED_SCAN_EXECUTOR', 'true').lower() != 'true':
+        return
+    _scan_executor = multiprocessing.Process(target=_run_scan_executor, name="scan-executor")
+    _scan_executor.daemon = True
+    _scan_executor.start()
+    server.log.info(f"Started scan executor (pid {_scan_executor.pid})")
+
+def on_exit(server):
+    """Stop the scanner process together with the master."""
+    if _scan_executor is not None and _scan_executor.is_alive():
+        _scan_executor.terminate()
+        _scan_executor.join(5)
+        if _scan_executor.is_alive():
+            server.log.warning(f"Scan executor (pid {_scan_executor.pid}) did not stop, killing it")
+            _scan_executor.kill()
+            _scan_executor.join(5)
@@ -0,0 +1,115 @@
+import json
+import os
+
+class AsyncDatabaseManager:
+    """
+    Read-side database access for the ASGI server (asgi.py) on asyncpg, with
+    its own connection pool. Coroutines wait for queries without holding a
+    thread, so one event loop can serve many slow or idle clients.
+
+    Queries and returned rows match the DatabaseManager methods of the same
+    names. Reads go to the primary; read replicas (DB_READ_DSN) are only used
+    by DatabaseManager, so `consistent` is accepted for the same signatures
+    but always implied.
+    """
+
+    def __init__(self, host=None, port=None, dbname=None, user=None, password=None, min_size=None, max_size=None):
+        """Initialize with connection parameters or use environment variables."""
+        self.host = host or os.environ.get('DB_HOST', 'timescaledb')
+        self.port = port or os.environ.get('DB_PORT', '5432')
+        self.dbname = dbname or os.environ.get('DB_NAME', 'dalang_watcher')
+        self.user = user or os.environ.get('DB_USER', 'postgres')
+        self.password = password or os.environ.get('DB_PASSWORD', 'asmadmin')
+        self.min_size = min_size or int(os.environ.get('ASYNC_DB_POOL_MIN', 2))
+        self.max_size = max_size or int(os.environ.get('ASYNC_DB_POOL_MAX', 20))
+        self.pool = None
+
+    @staticmethod
+    async def _init_connection(conn):
+        # Return JSONB as Python objects, as psycopg2 does
+        await conn.set_type_codec('jsonb', encoder=json.dumps, decoder=json.loads, schema='pg_catalog')
+
+    async def start(self):
+        """Open the connection pool. Call from the event loop that will use it."""
+        import asyncpg
+        self.pool = await asyncpg.create_pool(
+            host=self.host,
+            port=int(self.port),
+            database=self.dbname,
+            user=self.user,
+            password=self.password,
+            min_size=self.min_size,
+            max_size=self.max_size,
+            init=self._init_connection
+        )
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    async def get_results(self, scan_id=None, target=None, consistent=False):
+        """Get scan results from the database."""
+        if scan_id:
+            rows = await self.pool.fetch(
+                "SELECT * FROM scan_results WHERE scan_id = $1 ORDER BY discovered_at DESC", scan_id
+            )
+        elif target:
+            rows = await self.pool.fetch(
+                "SELECT * FROM scan_results WHERE target = $1 ORDER BY discovered_at DESC", target
+            )
+        else:
+            rows = await self.pool.fetch("SELECT * FROM scan_results ORDER BY discovered_at DESC LIMIT 100")
+        return [dict(row) for row in rows]
+
+    async def iter_results_batch(self, scan_ids=None, targets=None, batch_size=1000, consistent=False):
+        """
+        Yield the results of many scans and/or targets from one query, in
+        (scan_id, port) order, through a server-side cursor.
+        """
+        async with self.pool.acquire() as conn:
+            async with conn.transaction(readonly=True):
+                cursor = conn.cursor(
+                    """
+                    SELECT * FROM scan_results
+                    WHERE scan_id = ANY($1::int[]) OR target = ANY($2::text[])
+                    ORDER BY scan_id, port NULLS LAST, result_id
+                    """,
+                    list(scan_ids or []), list(targets or []),
+                    prefetch=batch_size
+                )
+                async for row in cursor:
+                    yield dict(row)
+
+    async def get_scans(self, limit=100, target=None, group_id=None, consistent=False):
+        """Get scan metadata from the database."""
+        query = "SELECT * FROM scans"
+        conditions, params = [], []
+        if target:
+            params.append(target)
+            conditions.append(f"target = ${len(params)}")
+        if group_id is not None:
+            params.append(group_id)
+            conditions.append(f"group_id = ${len(params)}")
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        params.append(limit)
+        query += f" ORDER BY created_at DESC LIMIT ${len(params)}"
+
+        return [dict(row) for row in await self.pool.fetch(query, *params)]
+
+    async def get_scan_group(self, group_id, consistent=False):
+        """
+        Get a scan group with the number of child scans per status, or None
+        if it does not exist.
+        """
+        async with self.pool.acquire() as conn:
+            row = await conn.fetchrow("SELECT * FROM scan_groups WHERE group_id = $1", group_id)
+            if row is None:
+                return None
+            group = dict(row)
+            counts = await conn.fetch(
+                "SELECT status, COUNT(*) FROM scans WHERE group_id = $1 GROUP BY status", group_id
+            )
+        group['status_counts'] = {status: count for status, count in counts}
+        return group
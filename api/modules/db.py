@@ -1,23 +1,60 @@
-import psycopg2
+try:
+    import psycopg2
+except ImportError:
+    # Edge nodes on the SQLite backend (DB_BACKEND=sqlite) can run without the PostgreSQL driver
+    psycopg2 = None
+import itertools
 import json
 import os
+import threading
+import time
 from datetime import datetime
+from modules.portstate import PortStateVector
 
 class DatabaseManager:
     """
     Handles database connections and operations for the ASM system
     """
     
-    def __init__(self, host=None, port=None, dbname=None, user=None, password=None):
+    # SQL reporting how far a replica lags behind the primary, in seconds.
+    # A replica that has replayed everything it received is not lagging,
+    # however long ago the last transaction was.
+    REPLICA_LAG_QUERY = """
+        SELECT CASE
+            WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+        END
+    """
+    
+    def __init__(self, host=None, port=None, dbname=None, user=None, password=None, read_dsns=None,
+                 replica_max_lag=None, replica_check_interval=None, read_your_writes=None):
         """Initialize with connection parameters or use environment variables."""
         self.host = host or os.environ.get('DB_HOST', 'timescaledb')
         self.port = port or os.environ.get('DB_PORT', '5432')
         self.dbname = dbname or os.environ.get('DB_NAME', 'dalang_watcher')
         self.user = user or os.environ.get('DB_USER', 'postgres')
         self.password = password or os.environ.get('DB_PASSWORD', 'asmadmin')
+        
+        # Read replicas: libpq connection strings or URLs, separated by ";"
+        if read_dsns is None:
+            read_dsns = [dsn.strip() for dsn in os.environ.get('DB_READ_DSN', '').split(';') if dsn.strip()]
+        elif isinstance(read_dsns, str):
+            read_dsns = [read_dsns]
+        self.read_dsns = list(read_dsns)
+        self.replica_max_lag = replica_max_lag or float(os.environ.get('DB_REPLICA_MAX_LAG', 30))
+        self.replica_check_interval = replica_check_interval or float(os.environ.get('DB_REPLICA_CHECK_INTERVAL', 10))
+        self.read_your_writes = read_your_writes if read_your_writes is not None else float(os.environ.get('DB_READ_YOUR_WRITES', 30))
+        self.replica_connect_timeout = int(os.environ.get('DB_REPLICA_CONNECT_TIMEOUT', 2))
+        
+        self._replica_turn = itertools.count()
+        self._replica_down_until = {}  # dsn -> monotonic time until which the replica is skipped
+        self._replica_checked_at = {}  # dsn -> monotonic time of the last lag check
+        self._last_write = None  # (WAL position, monotonic expiry) of the latest scan creation
     
     def get_connection(self):
         """Get a connection to the database."""
+        if psycopg2 is None:
+            raise RuntimeError("The PostgreSQL backend needs psycopg2: pip install psycopg2-binary")
         return psycopg2.connect(
             host=self.host,
             port=self.port,
@@ -26,11 +63,108 @@ class DatabaseManager:
             password=self.password
         )
     
+    def get_read_connection(self, consistent=False):
+        """
+        Get a connection for a read-only query: a healthy read replica when
+        any are configured, otherwise (or when `consistent` is set, or no
+        replica is usable) the primary.
+        
+        Replicas are used in turn. One that cannot be reached, or lags more
+        than `replica_max_lag` seconds, is skipped for `replica_check_interval`
+        seconds. For `read_your_writes` seconds after this process created a
+        scan, a replica is only used once it has replayed that write.
+        """
+        if consistent or not self.read_dsns:
+            return self.get_connection()
+        
+        now = time.monotonic()
+        last_write = self._last_write
+        if last_write and now >= last_write[1]:
+            last_write = self._last_write = None
+        
+        start = next(self._replica_turn)
+        for i in range(len(self.read_dsns)):
+            dsn = self.read_dsns[(start + i) % len(self.read_dsns)]
+            if self._replica_down_until.get(dsn, 0) > now:
+                continue
+            
+            try:
+                conn = psycopg2.connect(dsn, connect_timeout=self.replica_connect_timeout)
+            except psycopg2.Error as e:
+                print(f"Error connecting to read replica: {e}")
+                self._replica_down_until[dsn] = now + self.replica_check_interval
+                continue
+            
+            try:
+                cur = conn.cursor()
+                if now - self._replica_checked_at.get(dsn, float('-inf')) >= self.replica_check_interval:
+                    cur.execute(self.REPLICA_LAG_QUERY)
+                    lag = float(cur.fetchone()[0])
+                    self._replica_checked_at[dsn] = now
+                    if lag > self.replica_max_lag:
+                        print(f"Read replica lags {lag:.1f}s behind the primary, skipping it")
+                        self._replica_down_until[dsn] = now + self.replica_check_interval
+                        cur.close()
+                        conn.close()
+                        continue
+                if last_write:
+                    cur.execute("SELECT COALESCE(pg_last_wal_replay_lsn() >= %s::pg_lsn, true)", (last_write[0],))
+                    if not cur.fetchone()[0]:
+                        # This replica has not seen the new scan yet; others are unlikely to
+                        cur.close()
+                        conn.close()
+                        break
+                cur.close()
+                conn.rollback()
+            except psycopg2.Error as e:
+                print(f"Error checking read replica: {e}")
+                self._replica_down_until[dsn] = now + self.replica_check_interval
+                conn.close()
+                continue
+            
+            return conn
+        
+        return self.get_connection()
+    
+    def _note_write(self, cur):
+        """
+        Remember the primary's WAL position after a scan was created, so reads
+        in the next `read_your_writes` seconds wait for a replica to replay it.
+        Call after commit, with a cursor of the same connection.
+        """
+        if not self.read_dsns or self.read_your_writes <= 0:
+            return
+        try:
+            cur.execute("SELECT pg_current_wal_insert_lsn()::text")
+            self._last_write = (cur.fetchone()[0], time.monotonic() + self.read_your_writes)
+        except psycopg2.Error as e:
+            print(f"Error reading WAL position: {e}")
+    
+    def acquire_advisory_lock(self, key):
+        """
+        Take a session-level advisory lock, held for as long as the returned
+        connection stays open. Returns None if another session holds it.
+        """
+        conn = self.get_connection()
+        conn.autocommit = True
+        cur = conn.cursor()
+        cur.execute("SELECT pg_try_advisory_lock(%s)", (key,))
+        acquired = cur.fetchone()[0]
+        cur.close()
+        
+        if not acquired:
+            conn.close()
+            return None
+        return conn
+    
     def init_db(self):
         """Initialize the database schema."""
         conn = self.get_connection()
         cur = conn.cursor()
         
+        # Several API worker processes may start at once; serialize schema setup
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext('dalang_watcher_init_db'))")
+        
         # Create tables if they don't exist
         cur.execute('''
         CREATE TABLE IF NOT EXISTS scans (
@@ -38,10 +172,37 @@ class DatabaseManager:
             scan_type VARCHAR(50),
             target TEXT,
             parameters JSONB,
+            status VARCHAR(20) DEFAULT 'running',
+            completed_at TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+        
+        # Bulk submissions: one group row per request, one child scan per target
+        cur.execute('''
+        CREATE TABLE IF NOT EXISTS scan_groups (
+            group_id SERIAL PRIMARY KEY,
+            scan_type VARCHAR(50),
+            parameters JSONB,
+            target_count INTEGER,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
         ''')
         
+        # Add scan lifecycle columns to databases created before they existed
+        cur.execute("ALTER TABLE scans ADD COLUMN IF NOT EXISTS status VARCHAR(20)")
+        cur.execute("ALTER TABLE scans ALTER COLUMN status SET DEFAULT 'running'")
+        cur.execute("ALTER TABLE scans ADD COLUMN IF NOT EXISTS completed_at TIMESTAMP")
+        self._complete_legacy_scans(cur)
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_scans_target_type ON scans(target, scan_type, created_at DESC)")
+        cur.execute("ALTER TABLE scans ADD COLUMN IF NOT EXISTS group_id INTEGER REFERENCES scan_groups(group_id)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_scans_group ON scans(group_id) WHERE group_id IS NOT NULL")
+        
+        # Scans imported from edge nodes keep the node name and their scan ID there
+        cur.execute("ALTER TABLE scans ADD COLUMN IF NOT EXISTS origin TEXT")
+        cur.execute("ALTER TABLE scans ADD COLUMN IF NOT EXISTS origin_scan_id INTEGER")
+        cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_scans_origin ON scans(origin, origin_scan_id) WHERE origin IS NOT NULL")
+        
         cur.execute('''
         CREATE TABLE IF NOT EXISTS scan_results (
             result_id SERIAL PRIMARY KEY,
@@ -55,17 +216,205 @@ class DatabaseManager:
         )
         ''')
         
+        cur.execute('''
+        CREATE TABLE IF NOT EXISTS webhooks (
+            webhook_id SERIAL PRIMARY KEY,
+            url TEXT NOT NULL,
+            events JSONB,
+            secret TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+        
+        cur.execute('''
+        CREATE TABLE IF NOT EXISTS scan_schedules (
+            schedule_id SERIAL PRIMARY KEY,
+            name TEXT,
+            targets JSONB NOT NULL,
+            ports JSONB NOT NULL,
+            scan_type VARCHAR(20) DEFAULT 'stealth',
+            mode VARCHAR(20) DEFAULT 'full',
+            timeout REAL DEFAULT 1,
+            interval_seconds INTEGER NOT NULL,
+            enabled BOOLEAN DEFAULT TRUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+        
+        cur.execute('''
+        CREATE TABLE IF NOT EXISTS scan_jobs (
+            job_id BIGSERIAL PRIMARY KEY,
+            scan_id INTEGER REFERENCES scans(scan_id),
+            target TEXT,
+            ports JSONB,
+            scan_type VARCHAR(20),
+            timeout REAL,
+            options JSONB,
+            status VARCHAR(20) DEFAULT 'pending',
+            worker_id TEXT,
+            attempts INTEGER DEFAULT 0,
+            claimed_at TIMESTAMP,
+            heartbeat_at TIMESTAMP,
+            completed_at TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+        cur.execute("ALTER TABLE scan_jobs ADD COLUMN IF NOT EXISTS options JSONB")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_scan_jobs_pending ON scan_jobs(job_id) WHERE status = 'pending'")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_scan_jobs_scan ON scan_jobs(scan_id)")
+        
+        # Which hosts were recently seen up or down, each entry with its own expiry
+        cur.execute('''
+        CREATE TABLE IF NOT EXISTS host_liveness (
+            target TEXT PRIMARY KEY,
+            alive BOOLEAN NOT NULL,
+            source VARCHAR(20),
+            checked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            expires_at TIMESTAMP NOT NULL
+        )
+        ''')
+        
+        # Hosts seen on the wire by passive discovery (ARP and DHCP)
+        cur.execute('''
+        CREATE TABLE IF NOT EXISTS host_inventory (
+            ip TEXT PRIMARY KEY,
+            mac VARCHAR(17),
+            source VARCHAR(20),
+            first_seen TIMESTAMP NOT NULL,
+            last_seen TIMESTAMP NOT NULL
+        )
+        ''')
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_host_inventory_last_seen ON host_inventory(last_seen)")
+        
+        # Inverted index of currently open ports: (protocol, port) -> targets
+        cur.execute("SELECT to_regclass('port_exposure') IS NULL")
+        exposure_is_new = cur.fetchone()[0]
+        
+        cur.execute('''
+        CREATE TABLE IF NOT EXISTS port_exposure (
+            protocol VARCHAR(10) NOT NULL,
+            port INTEGER NOT NULL,
+            target TEXT NOT NULL,
+            first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_scan_id INTEGER,
+            PRIMARY KEY (protocol, port, target)
+        )
+        ''')
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_port_exposure_target ON port_exposure(target, protocol)")
+        
+        # Seed the index once from the latest port scan of each target
+        if exposure_is_new:
+            cur.execute('''
+            INSERT INTO port_exposure (protocol, port, target, first_seen, last_seen, last_scan_id)
+            SELECT r.protocol, r.port, r.target, MIN(r.discovered_at), MAX(r.discovered_at), MAX(r.scan_id)
+            FROM scan_results r
+            JOIN (
+                SELECT DISTINCT ON (target, scan_type) scan_id FROM scans
+                WHERE scan_type LIKE 'port_scan_%'
+                ORDER BY target, scan_type, scan_id DESC
+            ) latest ON latest.scan_id = r.scan_id
+            WHERE r.port IS NOT NULL AND r.status IN ('Open', 'Open|Filtered')
+            GROUP BY r.protocol, r.port, r.target
+            ON CONFLICT DO NOTHING
+            ''')
+        
+        # Validity intervals of open ports: when each port of a target was
+        # found open, last seen open and found closed again (NULL while open)
+        cur.execute("SELECT to_regclass('port_intervals') IS NULL")
+        intervals_is_new = cur.fetchone()[0]
+        
+        cur.execute('''
+        CREATE TABLE IF NOT EXISTS port_intervals (
+            interval_id BIGSERIAL PRIMARY KEY,
+            target TEXT NOT NULL,
+            protocol VARCHAR(10) NOT NULL,
+            port INTEGER NOT NULL,
+            opened_at TIMESTAMP NOT NULL,
+            last_seen TIMESTAMP NOT NULL,
+            closed_at TIMESTAMP,
+            last_scan_id INTEGER
+        )
+        ''')
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_port_intervals_target ON port_intervals(target, opened_at, closed_at)")
+        # At most one open interval per port, also the conflict target for extending it
+        cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_port_intervals_open ON port_intervals(target, protocol, port) WHERE closed_at IS NULL")
+        
+        if intervals_is_new:
+            self._backfill_port_intervals(cur)
+        
         # Convert to TimescaleDB hypertable
+        # (inside a savepoint so a failure does not roll back the tables created above)
+        cur.execute("SAVEPOINT hypertable")
         try:
             cur.execute("SELECT create_hypertable('scan_results', 'discovered_at', if_not_exists => TRUE)")
         except psycopg2.Error:
-            conn.rollback()
+            cur.execute("ROLLBACK TO SAVEPOINT hypertable")
             # If hypertable conversion fails, continue anyway
         
         conn.commit()
         cur.close()
         conn.close()
     
+    def _complete_legacy_scans(self, cur):
+        """
+        Mark scans from before the status column as completed at their
+        creation time. They have no status or completion time, so they would
+        otherwise never count as history for change events, recheck planning,
+        estimates or port intervals, and every port they found open would
+        stay open in the port state forever.
+        """
+        cur.execute(
+            "UPDATE scans SET status = 'completed', completed_at = COALESCE(completed_at, created_at) WHERE status IS NULL"
+        )
+    
+    # SQL condition: port scan `s` probed port `k.port` (listed in its parameters)
+    PORT_PROBED_SQL = "s.parameters->'ports' @> to_jsonb(k.port)"
+    
+    def _backfill_port_intervals(self, cur):
+        """
+        Build the port validity intervals from the scan history. An interval
+        opens when a port scan or sweep finds the port open and closes at the
+        first later completed scan of the target that probed the port without
+        finding it open.
+        """
+        cur.execute(f'''
+        INSERT INTO port_intervals (target, protocol, port, opened_at, last_seen, closed_at, last_scan_id)
+        WITH sightings AS (
+            SELECT r.target, r.protocol, r.port, r.discovered_at AS observed_at, r.scan_id, TRUE AS is_open
+            FROM scan_results r JOIN scans s ON s.scan_id = r.scan_id
+            WHERE s.scan_type LIKE 'port_%' AND r.port IS NOT NULL AND r.status IN ('Open', 'Open|Filtered')
+        ),
+        closures AS (
+            SELECT k.target, k.protocol, k.port, s.completed_at AS observed_at, s.scan_id, FALSE AS is_open
+            FROM (SELECT DISTINCT target, protocol, port FROM sightings) k
+            JOIN scans s ON s.target = k.target AND s.scan_type LIKE 'port_scan_%'
+                AND (s.scan_type = 'port_scan_udp') = (k.protocol = 'UDP')
+            WHERE s.status = 'completed' AND s.completed_at IS NOT NULL AND {self.PORT_PROBED_SQL}
+              AND NOT EXISTS (
+                  SELECT 1 FROM scan_results r
+                  WHERE r.scan_id = s.scan_id AND r.port = k.port AND r.status IN ('Open', 'Open|Filtered')
+              )
+        ),
+        marked AS (
+            SELECT *, CASE WHEN is_open AND NOT COALESCE(LAG(is_open) OVER w, FALSE) THEN 1 ELSE 0 END AS opens
+            FROM (SELECT * FROM sightings UNION ALL SELECT * FROM closures) o
+            WINDOW w AS (PARTITION BY target, protocol, port ORDER BY observed_at, is_open DESC)
+        ),
+        runs AS (
+            SELECT *, SUM(opens) OVER (
+                PARTITION BY target, protocol, port ORDER BY observed_at, is_open DESC ROWS UNBOUNDED PRECEDING
+            ) AS run
+            FROM marked
+        )
+        SELECT target, protocol, port,
+               MIN(observed_at) FILTER (WHERE is_open), MAX(observed_at) FILTER (WHERE is_open),
+               MIN(observed_at) FILTER (WHERE NOT is_open), MAX(scan_id) FILTER (WHERE is_open)
+        FROM runs
+        WHERE run > 0
+        GROUP BY target, protocol, port, run
+        ''')
+    
     def create_scan(self, scan_type, target, parameters):
         """Create a new scan record and return its ID."""
         conn = self.get_connection()
@@ -78,29 +427,364 @@ class DatabaseManager:
         
         scan_id = cur.fetchone()[0]
         conn.commit()
+        self._note_write(cur)
         cur.close()
         conn.close()
         
         return scan_id
     
-    def store_port_results(self, scan_id, target_ip, results, scan_type):
-        """Store port scanning results in the database."""
+    def create_scan_group(self, scan_type, targets, parameters, jobs=None):
+        """
+        Create a scan group and one child scan per target in a single transaction.
+        
+        With `jobs` (a dict with ports, timeout, shard_size and options) every
+        child's shards are queued for scanner workers in the same transaction,
+        ordered shard by shard so the first shards of all targets run first.
+        Returns (group_id, [(scan_id, target), ...]) in target order.
+        """
+        conn = self.get_connection()
+        cur = conn.cursor()
+        
+        cur.execute(
+            "INSERT INTO scan_groups (scan_type, parameters, target_count) VALUES (%s, %s, %s) RETURNING group_id",
+            (scan_type, json.dumps(parameters), len(targets))
+        )
+        group_id = cur.fetchone()[0]
+        
+        # One statement for all children instead of a round trip per target
+        cur.execute(
+            """
+            INSERT INTO scans (scan_type, target, parameters, group_id)
+            SELECT %s, target, %s, %s FROM unnest(%s::text[]) WITH ORDINALITY AS t(target, n)
+            ORDER BY n
+            RETURNING scan_id, target
+            """,
+            (scan_type, json.dumps(parameters), group_id, list(targets))
+        )
+        children = sorted(cur.fetchall())
+        
+        if jobs is not None:
+            ports, shard_size = jobs['ports'], jobs.get('shard_size', 1000)
+            shards = [json.dumps(ports[i:i + shard_size]) for i in range(0, len(ports), shard_size)]
+            cur.execute(
+                """
+                INSERT INTO scan_jobs (scan_id, target, ports, scan_type, timeout, options)
+                SELECT s.scan_id, s.target, shard.ports::jsonb, %s, %s, %s
+                FROM unnest(%s::integer[], %s::text[]) AS s(scan_id, target)
+                CROSS JOIN unnest(%s::text[]) WITH ORDINALITY AS shard(ports, n)
+                ORDER BY shard.n, s.scan_id
+                """,
+                (
+                    jobs['scan_type'], jobs['timeout'], json.dumps(jobs.get('options') or {}),
+                    [scan_id for scan_id, _ in children], [target for _, target in children], shards
+                )
+            )
+        
+        conn.commit()
+        self._note_write(cur)
+        cur.close()
+        conn.close()
+        
+        return group_id, children
+    
+    def get_scan_group(self, group_id, consistent=False):
+        """
+        Get a scan group with the number of child scans per status, or None
+        if it does not exist.
+        """
+        conn = self.get_read_connection(consistent)
+        cur = conn.cursor()
+        
+        cur.execute("SELECT * FROM scan_groups WHERE group_id = %s", (group_id,))
+        row = cur.fetchone()
+        if row is None:
+            cur.close()
+            conn.close()
+            return None
+        group = dict(zip([desc[0] for desc in cur.description], row))
+        
+        cur.execute(
+            "SELECT status, COUNT(*) FROM scans WHERE group_id = %s GROUP BY status",
+            (group_id,)
+        )
+        group['status_counts'] = dict(cur.fetchall())
+        
+        cur.close()
+        conn.close()
+        
+        return group
+    
+    # Scan parameters that record how a scan was planned or started without
+    # changing its results; every other parameter must match to coalesce
+    COALESCE_IGNORED_PARAMETERS = ("schedule_id", "mode", "slice_index", "slices", "requested_port_count", "fingerprint")
+    
+    @classmethod
+    def _coalesces_with(cls, existing, requested):
+        """Whether a scan run with `existing` parameters answers a request for `requested`."""
+        existing = existing or {}
+        # A fingerprinted scan also answers a request without fingerprinting, not the reverse
+        if requested.get("fingerprint") and not existing.get("fingerprint"):
+            return False
+        ignored = cls.COALESCE_IGNORED_PARAMETERS
+        return (
+            {key: value for key, value in existing.items() if key not in ignored}
+            == {key: value for key, value in requested.items() if key not in ignored}
+        )
+    
+    def create_scan_coalesced(self, scan_type, target, parameters, freshness, max_running_age=3600):
+        """
+        Create a scan record unless an identical port scan is already running or
+        completed within the freshness window (in seconds). Scans are identical
+        when every parameter that changes their results matches.
+        Returns (scan_id, reason) where reason is None for a new scan, or
+        "in_flight" / "fresh" when an existing scan was reused.
+        """
+        conn = self.get_connection()
+        cur = conn.cursor()
+        
+        # Serialize lookups for the same (target, scan_type) across processes so
+        # concurrent identical requests cannot both miss and create a scan
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (f"{scan_type}:{target}",))
+        
+        cur.execute(
+            """
+            SELECT scan_id, status, parameters FROM scans
+            WHERE target = %s AND scan_type = %s AND parameters->'ports' = %s::jsonb
+              AND ((status = 'running' AND created_at >= NOW() - make_interval(secs => %s))
+                   OR (status = 'completed' AND completed_at >= NOW() - make_interval(secs => %s)))
+            ORDER BY created_at DESC
+            """,
+            (target, scan_type, json.dumps(parameters.get("ports", [])), max_running_age, freshness)
+        )
+        row = next((row for row in cur.fetchall() if self._coalesces_with(row[2], parameters)), None)
+        
+        if row:
+            scan_id, reason = row[0], ("in_flight" if row[1] == 'running' else "fresh")
+        else:
+            cur.execute(
+                "INSERT INTO scans (scan_type, target, parameters) VALUES (%s, %s, %s) RETURNING scan_id",
+                (scan_type, target, json.dumps(parameters))
+            )
+            scan_id, reason = cur.fetchone()[0], None
+        
+        conn.commit()
+        if reason is None:
+            self._note_write(cur)
+        cur.close()
+        conn.close()
+        
+        return scan_id, reason
+    
+    def complete_scan(self, scan_id, status="completed"):
+        """Mark a scan as finished with the given status."""
         conn = self.get_connection()
         cur = conn.cursor()
         
+        cur.execute(
+            "UPDATE scans SET status = %s, completed_at = CURRENT_TIMESTAMP WHERE scan_id = %s",
+            (status, scan_id)
+        )
+        
+        conn.commit()
+        cur.close()
+        conn.close()
+    
+    def store_port_results(self, scan_id, target_ip, results, scan_type, services=None):
+        """Store port scanning results (and optional per-port service info) in the database."""
+        conn = self.get_connection()
+        cur = conn.cursor()
+        
+        self._insert_port_results(cur, scan_id, target_ip, results, scan_type, services)
+        
+        conn.commit()
+        cur.close()
+        conn.close()
+    
+    @staticmethod
+    def _insert_port_results(cur, scan_id, target_ip, results, scan_type, services=None):
+        """Insert the open ports of a scan using an existing cursor."""
         protocol = "TCP" if scan_type != 'udp' else "UDP"
+        services = services or {}
         
+        # Port state vectors filter out non-open ports without walking every port
+        if isinstance(results, PortStateVector):
+            results = results.open_results()
+        
+        open_ports = []
         for port, status in results.items():
             if status == "Open" or status == "Open|Filtered":
+                additional_data = json.dumps(services[port]) if port in services else None
                 cur.execute(
-                    "INSERT INTO scan_results (scan_id, target, port, protocol, status) VALUES (%s, %s, %s, %s, %s)",
-                    (scan_id, target_ip, port, protocol, status)
+                    "INSERT INTO scan_results (scan_id, target, port, protocol, status, additional_data) VALUES (%s, %s, %s, %s, %s, %s)",
+                    (scan_id, target_ip, port, protocol, status, additional_data)
                 )
+                open_ports.append(port)
+        
+        # Keep the exposure index in step with the stored results
+        if open_ports:
+            cur.execute(
+                """
+                INSERT INTO port_exposure (protocol, port, target, last_scan_id)
+                SELECT %s, port, %s, %s FROM unnest(%s::integer[]) AS port
+                ON CONFLICT (protocol, port, target)
+                DO UPDATE SET last_seen = CURRENT_TIMESTAMP, last_scan_id = EXCLUDED.last_scan_id
+                """,
+                (protocol, target_ip, scan_id, open_ports)
+            )
+            # Extend the open interval of each port, or open a new one
+            cur.execute(
+                """
+                INSERT INTO port_intervals (target, protocol, port, opened_at, last_seen, last_scan_id)
+                SELECT %s, %s, port, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP, %s FROM unnest(%s::integer[]) AS port
+                ON CONFLICT (target, protocol, port) WHERE closed_at IS NULL
+                DO UPDATE SET last_seen = CURRENT_TIMESTAMP, last_scan_id = EXCLUDED.last_scan_id
+                """,
+                (target_ip, protocol, scan_id, open_ports)
+            )
+    
+    @staticmethod
+    def _remove_closed_exposure(cur, target_ip, scan_type, results):
+        """Drop exposure index entries, and close the open intervals, of ports a scan found no longer open."""
+        protocol = "TCP" if scan_type != 'udp' else "UDP"
+        open_ports = set(results.open_ports())
+        closed_ports = [port for port in results if port not in open_ports]
+        
+        if closed_ports:
+            cur.execute(
+                "DELETE FROM port_exposure WHERE target = %s AND protocol = %s AND port = ANY(%s)",
+                (target_ip, protocol, closed_ports)
+            )
+            cur.execute(
+                "UPDATE port_intervals SET closed_at = CURRENT_TIMESTAMP WHERE target = %s AND protocol = %s AND port = ANY(%s) AND closed_at IS NULL",
+                (target_ip, protocol, closed_ports)
+            )
+    
+    def remove_closed_exposure(self, target_ip, scan_type, results):
+        """Drop exposure index entries for ports a finished scan found closed or filtered."""
+        conn = self.get_connection()
+        cur = conn.cursor()
+        
+        self._remove_closed_exposure(cur, target_ip, scan_type, results)
+        
+        conn.commit()
+        cur.close()
+        conn.close()
+    
+    def get_exposure(self, ports, protocol="TCP", since=None, limit=None):
+        """
+        Get the targets that currently have any of the given ports open, from
+        the exposure index instead of the scan_results history.
+        """
+        conn = self.get_read_connection()
+        cur = conn.cursor()
+        
+        query = "SELECT protocol, port, target, first_seen, last_seen, last_scan_id FROM port_exposure WHERE protocol = %s AND port = ANY(%s)"
+        params = [protocol, list(ports)]
+        if since:
+            query += " AND last_seen >= %s"
+            params.append(since)
+        query += " ORDER BY port, last_seen DESC"
+        if limit:
+            query += " LIMIT %s"
+            params.append(limit)
+        
+        cur.execute(query, params)
+        columns = [desc[0] for desc in cur.description]
+        exposure = [dict(zip(columns, row)) for row in cur.fetchall()]
+        
+        cur.close()
+        conn.close()
+        
+        return exposure
+    
+    def get_port_intervals(self, target, since=None, until=None, protocol=None, ports=None):
+        """
+        Get the validity intervals of a target's open ports that overlap the
+        period from `since` to `until` (either may be open-ended), oldest
+        first. With since == until, the ports open at that moment.
+        """
+        conn = self.get_read_connection()
+        cur = conn.cursor()
+        
+        query = "SELECT target, protocol, port, opened_at, last_seen, closed_at, last_scan_id FROM port_intervals WHERE target = %s"
+        params = [target]
+        if until:
+            query += " AND opened_at <= %s"
+            params.append(until)
+        if since:
+            query += " AND (closed_at IS NULL OR closed_at > %s)"
+            params.append(since)
+        if protocol:
+            query += " AND protocol = %s"
+            params.append(protocol)
+        if ports:
+            query += " AND port = ANY(%s)"
+            params.append(list(ports))
+        query += " ORDER BY opened_at, protocol, port"
+        
+        cur.execute(query, params)
+        columns = [desc[0] for desc in cur.description]
+        intervals = [dict(zip(columns, row)) for row in cur.fetchall()]
+        
+        cur.close()
+        conn.close()
+        
+        return intervals
+    
+    def get_last_port_scan(self, target, before=None):
+        """
+        Get the scan_id and completed_at of the latest completed port scan of
+        a target, optionally only up to `before`. Returns None if there is none.
+        """
+        conn = self.get_read_connection()
+        cur = conn.cursor()
+        
+        query = "SELECT scan_id, completed_at FROM scans WHERE target = %s AND scan_type LIKE 'port_scan_%%' AND status = 'completed'"
+        params = [target]
+        if before:
+            query += " AND completed_at <= %s"
+            params.append(before)
+        query += " ORDER BY completed_at DESC LIMIT 1"
+        
+        cur.execute(query, params)
+        row = cur.fetchone()
+        
+        cur.close()
+        conn.close()
+        
+        return {"scan_id": row[0], "completed_at": row[1]} if row else None
+    
+    def store_port_results_many(self, scan_id, results_by_target, scan_type):
+        """Store port results of several targets ({target: {port: status}}) in one transaction."""
+        conn = self.get_connection()
+        cur = conn.cursor()
+        
+        for target_ip, results in results_by_target.items():
+            self._insert_port_results(cur, scan_id, target_ip, results, scan_type)
         
         conn.commit()
         cur.close()
         conn.close()
     
+    def update_port_services(self, scan_id, services):
+        """Attach service fingerprints to port results that were already stored."""
+        conn = self.get_connection()
+        cur = conn.cursor()
+        
+        self._update_port_services(cur, scan_id, services)
+        
+        conn.commit()
+        cur.close()
+        conn.close()
+    
+    @staticmethod
+    def _update_port_services(cur, scan_id, services):
+        for port, info in services.items():
+            cur.execute(
+                "UPDATE scan_results SET additional_data = %s WHERE scan_id = %s AND port = %s",
+                (json.dumps(info), scan_id, port)
+            )
+    
     def store_host_results(self, scan_id, hosts):
         """Store host discovery results in the database."""
         conn = self.get_connection()
@@ -116,9 +800,9 @@ class DatabaseManager:
         cur.close()
         conn.close()
     
-    def get_results(self, scan_id=None, target=None):
+    def get_results(self, scan_id=None, target=None, consistent=False):
         """Get scan results from the database."""
-        conn = self.get_connection()
+        conn = self.get_read_connection(consistent)
         cur = conn.cursor()
         
         if scan_id:
@@ -142,18 +826,198 @@ class DatabaseManager:
         
         return results
     
-    def get_scans(self, limit=100, target=None):
-        """Get scan metadata from the database."""
+    def get_host_liveness(self, targets):
+        """Get {target: alive} for the given targets that have an unexpired liveness entry."""
         conn = self.get_connection()
         cur = conn.cursor()
         
-        if target:
+        cur.execute(
+            "SELECT target, alive FROM host_liveness WHERE target = ANY(%s) AND expires_at > CURRENT_TIMESTAMP",
+            (list(targets),)
+        )
+        liveness = dict(cur.fetchall())
+        
+        cur.close()
+        conn.close()
+        
+        return liveness
+    
+    def record_host_liveness(self, entries, source, alive_ttl, dead_ttl):
+        """Upsert (target, alive) observations; entries expire after the TTL for their state."""
+        conn = self.get_connection()
+        cur = conn.cursor()
+        
+        cur.execute(
+            """
+            INSERT INTO host_liveness (target, alive, source, checked_at, expires_at)
+            SELECT target, alive, %s, CURRENT_TIMESTAMP,
+                   CURRENT_TIMESTAMP + make_interval(secs => CASE WHEN alive THEN %s ELSE %s END)
+            FROM unnest(%s::text[], %s::boolean[]) AS e(target, alive)
+            ON CONFLICT (target) DO UPDATE SET
+                alive = EXCLUDED.alive, source = EXCLUDED.source,
+                checked_at = EXCLUDED.checked_at, expires_at = EXCLUDED.expires_at
+            """,
+            (source, alive_ttl, dead_ttl, [target for target, _ in entries], [alive for _, alive in entries])
+        )
+        
+        conn.commit()
+        cur.close()
+        conn.close()
+    
+    def upsert_host_inventory(self, hosts):
+        """
+        Merge passively seen hosts (dicts with ip, mac, source, first_seen and
+        last_seen) into the inventory. The latest sighting decides the MAC.
+        """
+        conn = self.get_connection()
+        cur = conn.cursor()
+        
+        cur.execute(
+            """
+            INSERT INTO host_inventory (ip, mac, source, first_seen, last_seen)
+            SELECT * FROM unnest(%s::text[], %s::text[], %s::text[], %s::timestamp[], %s::timestamp[])
+            ON CONFLICT (ip) DO UPDATE SET
+                mac = CASE WHEN EXCLUDED.last_seen >= host_inventory.last_seen THEN EXCLUDED.mac ELSE host_inventory.mac END,
+                source = CASE WHEN EXCLUDED.last_seen >= host_inventory.last_seen THEN EXCLUDED.source ELSE host_inventory.source END,
+                first_seen = LEAST(host_inventory.first_seen, EXCLUDED.first_seen),
+                last_seen = GREATEST(host_inventory.last_seen, EXCLUDED.last_seen)
+            """,
+            tuple([host[key] for host in hosts] for key in ('ip', 'mac', 'source', 'first_seen', 'last_seen'))
+        )
+        
+        conn.commit()
+        cur.close()
+        conn.close()
+    
+    def get_host_inventory(self, network=None, since=None, limit=None):
+        """Get inventory hosts, optionally only those in a CIDR network and/or seen since a time."""
+        conn = self.get_read_connection()
+        cur = conn.cursor()
+        
+        query = "SELECT ip, mac, source, first_seen, last_seen FROM host_inventory WHERE true"
+        params = []
+        if network:
+            query += " AND ip::inet <<= %s::inet"
+            params.append(network)
+        if since:
+            query += " AND last_seen >= %s"
+            params.append(since)
+        query += " ORDER BY ip::inet"
+        if limit:
+            query += " LIMIT %s"
+            params.append(limit)
+        
+        cur.execute(query, params)
+        columns = [desc[0] for desc in cur.description]
+        hosts = [dict(zip(columns, row)) for row in cur.fetchall()]
+        
+        cur.close()
+        conn.close()
+        
+        return hosts
+    
+    def iter_results_batch(self, scan_ids=None, targets=None, batch_size=1000, consistent=False):
+        """
+        Yield the results of many scans and/or targets from one query, in
+        (scan_id, port) order. Rows are read through a server-side cursor in
+        batches, so large result sets are not held in memory at once.
+        """
+        conn = self.get_read_connection(consistent)
+        cur = conn.cursor(name="results_batch")
+        
+        try:
             cur.execute(
-                "SELECT * FROM scans WHERE target = %s ORDER BY created_at DESC LIMIT %s",
-                (target, limit)
+                """
+                SELECT * FROM scan_results
+                WHERE scan_id = ANY(%s) OR target = ANY(%s)
+                ORDER BY scan_id, port NULLS LAST, result_id
+                """,
+                (list(scan_ids or []), list(targets or []))
             )
-        else:
-            cur.execute("SELECT * FROM scans ORDER BY created_at DESC LIMIT %s", (limit,))
+            
+            columns = None
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                columns = columns or [desc[0] for desc in cur.description]
+                for row in rows:
+                    yield dict(zip(columns, row))
+        finally:
+            cur.close()
+            conn.close()
+    
+    # Columns of each row yielded by iter_scan_history(), in order
+    SCAN_HISTORY_COLUMNS = (
+        'result_id', 'scan_id', 'scan_type', 'target', 'port',
+        'protocol', 'status', 'additional_data', 'discovered_at'
+    )
+    
+    def iter_scan_history(self, since, until, batch_size=10000):
+        """
+        Yield every result discovered in [since, until), with the type of its
+        scan, as lists of up to `batch_size` row tuples in discovered_at order
+        (columns as in SCAN_HISTORY_COLUMNS). Rows are read through a
+        server-side cursor from a read replica when one is configured.
+        """
+        conn = self.get_read_connection()
+        cur = conn.cursor(name="scan_history")
+    
+        try:
+            cur.execute(
+                """
+                SELECT r.result_id, r.scan_id, s.scan_type, r.target, r.port,
+                       r.protocol, r.status, r.additional_data, r.discovered_at
+                FROM scan_results r
+                JOIN scans s ON s.scan_id = r.scan_id
+                WHERE r.discovered_at >= %s AND r.discovered_at < %s
+                ORDER BY r.discovered_at, r.result_id
+                """,
+                (since, until)
+            )
+    
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cur.close()
+            conn.close()
+    
+    def get_scan(self, scan_id):
+        """Get a single scan record, or None if it does not exist."""
+        conn = self.get_connection()
+        cur = conn.cursor()
+        
+        cur.execute("SELECT * FROM scans WHERE scan_id = %s", (scan_id,))
+        row = cur.fetchone()
+        scan = dict(zip([desc[0] for desc in cur.description], row)) if row else None
+        
+        cur.close()
+        conn.close()
+        
+        return scan
+    
+    def get_scans(self, limit=100, target=None, group_id=None, consistent=False):
+        """Get scan metadata from the database."""
+        conn = self.get_read_connection(consistent)
+        cur = conn.cursor()
+        
+        query = "SELECT * FROM scans"
+        conditions, params = [], []
+        if target:
+            conditions.append("target = %s")
+            params.append(target)
+        if group_id is not None:
+            conditions.append("group_id = %s")
+            params.append(group_id)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY created_at DESC LIMIT %s"
+        params.append(limit)
+        
+        cur.execute(query, params)
         
         columns = [desc[0] for desc in cur.description]
         scans = [dict(zip(columns, row)) for row in cur.fetchall()]
@@ -161,4 +1025,692 @@ class DatabaseManager:
         cur.close()
         conn.close()
         
-        return scans
\ No newline at end of file
+        return scans
+    
+    def get_previous_port_state(self, target, scan_type, before_scan_id):
+        """
+        Get the open ports and scanned ports of the most recent completed port
+        scan of the same type on a target before the given scan. Returns None if
+        there is none.
+        """
+        conn = self.get_connection()
+        cur = conn.cursor()
+        
+        cur.execute(
+            "SELECT scan_id, parameters FROM scans WHERE target = %s AND scan_type = %s AND scan_id < %s AND status = 'completed' ORDER BY scan_id DESC LIMIT 1",
+            (target, scan_type, before_scan_id)
+        )
+        row = cur.fetchone()
+        
+        if not row:
+            cur.close()
+            conn.close()
+            return None
+        
+        previous_scan_id, parameters = row
+        cur.execute(
+            "SELECT port FROM scan_results WHERE scan_id = %s AND status IN ('Open', 'Open|Filtered')",
+            (previous_scan_id,)
+        )
+        open_ports = [r[0] for r in cur.fetchall()]
+        
+        cur.close()
+        conn.close()
+        
+        return {
+            "scan_id": previous_scan_id,
+            "open_ports": open_ports,
+            "ports": (parameters or {}).get("ports", [])
+        }
+    
+    def get_last_known_open_ports(self, target, scan_type, ports, max_scans=50):
+        """
+        Work out which of the given ports were open the last time each was probed.
+        
+        Walks previous scans of the same type on the target from newest to oldest.
+        The most recent scan that covered a port decides its state, since only open
+        ports are stored in scan_results. Returns (open_ports, last_slice_index)
+        where last_slice_index is the rotation step of the most recent recheck scan,
+        or (None, None) if the target has no history.
+        """
+        conn = self.get_connection()
+        cur = conn.cursor()
+        
+        cur.execute(
+            "SELECT scan_id, parameters FROM scans WHERE target = %s AND scan_type = %s AND status = 'completed' ORDER BY scan_id DESC LIMIT %s",
+            (target, scan_type, max_scans)
+        )
+        history = cur.fetchall()
+        
+        if not history:
+            cur.close()
+            conn.close()
+            return None, None
+        
+        cur.execute(
+            "SELECT scan_id, port FROM scan_results WHERE scan_id = ANY(%s) AND status IN ('Open', 'Open|Filtered')",
+            ([scan_id for scan_id, _ in history],)
+        )
+        open_by_scan = {}
+        for scan_id, port in cur.fetchall():
+            open_by_scan.setdefault(scan_id, set()).add(port)
+        
+        cur.close()
+        conn.close()
+        
+        undecided = set(ports)
+        open_ports = set()
+        last_slice_index = None
+        
+        for scan_id, parameters in history:
+            parameters = parameters or {}
+            if last_slice_index is None and parameters.get("mode") == "recheck":
+                last_slice_index = parameters.get("slice_index")
+            
+            covered = undecided.intersection(parameters.get("ports", []))
+            open_ports.update(covered & open_by_scan.get(scan_id, set()))
+            undecided -= covered
+            
+            if not undecided and last_slice_index is not None:
+                break
+        
+        return open_ports, last_slice_index
+    
+    def get_open_port_frequency(self, protocol, days=90):
+        """Count on how many distinct targets each port was found open recently."""
+        conn = self.get_connection()
+        cur = conn.cursor()
+        
+        cur.execute(
+            """
+            SELECT port, COUNT(DISTINCT target) FROM scan_results
+            WHERE port IS NOT NULL AND protocol = %s AND status = 'Open'
+              AND discovered_at >= NOW() - make_interval(days => %s)
+            GROUP BY port
+            """,
+            (protocol, days)
+        )
+        frequency = dict(cur.fetchall())
+        
+        cur.close()
+        conn.close()
+        
+        return frequency
+    
+    def get_scan_timing_history(self, targets, scan_type, max_scans=5):
+        """
+        Get {target: [(duration_seconds, port_count, timeout, open_count, retries, backend), ...]}
+        for the most recent completed scans of the given type on each target.
+        Queued scans are timed from their first claimed job, so time spent
+        waiting for a worker is not counted. retries and backend are None for
+        scans that did not record them.
+        """
+        conn = self.get_read_connection()
+        cur = conn.cursor()
+        
+        cur.execute(
+            """
+            WITH recent AS (
+                SELECT scan_id, target, parameters,
+                       EXTRACT(EPOCH FROM completed_at - COALESCE(
+                           (SELECT MIN(j.claimed_at) FROM scan_jobs j WHERE j.scan_id = s.scan_id), created_at
+                       )) AS duration,
+                       ROW_NUMBER() OVER (PARTITION BY target ORDER BY created_at DESC) AS n
+                FROM scans s
+                WHERE target = ANY(%s) AND scan_type = %s AND status = 'completed'
+                  AND completed_at IS NOT NULL AND jsonb_typeof(parameters->'ports') = 'array'
+            )
+            SELECT r.target, r.duration, jsonb_array_length(r.parameters->'ports'),
+                   COALESCE((r.parameters->>'timeout')::float, 1), COUNT(sr.result_id),
+                   (r.parameters->>'retries')::int, r.parameters->>'backend'
+            FROM recent r
+            LEFT JOIN scan_results sr ON sr.target = r.target AND sr.scan_id = r.scan_id AND sr.status = 'Open'
+            WHERE r.n <= %s
+            GROUP BY r.scan_id, r.target, r.duration, r.parameters
+            """,
+            (list(targets), scan_type, max_scans)
+        )
+        
+        history = {}
+        for target, duration, port_count, timeout, open_count, retries, backend in cur.fetchall():
+            history.setdefault(target, []).append((float(duration), port_count, timeout, open_count, retries, backend))
+        
+        cur.close()
+        conn.close()
+        
+        return history
+    
+    def count_active_workers(self, within=60):
+        """Number of scanner workers that sent a job heartbeat in the last `within` seconds."""
+        conn = self.get_connection()
+        cur = conn.cursor()
+        
+        cur.execute(
+            "SELECT COUNT(DISTINCT worker_id) FROM scan_jobs WHERE heartbeat_at >= NOW() - make_interval(secs => %s)",
+            (within,)
+        )
+        count = cur.fetchone()[0]
+        
+        cur.close()
+        conn.close()
+        
+        return count
+    
+    def create_webhook(self, url, events=None, secret=None):
+        """Register a webhook URL and return its ID."""
+        conn = self.get_connection()
+        cur = conn.cursor()
+        
+        cur.execute(
+            "INSERT INTO webhooks (url, events, secret) VALUES (%s, %s, %s) RETURNING webhook_id",
+            (url, json.dumps(events or []), secret)
+        )
+        
+        webhook_id = cur.fetchone()[0]
+        conn.commit()
+        cur.close()
+        conn.close()
+        
+        return webhook_id
+    
+    def get_webhooks(self):
+        """Get all registered webhooks."""
+        conn = self.get_connection()
+        cur = conn.cursor()
+        
+        cur.execute("SELECT * FROM webhooks ORDER BY webhook_id")
+        
+        columns = [desc[0] for desc in cur.description]
+        webhooks = [dict(zip(columns, row)) for row in cur.fetchall()]
+        
+        cur.close()
+        conn.close()
+        
+        return webhooks
+    
+    def delete_webhook(self, webhook_id):
+        """Delete a webhook. Returns True if it existed."""
+        conn = self.get_connection()
+        cur = conn.cursor()
+        
+        cur.execute("DELETE FROM webhooks WHERE webhook_id = %s", (webhook_id,))
+        deleted = cur.rowcount > 0
+        
+        conn.commit()
+        cur.close()
+        conn.close()
+        
+        return deleted
+    
+    def create_schedule(self, name, targets, ports, scan_type, mode, timeout, interval_seconds):
+        """Create a recurring scan schedule and return its ID."""
+        conn = self.get_connection()
+        cur = conn.cursor()
+        
+        cur.execute(
+            """
+            INSERT INTO scan_schedules (name, targets, ports, scan_type, mode, timeout, interval_seconds)
+            VALUES (%s, %s, %s, %s, %s, %s, %s) RETURNING schedule_id
+            """,
+            (name, json.dumps(targets), json.dumps(ports), scan_type, mode, timeout, interval_seconds)
+        )
+        
+        schedule_id = cur.fetchone()[0]
+        conn.commit()
+        cur.close()
+        conn.close()
+        
+        return schedule_id
+    
+    def get_schedules(self, enabled_only=False):
+        """Get recurring scan schedules."""
+        conn = self.get_connection()
+        cur = conn.cursor()
+        
+        if enabled_only:
+            cur.execute("SELECT * FROM scan_schedules WHERE enabled ORDER BY schedule_id")
+        else:
+            cur.execute("SELECT * FROM scan_schedules ORDER BY schedule_id")
+        
+        columns = [desc[0] for desc in cur.description]
+        schedules = [dict(zip(columns, row)) for row in cur.fetchall()]
+        
+        cur.close()
+        conn.close()
+        
+        return schedules
+    
+    def set_schedule_enabled(self, schedule_id, enabled):
+        """Enable or disable a schedule. Returns True if it exists."""
+        conn = self.get_connection()
+        cur = conn.cursor()
+        
+        cur.execute("UPDATE scan_schedules SET enabled = %s WHERE schedule_id = %s", (enabled, schedule_id))
+        updated = cur.rowcount > 0
+        
+        conn.commit()
+        cur.close()
+        conn.close()
+        
+        return updated
+    
+    def delete_schedule(self, schedule_id):
+        """Delete a schedule. Returns True if it existed."""
+        conn = self.get_connection()
+        cur = conn.cursor()
+        
+        cur.execute("DELETE FROM scan_schedules WHERE schedule_id = %s", (schedule_id,))
+        deleted = cur.rowcount > 0
+        
+        conn.commit()
+        cur.close()
+        conn.close()
+        
+        return deleted
+    
+    def enqueue_scan_jobs(self, scan_id, target_ip, ports, scan_type, timeout, shard_size=1000, options=None):
+        """Split a port scan into shards and queue them for scanner workers."""
+        conn = self.get_connection()
+        cur = conn.cursor()
+        
+        for i in range(0, len(ports), shard_size):
+            cur.execute(
+                "INSERT INTO scan_jobs (scan_id, target, ports, scan_type, timeout, options) VALUES (%s, %s, %s, %s, %s, %s)",
+                (scan_id, target_ip, json.dumps(ports[i:i + shard_size]), scan_type, timeout, json.dumps(options or {}))
+            )
+        
+        conn.commit()
+        cur.close()
+        conn.close()
+    
+    def claim_scan_job(self, worker_id):
+        """
+        Claim the oldest pending job for a worker. Concurrent workers skip rows
+        that are locked by another claim, so each job goes to exactly one worker.
+        Returns the job as a dict, or None if the queue is empty.
+        """
+        conn = self.get_connection()
+        cur = conn.cursor()
+        
+        cur.execute(
+            """
+            UPDATE scan_jobs
+            SET status = 'claimed', worker_id = %s, attempts = attempts + 1,
+                claimed_at = CURRENT_TIMESTAMP, heartbeat_at = CURRENT_TIMESTAMP
+            WHERE job_id = (
+                SELECT job_id FROM scan_jobs WHERE status = 'pending'
+                ORDER BY job_id FOR UPDATE SKIP LOCKED LIMIT 1
+            )
+            RETURNING job_id, scan_id, target, ports, scan_type, timeout, options, attempts
+            """,
+            (worker_id,)
+        )
+        row = cur.fetchone()
+        job = dict(zip([desc[0] for desc in cur.description], row)) if row else None
+        if job and job['attempts'] > 1:
+            self._discard_job_results(cur, job)
+        
+        conn.commit()
+        cur.close()
+        conn.close()
+        
+        return job
+    
+    @staticmethod
+    def _discard_job_results(cur, job):
+        """Delete the results an abandoned earlier attempt of a job streamed, before it is retried."""
+        cur.execute(
+            "DELETE FROM scan_results WHERE scan_id = %s AND target = %s AND port = ANY(%s)",
+            (job['scan_id'], job['target'], list(job['ports']))
+        )
+    
+    def store_job_port_results(self, job_id, worker_id, results_by_target, scan_type):
+        """
+        Store port results found so far by a claimed job ({target: {port:
+        status}}). Returns False, storing nothing, if the job was reassigned
+        to another worker in the meantime.
+        """
+        conn = self.get_connection()
+        cur = conn.cursor()
+        
+        # The row lock keeps the job from being requeued while its results are written
+        cur.execute(
+            "SELECT scan_id FROM scan_jobs WHERE job_id = %s AND worker_id = %s AND status = 'claimed' FOR UPDATE",
+            (job_id, worker_id)
+        )
+        row = cur.fetchone()
+        if row:
+            for target_ip, results in results_by_target.items():
+                self._insert_port_results(cur, row[0], target_ip, results, scan_type)
+        
+        conn.commit()
+        cur.close()
+        conn.close()
+        
+        return row is not None
+    
+    def heartbeat_scan_job(self, job_id, worker_id):
+        """Refresh a claimed job's heartbeat. Returns False if the worker lost the job."""
+        conn = self.get_connection()
+        cur = conn.cursor()
+        
+        cur.execute(
+            "UPDATE scan_jobs SET heartbeat_at = CURRENT_TIMESTAMP WHERE job_id = %s AND worker_id = %s AND status = 'claimed'",
+            (job_id, worker_id)
+        )
+        owned = cur.rowcount > 0
+        
+        conn.commit()
+        cur.close()
+        conn.close()
+        
+        return owned
+    
+    def complete_scan_job(self, job_id, worker_id, results=None, status="done", services=None, close_missing=True):
+        """
+        Mark a job finished. Its open ports were already stored while it ran
+        (store_job_port_results); `results` only close the exposure entries
+        and port intervals of ports found no longer open, when `close_missing`
+        (not for demoted, single-pass scans), and `services` are attached to
+        the stored ports. Nothing is written if the job was reassigned to
+        another worker in the meantime. When the last shard of a scan
+        finishes, the scan itself is marked completed. Returns (owned, scan_finished).
+        """
+        conn = self.get_connection()
+        cur = conn.cursor()
+        
+        cur.execute(
+            "SELECT scan_id, target, scan_type FROM scan_jobs WHERE job_id = %s AND worker_id = %s AND status = 'claimed' FOR UPDATE",
+            (job_id, worker_id)
+        )
+        row = cur.fetchone()
+        if not row:
+            conn.rollback()
+            cur.close()
+            conn.close()
+            return False, False
+        
+        scan_id, target_ip, scan_type = row
+        
+        # Lock the scan so two workers finishing its last shards cannot both miss the other
+        cur.execute("SELECT scan_id FROM scans WHERE scan_id = %s FOR UPDATE", (scan_id,))
+        
+        if results and close_missing:
+            self._remove_closed_exposure(cur, target_ip, scan_type, results)
+        if services:
+            self._update_port_services(cur, scan_id, services)
+        
+        cur.execute(
+            "UPDATE scan_jobs SET status = %s, completed_at = CURRENT_TIMESTAMP WHERE job_id = %s",
+            (status, job_id)
+        )
+        
+        cur.execute(
+            """
+            SELECT COUNT(*) FILTER (WHERE status IN ('pending', 'claimed')),
+                   COUNT(*) FILTER (WHERE status = 'failed'),
+                   COUNT(*) FILTER (WHERE status = 'skipped'), COUNT(*)
+            FROM scan_jobs WHERE scan_id = %s
+            """,
+            (scan_id,)
+        )
+        remaining, failed, skipped, total = cur.fetchone()
+        
+        scan_finished = remaining == 0
+        if scan_finished:
+            scan_status = "failed" if failed else "skipped" if skipped == total else "completed"
+            cur.execute(
+                "UPDATE scans SET status = %s, completed_at = CURRENT_TIMESTAMP WHERE scan_id = %s",
+                (scan_status, scan_id)
+            )
+        
+        conn.commit()
+        cur.close()
+        conn.close()
+        
+        return True, scan_finished
+    
+    def requeue_stale_scan_jobs(self, stale_after, max_attempts=3):
+        """
+        Return jobs whose worker stopped sending heartbeats to the queue.
+        Jobs that already used up their attempts are marked failed instead.
+        Returns a list of (job_id, worker_id) pairs that were failed.
+        """
+        conn = self.get_connection()
+        cur = conn.cursor()
+        
+        cur.execute(
+            """
+            UPDATE scan_jobs SET status = 'pending', worker_id = NULL
+            WHERE status = 'claimed' AND attempts < %s
+              AND heartbeat_at < NOW() - make_interval(secs => %s)
+            """,
+            (max_attempts, stale_after)
+        )
+        cur.execute(
+            """
+            SELECT job_id, worker_id FROM scan_jobs
+            WHERE status = 'claimed' AND attempts >= %s
+              AND heartbeat_at < NOW() - make_interval(secs => %s)
+            """,
+            (max_attempts, stale_after)
+        )
+        exhausted = cur.fetchall()
+        
+        conn.commit()
+        cur.close()
+        conn.close()
+        
+        return exhausted
+
+    def import_scans(self, origin, scans):
+        """
+        Import finished scans, with their results, from another database such
+        as an edge node's SQLite store, in one transaction.
+        
+        Each scan is a scans row (a dict) with its scan_results rows under
+        "results". Scans already imported from the same origin are not stored
+        twice, so an interrupted sync can simply be retried. The exposure
+        index and port intervals are updated as the scans would have updated
+        them, without letting older scans override newer findings.
+        Returns {origin scan_id: scan_id here}.
+        """
+        conn = self.get_connection()
+        cur = conn.cursor()
+        imported = {}
+        
+        for scan in scans:
+            cur.execute(
+                """
+                INSERT INTO scans (scan_type, target, parameters, status, created_at, completed_at, origin, origin_scan_id)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                ON CONFLICT (origin, origin_scan_id) WHERE origin IS NOT NULL DO NOTHING
+                RETURNING scan_id
+                """,
+                (scan['scan_type'], scan['target'], json.dumps(scan['parameters']), scan['status'],
+                 scan['created_at'], scan['completed_at'], origin, scan['scan_id'])
+            )
+            row = cur.fetchone()
+            if row is None:
+                # Imported by an earlier sync that did not get to record it
+                cur.execute("SELECT scan_id FROM scans WHERE origin = %s AND origin_scan_id = %s", (origin, scan['scan_id']))
+                imported[scan['scan_id']] = cur.fetchone()[0]
+                continue
+            scan_id = imported[scan['scan_id']] = row[0]
+            
+            results = scan.get('results') or []
+            if results:
+                cur.execute(
+                    """
+                    INSERT INTO scan_results (scan_id, target, port, protocol, status, additional_data, discovered_at)
+                    SELECT %s, target, port, protocol, status, additional_data::jsonb, discovered_at
+                    FROM unnest(%s::text[], %s::integer[], %s::text[], %s::text[], %s::text[], %s::timestamp[])
+                        AS r(target, port, protocol, status, additional_data, discovered_at)
+                    """,
+                    (
+                        scan_id, [r['target'] for r in results], [r['port'] for r in results],
+                        [r['protocol'] for r in results], [r['status'] for r in results],
+                        [json.dumps(r['additional_data']) if r['additional_data'] is not None else None for r in results],
+                        [r['discovered_at'] for r in results]
+                    )
+                )
+            
+            if not scan['scan_type'].startswith('port_') or scan['status'] != 'completed':
+                continue
+            
+            opened = [r for r in results if r['port'] is not None and r['status'] in ('Open', 'Open|Filtered')]
+            if opened:
+                cur.execute(
+                    """
+                    INSERT INTO port_exposure (protocol, port, target, first_seen, last_seen, last_scan_id)
+                    SELECT protocol, port, target, seen, seen, %s
+                    FROM unnest(%s::text[], %s::integer[], %s::text[], %s::timestamp[]) AS e(protocol, port, target, seen)
+                    ON CONFLICT (protocol, port, target) DO UPDATE SET
+                        first_seen = LEAST(port_exposure.first_seen, EXCLUDED.first_seen),
+                        last_seen = GREATEST(port_exposure.last_seen, EXCLUDED.last_seen),
+                        last_scan_id = CASE WHEN EXCLUDED.last_seen >= port_exposure.last_seen
+                                            THEN EXCLUDED.last_scan_id ELSE port_exposure.last_scan_id END
+                    """,
+                    (
+                        scan_id, [r['protocol'] for r in opened], [r['port'] for r in opened],
+                        [r['target'] for r in opened], [r['discovered_at'] for r in opened]
+                    )
+                )
+                # Sightings older than a known closure would reopen a port that was closed since
+                cur.execute(
+                    """
+                    INSERT INTO port_intervals (target, protocol, port, opened_at, last_seen, last_scan_id)
+                    SELECT target, protocol, port, seen, seen, %s
+                    FROM unnest(%s::text[], %s::integer[], %s::text[], %s::timestamp[]) AS e(protocol, port, target, seen)
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM port_intervals p
+                        WHERE p.target = e.target AND p.protocol = e.protocol AND p.port = e.port AND p.closed_at >= e.seen
+                    )
+                    ON CONFLICT (target, protocol, port) WHERE closed_at IS NULL DO UPDATE SET
+                        opened_at = LEAST(port_intervals.opened_at, EXCLUDED.opened_at),
+                        last_seen = GREATEST(port_intervals.last_seen, EXCLUDED.last_seen),
+                        last_scan_id = CASE WHEN EXCLUDED.last_seen >= port_intervals.last_seen
+                                            THEN EXCLUDED.last_scan_id ELSE port_intervals.last_scan_id END
+                    """,
+                    (
+                        scan_id, [r['protocol'] for r in opened], [r['port'] for r in opened],
+                        [r['target'] for r in opened], [r['discovered_at'] for r in opened]
+                    )
+                )
+            
+            # Ports a single-target scan probed but did not find open are no
+            # longer exposed, unless a later scan saw them open
+            if scan['scan_type'].startswith('port_scan_'):
+                protocol = "UDP" if scan['scan_type'] == 'port_scan_udp' else "TCP"
+                open_ports = {r['port'] for r in opened}
+                closed_ports = [port for port in (scan['parameters'] or {}).get('ports', []) if port not in open_ports]
+                if closed_ports:
+                    cur.execute(
+                        "DELETE FROM port_exposure WHERE target = %s AND protocol = %s AND port = ANY(%s) AND last_seen < %s",
+                        (scan['target'], protocol, closed_ports, scan['completed_at'])
+                    )
+                    cur.execute(
+                        """
+                        UPDATE port_intervals SET closed_at = %s
+                        WHERE target = %s AND protocol = %s AND port = ANY(%s) AND closed_at IS NULL AND last_seen < %s
+                        """,
+                        (scan['completed_at'], scan['target'], protocol, closed_ports, scan['completed_at'])
+                    )
+        
+        conn.commit()
+        cur.close()
+        conn.close()
+        
+        return imported
+
+class PortResultBuffer:
+    """
+    Collects port results while a scan runs and writes open ports to the
+    database in small batches, so findings show up before the scan finishes.
+    A batch that cannot be written is kept and retried with the next one;
+    close() raises if results are still unwritten at the end of the scan.
+    
+    For a queued job, pass its `job_id` and the `worker_id` that claimed it:
+    results are then only written while the worker still owns the job.
+    """
+    
+    def __init__(self, db_manager, scan_id, target_ip, scan_type, batch_size=None, flush_interval=None,
+                 job_id=None, worker_id=None):
+        """Initialize with explicit settings or use environment variables."""
+        self.db_manager = db_manager
+        self.scan_id = scan_id
+        self.target_ip = target_ip
+        self.scan_type = scan_type
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.batch_size = batch_size or int(os.environ.get('RESULT_FLUSH_BATCH', 20))
+        self.flush_interval = flush_interval or float(os.environ.get('RESULT_FLUSH_INTERVAL', 2))
+        self.pending = {}
+        self.last_flush = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def on_result(self, port, status):
+        """Scanner callback: buffer open ports and flush when the batch is full or old."""
+        self.on_target_result(self.target_ip, port, status)
+    
+    def on_target_result(self, target_ip, port, status):
+        """Callback for scans that cover many targets, such as sweeps."""
+        with self._lock:
+            if status == "Open" or status == "Open|Filtered":
+                self.pending[(target_ip, port)] = status
+            
+            due = len(self.pending) >= self.batch_size or (
+                self.pending and time.monotonic() - self.last_flush >= self.flush_interval
+            )
+            if not due:
+                return
+            batch, self.pending = self.pending, {}
+            self.last_flush = time.monotonic()
+        
+        # Write outside the lock so scanner threads are not held up by the database
+        try:
+            self._store(batch)
+        except Exception as e:
+            print(f"Error storing port results for scan {self.scan_id}, will retry: {e}")
+            self._requeue(batch)
+    
+    def close(self):
+        """Write any remaining buffered results. Raises if they cannot be written."""
+        with self._lock:
+            batch, self.pending = self.pending, {}
+        if batch:
+            try:
+                self._store(batch)
+            except Exception:
+                self._requeue(batch)
+                raise
+    
+    def _requeue(self, batch):
+        """Put a batch that failed to store back, without overwriting newer results."""
+        with self._lock:
+            for key, status in batch.items():
+                self.pending.setdefault(key, status)
+    
+    def _store(self, batch):
+        by_target = {}
+        for (target_ip, port), status in batch.items():
+            by_target.setdefault(target_ip, {})[port] = status
+        if self.job_id is None:
+            self.db_manager.store_port_results_many(self.scan_id, by_target, self.scan_type)
+        elif not self.db_manager.store_job_port_results(self.job_id, self.worker_id, by_target, self.scan_type):
+            # Another worker owns the job now and scans it again
+            print(f"Scan job {self.job_id} was reassigned; dropping {len(batch)} results")
+
+def create_database_manager():
+    """
+    Build the storage backend selected by DB_BACKEND: "postgres" (the
+    default, PostgreSQL/TimescaleDB) or "sqlite" (a single local file, for
+    small edge scanner nodes).
+    """
+    backend = os.environ.get('DB_BACKEND', 'postgres').lower()
+    if backend == 'sqlite':
+        from modules.sqlite_db import SQLiteDatabaseManager
+        return SQLiteDatabaseManager()
+    if backend != 'postgres':
+        raise ValueError(f"Unknown DB_BACKEND: {backend}. Use 'postgres' or 'sqlite'")
+    return DatabaseManager()
@@ -0,0 +1,196 @@
+import math
+import os
+import statistics
+from modules.packetio import PacketProbeEngine
+from modules.scanner import NetworkScanner
+
+class ScanEstimator:
+    """
+    Predicts what a port scan will cost before it is started: how many probes
+    and packets it sends and roughly how long it takes.
+
+    Duration comes from a model of the scanner (pass timeouts, worker count
+    and RATE_LIMIT for scapy, RAW_SEND_RATE for the raw packet backend) fed
+    with each target's share of answered probes. Targets with completed scans
+    of the same type get their estimate scaled by how long those scans really
+    took compared with the model, which accounts for round-trip time and
+    filtering the model cannot see.
+    """
+
+    # Seconds an answered probe takes, before calibration against history
+    DEFAULT_RTT = 0.05
+
+    # Share of probes assumed to get a reply (open or closed) from a live host
+    DEFAULT_ANSWER_RATE = 0.5
+
+    # Bounds on the history correction, so one odd scan cannot skew estimates wildly
+    CALIBRATION_RANGE = (0.25, 4.0)
+
+    def __init__(self, db_manager, host_liveness=None, history_scans=None):
+        """Initialize with explicit settings or use environment variables."""
+        self.db_manager = db_manager
+        self.host_liveness = host_liveness
+        self.history_scans = history_scans or int(os.environ.get('ESTIMATE_HISTORY_SCANS', 5))
+        self.send_rate = float(os.environ.get('RAW_SEND_RATE', 5000))
+
+    @staticmethod
+    def backend(scan_type, target_ip="0.0.0.0", sources=None):
+        """The I/O backend a scan of this type would use: "packet" or "scapy"."""
+        if scan_type == 'connect':
+            return "scapy"
+        if not sources and os.environ.get('SCAN_IO_BACKEND', 'scapy').lower() != 'packet':
+            return "scapy"
+        return "packet" if PacketProbeEngine.available(target_ip) else "scapy"
+
+    @staticmethod
+    def send_paths(sources=None):
+        """Number of source addresses/interfaces the raw backend sends from, each at the send rate."""
+        if not sources:
+            sources = [s for s in os.environ.get('SCAN_SOURCES', '').split(',') if s.strip()]
+        return max(len(sources), 1)
+
+    def model(self, port_count, scan_type, timeout, retries, answer_rate, backend=None, paths=1, shares=1):
+        """
+        Modelled (seconds, probes sent) for one target. Ports that answer do so
+        on the first pass; the rest are re-probed on every later pass. With
+        `shares` targets scanned at once on one ProbeBudget, the target gets
+        that share of the send rate and of the scapy workers.
+        """
+        backend = backend or self.backend(scan_type)
+        seconds = sent = 0.0
+        pending = float(port_count)
+
+        for pass_number, pass_timeout in enumerate(NetworkScanner.pass_timeouts(timeout, retries)):
+            if pending < 1:
+                break
+            answered = answer_rate if pass_number == 0 else 0.0
+            if backend == "packet":
+                seconds += pending / (self.send_rate * paths / shares) + pass_timeout
+            else:
+                workers = min(NetworkScanner.MAX_WORKERS / shares, int(pending) // 100 + 1)
+                per_probe = answered * self.DEFAULT_RTT + (1 - answered) * pass_timeout + NetworkScanner.RATE_LIMIT
+                seconds += pending * per_probe / workers
+            sent += pending
+            pending *= 1 - answered
+
+        return seconds, sent
+
+    def calibrate(self, scans, scan_type, retries, backend, paths=1):
+        """
+        (open rate, correction factor) from a target's recent scans, given as
+        (duration, port_count, timeout, open_count, retries, backend) tuples.
+        Each scan is modelled with the retries and backend it ran with; scans
+        that did not record them are assumed to match `retries` and `backend`.
+        None without usable history.
+        """
+        scans = [scan for scan in scans if scan[1] > 0]
+        if not scans:
+            return None
+
+        open_rate = sum(scan[3] for scan in scans) / sum(scan[1] for scan in scans)
+        answer_rate = max(open_rate, self.DEFAULT_ANSWER_RATE)
+        ratios = []
+        for duration, port_count, timeout, _, scan_retries, scan_backend in scans:
+            modelled, _ = self.model(
+                port_count, scan_type, timeout, retries if scan_retries is None else scan_retries, answer_rate,
+                scan_backend or backend, paths
+            )
+            if modelled > 0 and duration > 0:
+                ratios.append(duration / modelled)
+        if not ratios:
+            return open_rate, 1.0
+
+        low, high = self.CALIBRATION_RANGE
+        return open_rate, min(max(statistics.median(ratios), low), high)
+
+    def estimate(self, targets, port_count, scan_type, timeout, retries, liveness="off", concurrency=1, sharded=False,
+                 sources=None):
+        """
+        Estimate a port scan of `port_count` ports on every target. Looks at
+        liveness and scan history only; nothing is sent to the targets.
+        `concurrency` targets run at once, or shards of targets when `sharded`.
+        Targets run at once by the API process share one ProbeBudget; queued
+        shards are probed by separate workers.
+        """
+        backend = self.backend(scan_type, targets[0] if targets else "0.0.0.0", sources)
+        shares = 1 if sharded else max(concurrency, 1)
+        paths = self.send_paths(sources) if backend == "packet" else 1
+        history = self.db_manager.get_scan_timing_history(targets, f"port_scan_{scan_type}", self.history_scans)
+        if scan_type == 'udp':
+            liveness = "off"  # UDP scans are never gated on liveness
+        known = self.host_liveness.lookup(targets) if self.host_liveness and liveness != "off" else {}
+
+        per_target = []
+        for target in targets:
+            entry = {"target": target, "liveness": {True: "alive", False: "dead"}.get(known.get(target), "unknown")}
+            target_timeout, target_retries, answer_rate = timeout, retries, self.DEFAULT_ANSWER_RATE
+
+            if known.get(target) is False:
+                if liveness == "skip":
+                    per_target.append({**entry, "action": "skip", "seconds": 0.0, "packets_sent": 0, "replies": 0})
+                    continue
+                target_timeout, target_retries, answer_rate = min(timeout, NetworkScanner.FIRST_PASS_TIMEOUT), 0, 0.0
+                entry["action"] = "demote"
+            else:
+                entry["action"] = "scan"
+
+            calibration = self.calibrate(history.get(target, []), scan_type, retries, backend, paths)
+            factor = 1.0
+            if calibration is not None:
+                open_rate, factor = calibration
+                if answer_rate:
+                    answer_rate = max(open_rate, answer_rate)
+                entry["history"] = {"scans": len(history[target]), "open_rate": round(open_rate, 4), "calibration": round(factor, 2)}
+
+            seconds, sent = self.model(
+                port_count, scan_type, target_timeout, target_retries, answer_rate, backend, paths, shares
+            )
+            if entry["liveness"] == "unknown" and liveness != "off" and self.host_liveness:
+                # Pre-probe before the scan
+                seconds += self.host_liveness.probe_timeout
+            entry.update({
+                "seconds": round(seconds * factor, 2),
+                "packets_sent": int(math.ceil(sent)),
+                "replies": int(round(port_count * answer_rate))
+            })
+            per_target.append(entry)
+
+        total = sum(entry["seconds"] for entry in per_target)
+        longest = max((entry["seconds"] for entry in per_target), default=0.0)
+        return {
+            "backend": backend,
+            "probe_count": len(targets) * port_count,
+            "expected_packets": {
+                "sent": sum(entry["packets_sent"] for entry in per_target),
+                "replies": sum(entry["replies"] for entry in per_target)
+            },
+            "concurrency": concurrency,
+            "target_seconds": round(total, 1),
+            "estimated_seconds": round(max(total / max(concurrency, 1), 0 if sharded else longest), 1),
+            "skipped_targets": sum(1 for entry in per_target if entry["action"] == "skip"),
+            "targets_with_history": sum(1 for entry in per_target if "history" in entry),
+            "settings": {
+                "timeouts": [round(t, 3) for t in NetworkScanner.pass_timeouts(timeout, retries)],
+                "rate_limit": NetworkScanner.RATE_LIMIT,
+                "max_workers": NetworkScanner.MAX_WORKERS,
+                "send_rate": self.send_rate if backend == "packet" else None,
+                "send_paths": paths
+            },
+            "targets": per_target
+        }
+
+    def estimate_sweep(self, host_count, port_count, send_rate=None, cooldown=None, paths=1):
+        """
+        Estimate a stateless sweep: one probe per (host, port), sent at the
+        sweep rate from each of `paths` sources.
+        """
+        send_rate = send_rate or float(os.environ.get('SWEEP_SEND_RATE', self.send_rate))
+        cooldown = cooldown if cooldown is not None else float(os.environ.get('SWEEP_COOLDOWN', 5))
+        probes = host_count * port_count
+        return {
+            "backend": "packet",
+            "probe_count": probes,
+            "expected_packets": {"sent": probes},
+            "estimated_seconds": round(probes / (send_rate * paths) + cooldown, 1),
+            "settings": {"send_rate": send_rate, "cooldown": cooldown, "send_paths": paths}
+        }
@@ -0,0 +1,211 @@
+import itertools
+import json
+import os
+import re
+import threading
+import uuid
+from datetime import datetime
+from types import SimpleNamespace
+
+_pyarrow = None
+_pyarrow_lock = threading.Lock()
+
+def load_pyarrow():
+    """
+    Import pyarrow on first use. Only exports need it, so nodes that never
+    export (such as edge scanners) can run without it installed.
+    """
+    global _pyarrow
+    if _pyarrow is None:
+        with _pyarrow_lock:
+            if _pyarrow is None:
+                import pyarrow
+                import pyarrow.parquet
+                _pyarrow = SimpleNamespace(pa=pyarrow, pq=pyarrow.parquet)
+    return _pyarrow
+
+def parse_timestamp(value):
+    """
+    Parse an ISO 8601 time. Times with a UTC offset are converted to local
+    time without one, so they compare with datetime.now() and the naive
+    TIMESTAMP columns the results are stored in.
+    """
+    timestamp = datetime.fromisoformat(value)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone().replace(tzinfo=None)
+    return timestamp
+
+class ParquetExporter:
+    """
+    Writes scan history (every result of a time range, with its scan type) as
+    Parquet files for analytics tools such as DuckDB, pandas or Spark.
+
+    Results are streamed from a server-side cursor in chunks of `batch_size`
+    rows and each chunk becomes one row group, so memory use does not depend
+    on the size of the range. Files are partitioned Hive-style by the day (or
+    month) results were discovered, e.g. date=2025-03-01/scan_results.parquet,
+    and the low-cardinality scan_type, protocol and status columns are
+    dictionary-encoded.
+
+    An export is complete once its _manifest.json has been written; a failed
+    one leaves _error.json instead.
+    """
+
+    PARTITIONS = ("day", "month", "none")
+    DICTIONARY_COLUMNS = ("scan_type", "protocol", "status")
+    FILE_NAME = "scan_results.parquet"
+    MANIFEST = "_manifest.json"
+    ERROR = "_error.json"
+
+    # Export IDs name directories under the export root; nothing else is accepted
+    EXPORT_ID = re.compile(r"^\d{8}T\d{6}-[0-9a-f]{8}$")
+
+    def __init__(self, db_manager, root=None, batch_size=None, compression=None):
+        """Initialize with explicit settings or use environment variables."""
+        self.db_manager = db_manager
+        self.root = root or os.environ.get('EXPORT_DIR', 'exports')
+        self.batch_size = batch_size or int(os.environ.get('EXPORT_BATCH_SIZE', 50000))
+        self.compression = compression or os.environ.get('EXPORT_COMPRESSION', 'zstd')
+
+    @staticmethod
+    def available():
+        """Whether pyarrow can be imported in this process."""
+        try:
+            load_pyarrow()
+        except ImportError:
+            return False
+        return True
+
+    def schema(self):
+        pa = load_pyarrow().pa
+        labels = pa.dictionary(pa.int32(), pa.string())
+        types = {
+            'result_id': pa.int64(),
+            'scan_id': pa.int32(),
+            'scan_type': labels,
+            'target': pa.string(),
+            'port': pa.int32(),
+            'protocol': labels,
+            'status': labels,
+            'additional_data': pa.string(),  # JSON text
+            'discovered_at': pa.timestamp('us')
+        }
+        return pa.schema([(name, types[name]) for name in self.db_manager.SCAN_HISTORY_COLUMNS])
+
+    @staticmethod
+    def partition_of(discovered_at, partition):
+        """Directory of a result's partition, relative to the export directory."""
+        if partition == "day":
+            return f"date={discovered_at:%Y-%m-%d}"
+        if partition == "month":
+            return f"month={discovered_at:%Y-%m}"
+        return ""
+
+    def to_table(self, rows, schema):
+        """Convert a chunk of iter_scan_history() rows to an Arrow table."""
+        pa = load_pyarrow().pa
+        arrays = []
+        for field, values in zip(schema, zip(*rows)):
+            if field.name == 'additional_data':
+                values = [json.dumps(value) if value is not None else None for value in values]
+            if pa.types.is_dictionary(field.type):
+                arrays.append(pa.array(values, type=pa.string()).dictionary_encode())
+            else:
+                arrays.append(pa.array(values, type=field.type))
+        return pa.Table.from_arrays(arrays, schema=schema)
+
+    def export(self, since, until, output_dir, partition="day"):
+        """
+        Write every result discovered in [since, until) under output_dir, one
+        file per partition. Returns the manifest, which is also written to
+        output_dir/_manifest.json.
+        """
+        if partition not in self.PARTITIONS:
+            raise ValueError(f"partition must be one of: {', '.join(self.PARTITIONS)}")
+
+        pq = load_pyarrow().pq
+        schema = self.schema()
+        os.makedirs(output_dir, exist_ok=True)
+        files = []
+        writer = current = None
+
+        try:
+            for chunk in self.db_manager.iter_scan_history(since, until, self.batch_size):
+                # Rows arrive in discovered_at order, so each partition is written in one go
+                for key, rows in itertools.groupby(chunk, key=lambda row: self.partition_of(row[-1], partition)):
+                    rows = list(rows)
+                    if writer is None or key != current:
+                        if writer is not None:
+                            writer.close()
+                        current = key
+                        path = os.path.join(key, self.FILE_NAME)
+                        os.makedirs(os.path.join(output_dir, key), exist_ok=True)
+                        writer = pq.ParquetWriter(
+                            os.path.join(output_dir, path), schema,
+                            compression=self.compression,
+                            use_dictionary=list(self.DICTIONARY_COLUMNS)
+                        )
+                        files.append({"path": path, "rows": 0})
+                    writer.write_table(self.to_table(rows, schema))
+                    files[-1]["rows"] += len(rows)
+        finally:
+            if writer is not None:
+                writer.close()
+
+        manifest = {
+            "since": since.isoformat(),
+            "until": until.isoformat(),
+            "partition": partition,
+            "compression": self.compression,
+            "columns": [{"name": field.name, "type": str(field.type)} for field in schema],
+            "rows": sum(entry["rows"] for entry in files),
+            "files": files,
+            "completed_at": datetime.now().isoformat()
+        }
+        self._write_json(os.path.join(output_dir, self.MANIFEST), manifest)
+        return manifest
+
+    @staticmethod
+    def _write_json(path, document):
+        # Written under a temporary name so readers never see a partial file
+        with open(path + ".tmp", "w") as f:
+            json.dump(document, f, indent=2)
+        os.replace(path + ".tmp", path)
+
+    def new_export(self):
+        """Create the directory of a new export and return its ID."""
+        export_id = f"{datetime.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+        os.makedirs(self.export_dir(export_id))
+        return export_id
+
+    def export_dir(self, export_id):
+        """Directory of an export under the export root, or None for an invalid ID."""
+        if not self.EXPORT_ID.match(export_id or ""):
+            return None
+        return os.path.join(self.root, export_id)
+
+    def run_export(self, export_id, since, until, partition="day"):
+        """Run an export into its directory under the export root, recording any failure there."""
+        output_dir = self.export_dir(export_id)
+        try:
+            self.export(since, until, output_dir, partition)
+        except Exception as e:
+            print(f"Error exporting scan history: {e}")
+            os.makedirs(output_dir, exist_ok=True)
+            self._write_json(os.path.join(output_dir, self.ERROR), {
+                "error": str(e),
+                "failed_at": datetime.now().isoformat()
+            })
+
+    def status(self, export_id):
+        """Status of an export started with run_export(), or None if there is no such export."""
+        output_dir = self.export_dir(export_id)
+        if output_dir is None or not os.path.isdir(output_dir):
+            return None
+
+        for name, status in ((self.MANIFEST, "completed"), (self.ERROR, "failed")):
+            path = os.path.join(output_dir, name)
+            if os.path.exists(path):
+                with open(path) as f:
+                    return {"export_id": export_id, "status": status, **json.load(f)}
+        return {"export_id": export_id, "status": "running"}
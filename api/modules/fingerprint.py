@@ -0,0 +1,166 @@
+import os
+import re
+import socket
+import ssl
+import time
+import concurrent.futures
+
+class ServiceFingerprinter:
+    """
+    Grabs banners and identifies services on open TCP ports.
+
+    Ports are submitted as soon as the scanner confirms them open, so banner
+    grabbing overlaps with the rest of the scan instead of running as a second
+    pass. Connections run on their own bounded thread pool and each one has a
+    hard deadline.
+    """
+
+    # Ports where the client must speak first, with the probe to send
+    PROBES = {
+        80: b"HEAD / HTTP/1.0\r\n\r\n",
+        8000: b"HEAD / HTTP/1.0\r\n\r\n",
+        8008: b"HEAD / HTTP/1.0\r\n\r\n",
+        8080: b"HEAD / HTTP/1.0\r\n\r\n",
+        8888: b"HEAD / HTTP/1.0\r\n\r\n",
+        6379: b"PING\r\n",
+    }
+
+    # Ports that usually speak TLS
+    TLS_PORTS = {443, 465, 636, 993, 995, 8443}
+
+    # Banner patterns, checked in order
+    SIGNATURES = [
+        ("ssh", re.compile(rb"^SSH-[\d.]+-(\S+)")),
+        ("http", re.compile(rb"^HTTP/\d\.\d \d{3}.*?\r\nServer: ([^\r\n]+)", re.S | re.I)),
+        ("http", re.compile(rb"^HTTP/\d\.\d \d{3}")),
+        ("ftp", re.compile(rb"^220[ -].*ftp", re.I)),
+        ("smtp", re.compile(rb"^220[ -].*(?:smtp|mail)", re.I)),
+        ("pop3", re.compile(rb"^\+OK")),
+        ("imap", re.compile(rb"^\* OK")),
+        ("redis", re.compile(rb"^(?:\+PONG|-NOAUTH|-ERR)")),
+        ("vnc", re.compile(rb"^RFB (\d{3}\.\d{3})")),
+        ("mysql", re.compile(rb"^.{4}\x0a([\d.]+[^\x00]*)\x00", re.S)),
+    ]
+
+    # Fallback names when a port does not answer with a recognizable banner
+    WELL_KNOWN = {
+        21: "ftp", 22: "ssh", 23: "telnet", 25: "smtp", 53: "dns", 80: "http",
+        110: "pop3", 135: "msrpc", 139: "netbios-ssn", 143: "imap", 443: "https",
+        445: "microsoft-ds", 993: "imaps", 995: "pop3s", 1433: "mssql", 3306: "mysql",
+        3389: "rdp", 5432: "postgresql", 5900: "vnc", 6379: "redis", 8080: "http-proxy",
+        8443: "https-alt", 9200: "elasticsearch", 27017: "mongodb",
+    }
+
+    def __init__(self, target_ip, max_workers=None, deadline=None):
+        """Initialize for one target with explicit settings or use environment variables."""
+        self.target_ip = target_ip
+        self.max_workers = max_workers or int(os.environ.get('BANNER_MAX_CONCURRENT', 20))
+        self.deadline = deadline or float(os.environ.get('BANNER_TIMEOUT', 3))
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers)
+        self.futures = {}
+
+    def submit(self, port):
+        """Start fingerprinting an open port in the background."""
+        self.futures[port] = self.executor.submit(self.fingerprint, self.target_ip, port, self.deadline)
+
+    def on_result(self, port, status):
+        """Scanner callback: fingerprint ports as soon as they are found open."""
+        if status == "Open":
+            self.submit(port)
+
+    def collect(self):
+        """Wait for all submitted ports and return {port: service info}."""
+        services = {}
+        for port, future in self.futures.items():
+            try:
+                services[port] = future.result()
+            except Exception as e:
+                services[port] = {"service": self.WELL_KNOWN.get(port), "error": str(e)}
+        self.executor.shutdown(wait=False)
+        return services
+
+    @classmethod
+    def fingerprint(cls, target_ip, port, deadline=3):
+        """
+        Connect to a port, read (or provoke) a banner and identify the service.
+        The whole exchange is bounded by `deadline` seconds.
+        """
+        started = time.monotonic()
+        info = {"service": cls.WELL_KNOWN.get(port)}
+
+        try:
+            sock = socket.create_connection((target_ip, port), timeout=deadline)
+        except OSError as e:
+            info["error"] = str(e)
+            return info
+
+        try:
+            if port in cls.TLS_PORTS:
+                remaining = max(0.05, started + deadline - time.monotonic())
+                sock, tls_info = cls._wrap_tls(sock, target_ip, remaining)
+                info.update(tls_info)
+
+            banner = cls._read_banner(sock, port, started + deadline)
+        finally:
+            sock.close()
+
+        if banner:
+            info["banner"] = banner.decode('utf-8', errors='replace').strip()[:256]
+            service, version = cls.identify(banner)
+            if service:
+                info["service"] = "https" if service == "http" and info.get("tls") else service
+            if version:
+                info["version"] = version
+
+        info["elapsed_ms"] = int((time.monotonic() - started) * 1000)
+        return info
+
+    @classmethod
+    def _wrap_tls(cls, sock, target_ip, deadline):
+        """Perform a TLS handshake without verification and report what was negotiated."""
+        context = ssl.create_default_context()
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+
+        sock.settimeout(deadline)
+        try:
+            tls_sock = context.wrap_socket(sock, server_hostname=target_ip)
+        except (ssl.SSLError, OSError):
+            return sock, {}
+        return tls_sock, {"tls": True, "tls_version": tls_sock.version(), "cipher": tls_sock.cipher()[0]}
+
+    @classmethod
+    def _read_banner(cls, sock, port, deadline_at, max_bytes=1024):
+        """Read whatever the service sends before the deadline, probing first if needed."""
+        probe = cls.PROBES.get(port)
+        if probe is None and port in cls.TLS_PORTS:
+            probe = cls.PROBES[80]
+
+        data = b""
+        try:
+            # Services like SSH, FTP and SMTP announce themselves; others need a probe
+            if probe is not None:
+                sock.sendall(probe)
+            sock.settimeout(max(0.05, deadline_at - time.monotonic()))
+            data = sock.recv(max_bytes)
+
+            # Read the rest of an HTTP header block
+            while data and len(data) < max_bytes and b"\r\n\r\n" not in data and data.startswith(b"HTTP/"):
+                sock.settimeout(max(0.05, deadline_at - time.monotonic()))
+                chunk = sock.recv(max_bytes - len(data))
+                if not chunk:
+                    break
+                data += chunk
+        except (socket.timeout, OSError):
+            pass
+        return data
+
+    @classmethod
+    def identify(cls, banner):
+        """Match a banner against known signatures. Returns (service, version)."""
+        for service, pattern in cls.SIGNATURES:
+            match = pattern.search(banner)
+            if match:
+                version = match.group(1).decode('utf-8', errors='replace') if match.groups() else None
+                return service, version
+        return None, None
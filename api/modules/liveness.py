@@ -0,0 +1,149 @@
+import errno
+import ipaddress
+import os
+import select
+import socket
+import time
+
+class HostLiveness:
+    """
+    Cache of which hosts are up, so port scans do not spend `timeout` on every
+    port of a host that is down.
+
+    Entries come from host discovery, from the replies of finished port scans
+    and from a quick TCP pre-probe, and are kept in the host_liveness table
+    with their own expiry: hosts seen alive are trusted for LIVENESS_ALIVE_TTL
+    seconds, hosts seen dead only for the shorter LIVENESS_DEAD_TTL.
+    """
+
+    # What a port scan does with a host known to be dead
+    POLICIES = ("skip", "demote", "off")
+
+    # Ports tried by the pre-probe, besides the first ports of the scan itself
+    PROBE_PORTS = [80, 443, 22, 3389, 445, 8080, 25, 53]
+    PROBE_SCAN_PORTS = 8
+
+    def __init__(self, db_manager, alive_ttl=None, dead_ttl=None, probe_timeout=None):
+        """Initialize with explicit settings or use environment variables."""
+        self.db_manager = db_manager
+        self.alive_ttl = alive_ttl or float(os.environ.get('LIVENESS_ALIVE_TTL', 3600))
+        self.dead_ttl = dead_ttl or float(os.environ.get('LIVENESS_DEAD_TTL', 900))
+        self.probe_timeout = probe_timeout or float(os.environ.get('LIVENESS_PROBE_TIMEOUT', 1))
+
+    @staticmethod
+    def default_policy():
+        return os.environ.get('LIVENESS_POLICY', 'off').lower()
+
+    def lookup(self, targets):
+        """{target: alive} for targets with an unexpired entry."""
+        return self.db_manager.get_host_liveness(targets)
+
+    def record(self, alive=(), dead=(), source="probe"):
+        """Store liveness observations, each with the TTL for its state."""
+        entries = [(target, True) for target in alive] + [(target, False) for target in dead]
+        if entries:
+            self.db_manager.record_host_liveness(entries, source, self.alive_ttl, self.dead_ttl)
+
+    def record_discovery(self, network, active_hosts):
+        """
+        Record a host discovery sweep. Hosts that did not answer are only
+        recorded dead when some host did, i.e. the network was reachable.
+        """
+        alive = {host['ip'] for host in active_hosts}
+        dead = []
+        if alive:
+            dead = [str(host) for host in ipaddress.ip_network(network, strict=False).hosts()
+                    if str(host) not in alive]
+        self.record(alive, dead, source="discovery")
+
+    def record_scan(self, target_ip, scan_type, results, allow_dead=True):
+        """
+        Record what a port scan learned: any Open or Closed reply proves the
+        host is up. A TCP scan without a single reply marks it dead unless
+        `allow_dead` is False (e.g. for one shard of a larger scan).
+        """
+        counts = results.counts()
+        if counts["Open"] or counts["Closed"]:
+            self.record(alive=[target_ip], source="scan")
+        elif allow_dead and scan_type != 'udp' and len(results):
+            self.record(dead=[target_ip], source="scan")
+
+    @staticmethod
+    def probe(target_ip, ports, timeout=1):
+        """
+        Quick pre-probe: start non-blocking TCP connects to a few ports at once.
+        A completed handshake or a refusal (RST) means the host is up.
+        """
+        family = socket.AF_INET6 if ipaddress.ip_address(target_ip).version == 6 else socket.AF_INET
+        pending = {}
+        alive = False
+
+        try:
+            for port in ports:
+                sock = socket.socket(family, socket.SOCK_STREAM)
+                sock.setblocking(False)
+                err = sock.connect_ex((target_ip, port))
+                if err in (0, errno.ECONNREFUSED):
+                    sock.close()
+                    alive = True
+                    break
+                if err in (errno.EINPROGRESS, errno.EWOULDBLOCK):
+                    pending[sock] = port
+                else:
+                    sock.close()
+
+            deadline = time.monotonic() + timeout
+            while pending and not alive:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                _, writable, _ = select.select([], list(pending), [], remaining)
+                for sock in writable:
+                    if sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) in (0, errno.ECONNREFUSED):
+                        alive = True
+                    pending.pop(sock)
+                    sock.close()
+        finally:
+            for sock in pending:
+                sock.close()
+
+        return alive
+
+    def is_alive(self, target_ip, ports=()):
+        """
+        Whether the host should be treated as up: from the cache, or from a
+        pre-probe (recorded in the cache) when there is no unexpired entry.
+        """
+        cached = self.lookup([target_ip]).get(target_ip)
+        if cached is not None:
+            return cached
+
+        probe_ports = list(dict.fromkeys(list(ports)[:self.PROBE_SCAN_PORTS] + self.PROBE_PORTS))
+        alive = self.probe(target_ip, probe_ports, self.probe_timeout)
+        if alive:
+            self.record(alive=[target_ip])
+        else:
+            self.record(dead=[target_ip])
+        return alive
+
+    def plan(self, target_ip, ports=(), policy=None, scan_type=None):
+        """
+        Decide how to scan a target under a liveness policy: "scan" normally,
+        or "skip" / "demote" a host believed to be down. UDP scans are never
+        gated, since the TCP pre-probe says nothing about UDP services.
+        Lookup errors never block a scan.
+        """
+        policy = policy or self.default_policy()
+        if policy == "off" or scan_type == 'udp':
+            return "scan"
+        try:
+            alive = self.is_alive(target_ip, ports)
+        except Exception as e:
+            print(f"Error checking liveness of {target_ip}: {e}")
+            return "scan"
+        return "scan" if alive else policy
+
+    def order_targets(self, items, key=lambda item: item):
+        """Items whose target (given by `key`) is known dead moved to the end, order otherwise kept."""
+        known = self.lookup([key(item) for item in items])
+        return sorted(items, key=lambda item: known.get(key(item)) is False)
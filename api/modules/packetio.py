@@ -0,0 +1,544 @@
+import ctypes
+import fcntl
+import ipaddress
+import mmap
+import os
+import random
+import select
+import socket
+import struct
+import sys
+import time
+
+# Linux constants not exposed by the socket module
+SOL_PACKET = 263
+PACKET_RX_RING = 5
+PACKET_VERSION = 10
+TPACKET_V2 = 1
+TP_STATUS_USER = 1
+TP_STATUS_KERNEL = 0
+PACKET_OUTGOING = 4
+SO_ATTACH_FILTER = 26
+SO_BINDTODEVICE = 25
+SIOCGIFADDR = 0x8915
+ETH_P_ALL = 0x0003
+ETH_P_IP = 0x0800
+ETH_P_ARP = 0x0806
+
+# Classic BPF ancillary load of the frame's EtherType (skb->protocol)
+SKF_AD_PROTOCOL = 0xfffff000
+
+# struct tpacket2_hdr, followed by struct sockaddr_ll at TPACKET_ALIGN(32)
+TPACKET2_HDR = struct.Struct("IIIHHIIHH4x")
+SLL_PKTTYPE_OFFSET = 32 + 10
+
+class _iovec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p), ("iov_len", ctypes.c_size_t)]
+
+class _msghdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p), ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.POINTER(_iovec)), ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p), ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int),
+    ]
+
+class _mmsghdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", _msghdr), ("msg_len", ctypes.c_uint)]
+
+class _sockaddr_in(ctypes.Structure):
+    _fields_ = [
+        ("sin_family", ctypes.c_ushort), ("sin_port", ctypes.c_uint16),
+        ("sin_addr", ctypes.c_uint8 * 4), ("sin_zero", ctypes.c_uint8 * 8),
+    ]
+
+def tcp_reply_filter(source_port, target_ip=None):
+    """
+    Classic BPF program (run by the kernel on each packet's network header)
+    that accepts unfragmented TCP packets to `source_port`, optionally only
+    from `target_ip`.
+    """
+    program = [
+        (0x30, 0, 0, 9),                # ldb [9]           protocol
+        (0x15, 0, 8, 6),                # jeq #tcp          else drop
+    ]
+    if target_ip is not None:
+        target = struct.unpack("!I", socket.inet_aton(target_ip))[0]
+        program += [
+            (0x20, 0, 0, 12),           # ld [12]           source address
+            (0x15, 0, 6, target),       # jeq #target       else drop
+        ]
+    else:
+        program[1] = (0x15, 0, 6, 6)
+    return program + [
+        (0x28, 0, 0, 6),                # ldh [6]           fragment offset
+        (0x45, 4, 0, 0x1fff),           # jset #0x1fff      drop fragments
+        (0xb1, 0, 0, 0),                # ldxb 4*([0]&0xf)  header length
+        (0x48, 0, 0, 2),                # ldh [x+2]         destination port
+        (0x15, 0, 1, source_port),      # jeq #sport        else drop
+        (0x06, 0, 0, 256),              # ret #256          accept headers
+        (0x06, 0, 0, 0),                # ret #0            drop
+    ]
+
+def arp_dhcp_filter():
+    """
+    Classic BPF program for a socket bound to ETH_P_ALL that accepts ARP
+    frames and unfragmented UDP datagrams to the DHCP ports (67 and 68).
+    """
+    return [
+        (0x20, 0, 0, SKF_AD_PROTOCOL),  # ld proto          EtherType
+        (0x15, 9, 0, ETH_P_ARP),        # jeq #arp          accept
+        (0x15, 0, 9, ETH_P_IP),         # jeq #ip           else drop
+        (0x30, 0, 0, 9),                # ldb [9]           protocol
+        (0x15, 0, 7, 17),               # jeq #udp          else drop
+        (0x28, 0, 0, 6),                # ldh [6]           fragment offset
+        (0x45, 5, 0, 0x1fff),           # jset #0x1fff      drop fragments
+        (0xb1, 0, 0, 0),                # ldxb 4*([0]&0xf)  header length
+        (0x48, 0, 0, 2),                # ldh [x+2]         destination port
+        (0x15, 1, 0, 67),               # jeq #67           accept
+        (0x15, 0, 1, 68),               # jeq #68           else drop
+        (0x06, 0, 0, 0xffff),           # ret #0xffff       accept
+        (0x06, 0, 0, 0),                # ret #0            drop
+    ]
+
+class RxRing:
+    """
+    Packet socket for IPv4 replies (or other EtherTypes, with `protocol`)
+    with a BPF filter attached and a memory-mapped PACKET_RX_RING
+    (TPACKET_V2) that packets are parsed from in place.
+    """
+
+    FRAME_SIZE = 2048
+    BLOCK_SIZE = 1 << 16
+
+    def __init__(self, program, ring_frames=2048, protocol=ETH_P_IP, interface=None):
+        self.sock = socket.socket(socket.AF_PACKET, socket.SOCK_DGRAM, socket.htons(protocol))
+        try:
+            if interface:
+                self.sock.bind((interface, protocol))
+            filters = ctypes.create_string_buffer(b"".join(struct.pack("HBBI", *insn) for insn in program))
+            fprog = struct.pack("HL", len(program), ctypes.addressof(filters))
+            self.sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, fprog)
+
+            frames_per_block = self.BLOCK_SIZE // self.FRAME_SIZE
+            block_count = max(1, -(-ring_frames // frames_per_block))
+            self.frame_count = block_count * frames_per_block
+            self.sock.setsockopt(SOL_PACKET, PACKET_VERSION, TPACKET_V2)
+            self.sock.setsockopt(SOL_PACKET, PACKET_RX_RING, struct.pack(
+                "IIII", self.BLOCK_SIZE, block_count, self.FRAME_SIZE, self.frame_count
+            ))
+            self.ring = mmap.mmap(self.sock.fileno(), self.BLOCK_SIZE * block_count, mmap.MAP_SHARED,
+                                  mmap.PROT_READ | mmap.PROT_WRITE)
+        except Exception:
+            self.sock.close()
+            raise
+        self.poller = select.poll()
+        self.poller.register(self.sock, select.POLLIN)
+        self.cursor = 0
+
+    def drain(self, handle, wait=0):
+        """
+        Call handle(ring, network_header_offset, snaplen) for every received
+        frame the kernel has handed to user space (waiting up to `wait`
+        seconds for the first one), then give the frames back to the kernel.
+        """
+        if wait > 0:
+            self.poller.poll(int(wait * 1000))
+        ring = self.ring
+        while True:
+            offset = self.cursor * self.FRAME_SIZE
+            if not ring[offset] & TP_STATUS_USER:
+                return
+            try:
+                if ring[offset + SLL_PKTTYPE_OFFSET] != PACKET_OUTGOING:
+                    _, _, snaplen, _, net = TPACKET2_HDR.unpack_from(ring, offset)[:5]
+                    handle(ring, offset + net, snaplen)
+            finally:
+                struct.pack_into("I", ring, offset, TP_STATUS_KERNEL)
+                self.cursor = (self.cursor + 1) % self.frame_count
+
+    def close(self):
+        self.poller.unregister(self.sock)
+        self.ring.close()
+        self.sock.close()
+
+def parse_sources(entries):
+    """
+    Parse probe sources: "10.0.0.5" (a local address), "eth1" (an interface,
+    sending from its primary IPv4 address) or "10.0.0.5@eth1". Returns
+    [(address or None, interface or None)]; raises ValueError on bad syntax.
+    Nothing is checked against this host's addresses or interfaces.
+    """
+    sources = []
+    for entry in entries:
+        if not isinstance(entry, str) or not entry.strip():
+            raise ValueError("Sources must be IPv4 addresses, interface names or address@interface")
+        address, at, interface = entry.strip().partition("@")
+        if not at:
+            try:
+                ipaddress.IPv4Address(address)
+                interface = None
+            except ValueError:
+                address, interface = None, address
+        if address is not None:
+            try:
+                ipaddress.IPv4Address(address)
+            except ValueError:
+                raise ValueError(f"Invalid source address: {address}")
+        if interface is not None and not 0 < len(interface) < 16:
+            raise ValueError(f"Invalid interface name: {interface}")
+        sources.append((address, interface))
+    return sources
+
+def resolve_sources(entries):
+    """
+    Parse probe sources (see parse_sources) and check them against this
+    host: interfaces must exist and addresses must be local. Interfaces
+    given alone are replaced by their IPv4 address. Returns [(address,
+    interface or None)] without duplicates; raises ValueError otherwise.
+    """
+    sources = []
+    for address, interface in parse_sources(entries):
+        if interface is not None:
+            try:
+                socket.if_nametoindex(interface)
+            except OSError:
+                raise ValueError(f"No such interface: {interface}")
+        if address is None:
+            probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            try:
+                request = struct.pack("256s", interface.encode())
+                address = socket.inet_ntoa(fcntl.ioctl(probe.fileno(), SIOCGIFADDR, request)[20:24])
+            except OSError:
+                raise ValueError(f"Interface {interface} has no IPv4 address")
+            finally:
+                probe.close()
+        else:
+            probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            try:
+                probe.bind((address, 0))
+            except OSError:
+                raise ValueError(f"{address} is not an address of this host")
+            finally:
+                probe.close()
+        if (address, interface) not in sources:
+            sources.append((address, interface))
+    return sources
+
+class SendPath:
+    """
+    One way out for probes: a raw IP socket for packets from `source_ip`,
+    pinned to `interface` if given (otherwise routed by destination), with
+    its own batch buffer and its own pacing to `send_rate` packets per second.
+    """
+
+    def __init__(self, source_ip, interface, target_ip, packet_len, batch_size, send_rate):
+        self.source_ip = source_ip
+        self.interface = interface
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_RAW)
+        try:
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_HDRINCL, 1)
+            if interface:
+                self.sock.setsockopt(socket.SOL_SOCKET, SO_BINDTODEVICE, interface.encode())
+            self.sender = BatchSender(self.sock, target_ip, packet_len, batch_size)
+        except Exception:
+            self.sock.close()
+            raise
+        self.interval = batch_size / send_rate
+        self.next_send = time.monotonic()
+        self.slot = 0
+
+    def wait_turn(self, drain):
+        """Handle replies with drain(wait) until this path may send its next batch."""
+        while True:
+            remaining = self.next_send - time.monotonic()
+            if remaining <= 0:
+                return
+            drain(remaining)
+
+    def send(self, count):
+        """Send the first `count` packets of the buffer and schedule the next batch."""
+        self.sender.send(count)
+        self.next_send = max(self.next_send, time.monotonic()) + self.interval
+        self.slot = 0
+
+    def close(self):
+        self.sock.close()
+
+class PacketProbeEngine:
+    """
+    Batched raw packet I/O for SYN and UDP probes (Linux only).
+
+    Probes for every port of a pass are built from one template and sent in
+    batches with a single sendmmsg() call each on a raw IP socket. Replies are
+    read from a memory-mapped PACKET_RX_RING whose kernel BPF filter only
+    admits packets from the target to this pass's source port, and are parsed
+    in place in the ring instead of being copied out one recv() at a time.
+
+    With several sources (local addresses and/or interfaces) the ports are
+    dealt out to them in turn, each sending through its own socket paced to
+    RAW_SEND_RATE on its own, so the probe rate grows with the number of
+    paths; replies to every source are read from one ring on all interfaces.
+
+    NetworkScanner uses this engine when SCAN_IO_BACKEND=packet and falls back
+    to its scapy probes when it is unavailable.
+    """
+
+    PROTOCOLS = ("tcp", "udp")
+
+    # Set when the backend failed once in this process (e.g. missing CAP_NET_RAW)
+    disabled_reason = None
+
+    def __init__(self, protocol, send_rate=None, batch_size=None, ring_frames=None, sources=None):
+        """
+        Initialize with explicit settings or use environment variables.
+        `sources` are resolved (address, interface) pairs, see resolve_sources();
+        by default probes leave from the address routed to each target.
+        """
+        if protocol not in self.PROTOCOLS:
+            raise ValueError(f"Unsupported protocol: {protocol}")
+        self.protocol = protocol
+        self.sources = list(sources or [])
+        self.send_rate = send_rate or float(os.environ.get('RAW_SEND_RATE', 5000))
+        self.batch_size = batch_size or int(os.environ.get('RAW_BATCH_SIZE', 64))
+        self.ring_frames = ring_frames or int(os.environ.get('RAW_RX_RING_FRAMES', 2048))
+
+    @classmethod
+    def available(cls, target_ip):
+        """Whether the raw backend can be tried for this target."""
+        if cls.disabled_reason is not None or not sys.platform.startswith("linux"):
+            return False
+        try:
+            if ipaddress.ip_address(target_ip).version != 4:
+                return False
+        except ValueError:
+            return False
+        return hasattr(socket, "AF_PACKET") and hasattr(ctypes.CDLL(None), "sendmmsg")
+
+    @staticmethod
+    def source_address(target_ip):
+        """Local address the kernel would route packets to the target from."""
+        probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            probe.connect((target_ip, 9))
+            return probe.getsockname()[0]
+        finally:
+            probe.close()
+
+    @staticmethod
+    def word_sum(data):
+        """Sum of big-endian 16-bit words, the core of the Internet checksum."""
+        if len(data) % 2:
+            data += b"\0"
+        return sum(struct.unpack(f"!{len(data) // 2}H", data))
+
+    @staticmethod
+    def fold(total):
+        while total >> 16:
+            total = (total & 0xffff) + (total >> 16)
+        return ~total & 0xffff
+
+    def build_template(self, source_ip, target_ip, source_port, sequence):
+        """
+        Return (packet, checksum_offset, dport_offset, base_sum): a probe with
+        destination port 0 and the checksum sum of everything but the port, so
+        each port's checksum is one addition.
+        """
+        src, dst = socket.inet_aton(source_ip), socket.inet_aton(target_ip)
+        if self.protocol == "tcp":
+            proto = socket.IPPROTO_TCP
+            l4 = struct.pack("!HHIIBBHHH", source_port, 0, sequence, 0, 5 << 4, 0x02, 64240, 0, 0)
+            checksum_offset = 20 + 16
+        else:
+            proto = socket.IPPROTO_UDP
+            l4 = struct.pack("!HHHH", source_port, 0, 8, 0)
+            checksum_offset = 20 + 6
+
+        # Total length, id and header checksum are filled in by the kernel (IP_HDRINCL)
+        ip = struct.pack("!BBHHHBBH4s4s", 0x45, 0, 0, 0, 0, 64, proto, 0, src, dst)
+        pseudo = struct.pack("!4s4sBBH", src, dst, 0, proto, len(l4))
+        return ip + l4, checksum_offset, 20 + 2, self.word_sum(pseudo + l4)
+
+    def bpf_program(self, target_ip, source_port):
+        """Classic BPF filter run by the kernel on the network header of each packet."""
+        if self.protocol == "tcp":
+            return tcp_reply_filter(source_port, target_ip)
+        target = struct.unpack("!I", socket.inet_aton(target_ip))[0]
+        return [
+            (0x30, 0, 0, 9),                # ldb [9]           protocol
+            (0x15, 8, 0, 1),                # jeq #icmp         accept (errors may come from routers)
+            (0x15, 0, 8, 17),               # jeq #udp          else drop
+            (0x20, 0, 0, 12),               # ld [12]           source address
+            (0x15, 0, 6, target),           # jeq #target       else drop
+            (0x28, 0, 0, 6),                # ldh [6]           fragment offset
+            (0x45, 4, 0, 0x1fff),           # jset #0x1fff      drop fragments
+            (0xb1, 0, 0, 0),                # ldxb 4*([0]&0xf)  header length
+            (0x48, 0, 0, 2),                # ldh [x+2]         destination port
+            (0x15, 0, 1, source_port),      # jeq #sport        else drop
+            (0x06, 0, 0, 256),              # ret #256          accept headers
+            (0x06, 0, 0, 0),                # ret #0            drop
+        ]
+
+    def scan(self, target_ip, ports, timeout=1, on_result=None, results=None):
+        """
+        Probe every port once and wait up to `timeout` after the last probe.
+        Writes each port's status into `results` (a PortStateVector) and calls
+        on_result(port, status) for every port, like one scapy scan pass.
+        """
+        sources = self.sources or [(self.source_address(target_ip), None)]
+        source_port = random.randint(32768, 60999)
+        sequence = random.getrandbits(32)
+        answered = set()
+
+        def classify(ring, base, snaplen):
+            """Parse one reply in place in the ring; returns (port, status) or None."""
+            ihl = (ring[base] & 0x0f) * 4
+            proto = ring[base + 9]
+            l4 = base + ihl
+
+            if proto == socket.IPPROTO_TCP:
+                port, _, _, ack = struct.unpack_from("!HHII", ring, l4)
+                flags = ring[l4 + 13]
+                if ack != (sequence + 1) & 0xffffffff:
+                    return None
+                if flags & 0x12 == 0x12:
+                    return port, "Open"
+                if flags & 0x04:
+                    return port, "Closed"
+            elif proto == socket.IPPROTO_UDP:
+                return struct.unpack_from("!H", ring, l4)[0], "Open"
+            elif proto == socket.IPPROTO_ICMP and snaplen >= ihl + 8 + 20 + 4:
+                # ICMP errors quote the probe's IP and UDP headers
+                icmp_type, icmp_code = ring[l4], ring[l4 + 1]
+                quoted = l4 + 8
+                quoted_l4 = quoted + (ring[quoted] & 0x0f) * 4
+                if icmp_type != 3 or ring[quoted + 9] != socket.IPPROTO_UDP:
+                    return None
+                if bytes(ring[quoted + 16:quoted + 20]) != socket.inet_aton(target_ip):
+                    return None
+                sport, port = struct.unpack_from("!HH", ring, quoted_l4)
+                if sport != source_port:
+                    return None
+                return port, "Closed" if icmp_code == 3 else "Filtered"
+            return None
+
+        def handle(ring, base, snaplen):
+            reply = classify(ring, base, snaplen)
+            if reply and reply[0] not in answered and reply[0] in pending:
+                answered.add(reply[0])
+                results[reply[0]] = reply[1]
+                if on_result:
+                    on_result(*reply)
+
+        def drain(wait):
+            rx_ring.drain(handle, wait)
+
+        # Replies to every source are matched by target, source port and sequence, on any interface
+        rx_ring = RxRing(self.bpf_program(target_ip, source_port), self.ring_frames)
+        paths = []
+
+        try:
+            pending = set(ports)
+            templates = []
+            for address, interface in sources:
+                templates.append(self.build_template(address, target_ip, source_port, sequence))
+                paths.append(SendPath(address, interface, target_ip, len(templates[-1][0]),
+                                      self.batch_size, self.send_rate))
+
+            # Ports are dealt out in turn, so every path gets its share of the priority order
+            shares = [ports[i::len(paths)] for i in range(len(paths))]
+            position = [0] * len(paths)
+            active = [i for i in range(len(paths)) if shares[i]]
+
+            while active:
+                # Each path is paced to RAW_SEND_RATE on its own; send from whichever is due first
+                i = min(active, key=lambda i: paths[i].next_send)
+                path = paths[i]
+                template, checksum_offset, dport_offset, base_sum = templates[i]
+                path.wait_turn(drain)
+
+                batch = shares[i][position[i]:position[i] + self.batch_size]
+                position[i] += len(batch)
+                for slot, port in enumerate(batch):
+                    path.sender.write(slot, template)
+                    path.sender.patch(slot, dport_offset, struct.pack("!H", port))
+                    path.sender.patch(slot, checksum_offset, struct.pack("!H", self.fold(base_sum + port) or 0xffff))
+                path.send(len(batch))
+                drain(0)
+                if position[i] >= len(shares[i]):
+                    active.remove(i)
+
+            deadline = time.monotonic() + timeout
+            while len(answered) < len(pending) and time.monotonic() < deadline:
+                drain(min(0.05, deadline - time.monotonic()))
+        finally:
+            rx_ring.close()
+            for path in paths:
+                path.close()
+
+        silent = "Filtered" if self.protocol == "tcp" else "Open|Filtered"
+        for port in ports:
+            if port not in answered:
+                results[port] = silent
+                if on_result:
+                    on_result(port, silent)
+
+        return results
+
+class BatchSender:
+    """
+    Fixed-size packets in one contiguous buffer, sent with one sendmmsg()
+    system call per batch.
+    """
+
+    _libc = None
+
+    def __init__(self, sock, target_ip, packet_len, batch_size):
+        """`target_ip` may be None when each slot gets its own address()."""
+        if BatchSender._libc is None:
+            BatchSender._libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = sock.fileno()
+        self.packet_len = packet_len
+        self.buffer = ctypes.create_string_buffer(packet_len * batch_size)
+        self.addresses = (_sockaddr_in * batch_size)()
+
+        base = ctypes.addressof(self.buffer)
+        self.iovecs = (_iovec * batch_size)()
+        self.messages = (_mmsghdr * batch_size)()
+        for i in range(batch_size):
+            self.addresses[i].sin_family = socket.AF_INET
+            if target_ip is not None:
+                self.addresses[i].sin_addr[:] = list(socket.inet_aton(target_ip))
+            self.iovecs[i].iov_base = base + i * packet_len
+            self.iovecs[i].iov_len = packet_len
+            header = self.messages[i].msg_hdr
+            header.msg_name = ctypes.addressof(self.addresses[i])
+            header.msg_namelen = ctypes.sizeof(_sockaddr_in)
+            header.msg_iov = ctypes.pointer(self.iovecs[i])
+            header.msg_iovlen = 1
+
+    def address(self, slot, packed_ip):
+        """Set the destination of one slot (4 packed bytes)."""
+        self.addresses[slot].sin_addr[:] = list(packed_ip)
+
+    def write(self, slot, packet):
+        start = slot * self.packet_len
+        self.buffer[start:start + self.packet_len] = packet
+
+    def patch(self, slot, offset, data):
+        start = slot * self.packet_len + offset
+        self.buffer[start:start + len(data)] = data
+
+    def send(self, count):
+        """Send the first `count` packets, retrying while the kernel queue is full."""
+        sent = 0
+        while sent < count:
+            n = self._libc.sendmmsg(self.fd, ctypes.byref(self.messages, sent * ctypes.sizeof(_mmsghdr)),
+                                    count - sent, 0)
+            if n < 0:
+                err = ctypes.get_errno()
+                if err in (11, 105):  # EAGAIN, ENOBUFS
+                    time.sleep(0.001)
+                    continue
+                raise OSError(err, os.strerror(err))
+            sent += n
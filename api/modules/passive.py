@@ -0,0 +1,244 @@
+import ipaddress
+import os
+import socket
+import struct
+import threading
+import time
+from datetime import datetime, timedelta
+from modules.packetio import RxRing, arp_dhcp_filter, ETH_P_ALL, ETH_P_ARP, ETH_P_IP
+
+# pcap link types whose network header can be located
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_LINUX_SLL2 = 276
+
+VLAN_ETHERTYPES = (0x8100, 0x88a8)
+DHCP_MAGIC_COOKIE = 0x63825363
+DHCPREQUEST, DHCPACK, DHCPINFORM = 3, 5, 8
+
+def read_pcap(path):
+    """
+    Yield (timestamp, EtherType, data, network header offset) for every ARP
+    or IPv4 packet of a classic libpcap capture file.
+    """
+    with open(path, "rb") as f:
+        header = f.read(24)
+        magic = header[:4]
+        if magic in (b"\xd4\xc3\xb2\xa1", b"\x4d\x3c\xb2\xa1"):
+            endian = "<"
+        elif magic in (b"\xa1\xb2\xc3\xd4", b"\xa1\xb2\x3c\x4d"):
+            endian = ">"
+        else:
+            raise ValueError(f"{path} is not a pcap file (save pcapng captures with -F pcap)")
+        scale = 1e9 if magic in (b"\x4d\x3c\xb2\xa1", b"\xa1\xb2\x3c\x4d") else 1e6
+        linktype = struct.unpack(endian + "I", header[20:24])[0] & 0xffff
+        if linktype not in (LINKTYPE_ETHERNET, LINKTYPE_RAW, LINKTYPE_LINUX_SLL, LINKTYPE_IPV4, LINKTYPE_LINUX_SLL2):
+            raise ValueError(f"Unsupported pcap link type {linktype}")
+        record = struct.Struct(endian + "IIII")
+
+        while True:
+            record_header = f.read(record.size)
+            if len(record_header) < record.size:
+                return
+            seconds, fraction, captured, _ = record.unpack(record_header)
+            data = f.read(captured)
+
+            try:
+                if linktype == LINKTYPE_ETHERNET:
+                    offset = 12
+                    ethertype = struct.unpack_from("!H", data, offset)[0]
+                    while ethertype in VLAN_ETHERTYPES:
+                        offset += 4
+                        ethertype = struct.unpack_from("!H", data, offset)[0]
+                    offset += 2
+                elif linktype == LINKTYPE_LINUX_SLL:
+                    ethertype, offset = struct.unpack_from("!H", data, 14)[0], 16
+                elif linktype == LINKTYPE_LINUX_SLL2:
+                    ethertype, offset = struct.unpack_from("!H", data, 0)[0], 20
+                else:
+                    ethertype, offset = ETH_P_IP, 0
+            except struct.error:
+                continue
+
+            if ethertype in (ETH_P_ARP, ETH_P_IP):
+                yield datetime.fromtimestamp(seconds + fraction / scale), ethertype, data, offset
+
+class PassiveDiscovery:
+    """
+    Continuous host discovery from traffic the network already carries,
+    instead of ARP sweeps.
+
+    A packet socket with a kernel BPF filter lets through only ARP frames and
+    DHCP datagrams, read from a memory-mapped ring. ARP senders and DHCP
+    leases (ACKs, and renewals from clients that already have an address)
+    update an in-memory inventory of IP, MAC and first/last seen times, which
+    is written to the host_inventory table every `flush_interval` seconds, in
+    one batch of the hosts seen since the last write. Hosts seen recently are
+    also recorded alive in the liveness cache.
+
+    The same parser reads pcap files with replay(), for testing and for
+    importing captures taken elsewhere.
+    """
+
+    def __init__(self, db_manager, host_liveness=None, interface=None, flush_interval=None, ring_frames=None):
+        """Initialize with explicit settings or use environment variables."""
+        self.db_manager = db_manager
+        self.host_liveness = host_liveness
+        self.interface = interface or os.environ.get('PASSIVE_INTERFACE') or None
+        self.flush_interval = flush_interval or float(os.environ.get('PASSIVE_FLUSH_INTERVAL', 10))
+        self.ring_frames = ring_frames or int(os.environ.get('RAW_RX_RING_FRAMES', 2048))
+        self.hosts = {}  # ip -> {"ip", "mac", "source", "first_seen", "last_seen"}
+        self.pending = set()  # IPs seen since the last flush
+        self._stop = threading.Event()
+
+    @staticmethod
+    def available():
+        """Whether packet sockets can be opened in this process (Linux, CAP_NET_RAW)."""
+        if not hasattr(socket, "AF_PACKET"):
+            return False
+        try:
+            socket.socket(socket.AF_PACKET, socket.SOCK_DGRAM, socket.htons(ETH_P_ALL)).close()
+        except OSError:
+            return False
+        return True
+
+    @staticmethod
+    def format_mac(raw):
+        return ":".join(f"{byte:02x}" for byte in raw)
+
+    def observe(self, ip, mac, source, seen_at):
+        """Record that `ip` was seen using `mac` at `seen_at`."""
+        host = self.hosts.get(ip)
+        if host is None:
+            self.hosts[ip] = {"ip": ip, "mac": mac, "source": source, "first_seen": seen_at, "last_seen": seen_at}
+        elif seen_at >= host["last_seen"]:
+            host.update(mac=mac, source=source, last_seen=seen_at)
+        elif seen_at < host["first_seen"]:
+            host["first_seen"] = seen_at
+        else:
+            return
+        self.pending.add(ip)
+
+    def parse(self, buf, base, length, seen_at):
+        """
+        Learn from one ARP packet or IPv4 DHCP datagram starting at `base` in
+        `buf` (a bytes object or the receive ring). Other packets are ignored.
+        """
+        end = base + length
+        if buf[base] >> 4 == 4:
+            self.parse_dhcp(buf, base, end, seen_at)
+        elif length >= 28:
+            _, ptype, hlen, plen = struct.unpack_from("!HHBB", buf, base)
+            if ptype != ETH_P_IP or hlen != 6 or plen != 4:
+                return
+            sender = bytes(buf[base + 14:base + 18])
+            # ARP probes (RFC 5227) come from 0.0.0.0 while an address is being claimed
+            if sender != b"\0\0\0\0":
+                self.observe(socket.inet_ntoa(sender), self.format_mac(buf[base + 8:base + 14]), "arp", seen_at)
+
+    def parse_dhcp(self, buf, base, end, seen_at):
+        header_length = (buf[base] & 0x0f) * 4
+        if end - base < header_length + 8 + 240 or buf[base + 9] != socket.IPPROTO_UDP:
+            return
+        if struct.unpack_from("!H", buf, base + 6)[0] & 0x1fff:
+            return
+        if struct.unpack_from("!H", buf, base + header_length + 2)[0] not in (67, 68):
+            return
+
+        bootp = base + header_length + 8
+        if buf[bootp + 1] != 1 or buf[bootp + 2] != 6:
+            return  # Not Ethernet hardware addresses
+        if struct.unpack_from("!I", buf, bootp + 236)[0] != DHCP_MAGIC_COOKIE:
+            return
+
+        message_type = None
+        option = bootp + 240
+        while option < end:
+            code = buf[option]
+            if code == 255:
+                break
+            if code == 0:
+                option += 1
+                continue
+            if option + 1 >= end:
+                break
+            if code == 53 and buf[option + 1] >= 1 and option + 2 < end:
+                message_type = buf[option + 2]
+                break
+            option += 2 + buf[option + 1]
+
+        client_address = bytes(buf[bootp + 12:bootp + 16])
+        your_address = bytes(buf[bootp + 16:bootp + 20])
+        if message_type == DHCPACK:
+            # An ACK for DHCPINFORM carries no lease; the client already has ciaddr
+            address = your_address if your_address != b"\0\0\0\0" else client_address
+        elif message_type in (DHCPREQUEST, DHCPINFORM):
+            address = client_address
+        else:
+            return
+        if address != b"\0\0\0\0":
+            self.observe(socket.inet_ntoa(address), self.format_mac(buf[bootp + 28:bootp + 34]), "dhcp", seen_at)
+
+    def flush(self):
+        """Write the hosts seen since the last flush. Kept pending on errors, for the next flush."""
+        if not self.pending:
+            return 0
+        batch = [dict(self.hosts[ip]) for ip in self.pending]
+        try:
+            self.db_manager.upsert_host_inventory(batch)
+            if self.host_liveness:
+                # Replayed captures may be old; only recent sightings say a host is up now
+                recent = datetime.now() - timedelta(seconds=self.host_liveness.alive_ttl)
+                alive = [host["ip"] for host in batch if host["last_seen"] >= recent]
+                self.host_liveness.record(alive=alive, source="passive")
+        except Exception as e:
+            print(f"Error writing host inventory: {e}")
+            return 0
+        self.pending.difference_update(host["ip"] for host in batch)
+        return len(batch)
+
+    def replay(self, path):
+        """Feed a pcap file through the parser and flush. Returns the number of hosts written."""
+        for seen_at, ethertype, data, offset in read_pcap(path):
+            if len(data) > offset:
+                try:
+                    self.parse(data, offset, len(data) - offset, seen_at)
+                except (IndexError, struct.error):
+                    continue  # Truncated packet
+        return self.flush()
+
+    def run(self):
+        """Listen until stopped, flushing every `flush_interval` seconds."""
+        ring = RxRing(arp_dhcp_filter(), self.ring_frames, ETH_P_ALL, self.interface)
+        print(f"Passive discovery on {self.interface or 'all interfaces'} started")
+        last_flush = time.monotonic()
+
+        def handle(buf, base, snaplen):
+            try:
+                self.parse(buf, base, snaplen, seen_at)
+            except (IndexError, struct.error):
+                pass  # Truncated packet
+
+        try:
+            while not self._stop.is_set():
+                seen_at = datetime.now()
+                ring.drain(handle, wait=1)
+                if time.monotonic() - last_flush >= self.flush_interval:
+                    self.flush()
+                    last_flush = time.monotonic()
+        finally:
+            ring.close()
+            self.flush()
+
+    def stop(self):
+        self._stop.set()
+
+    def inventory(self, network=None):
+        """Snapshot of the hosts seen so far, optionally only those in `network`."""
+        hosts = list(self.hosts.values())
+        if network:
+            network = ipaddress.ip_network(network, strict=False)
+            hosts = [host for host in hosts if ipaddress.ip_address(host["ip"]) in network]
+        return sorted(hosts, key=lambda host: ipaddress.ip_address(host["ip"]))
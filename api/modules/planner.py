@@ -0,0 +1,94 @@
+import threading
+import time
+
+class ScanPlanner:
+    """
+    Decides which probes a scan should send before any packets go out
+    """
+
+    # Number of runs a recheck needs to cover every requested port once
+    DEFAULT_RECHECK_SLICES = 8
+
+    # Ports most often found open on the internet and internal networks, most common first
+    TOP_TCP_PORTS = [
+        80, 443, 22, 3389, 445, 21, 23, 25, 8080, 3306, 139, 135, 53, 110, 143,
+        8443, 5900, 1433, 5432, 6379, 993, 995, 587, 465, 111, 1723, 8000, 8888,
+        9200, 27017, 11211, 2049, 389, 636, 5985, 5986, 1521, 9090, 8081, 2375,
+        5000, 5060, 179, 1025, 199, 548, 554, 113, 81, 10000, 514, 515, 631, 88,
+        8008, 5672, 15672, 9000, 9100, 2181, 9092, 6443, 10250, 873, 161, 3000,
+        4443, 7001, 8009, 8181, 8880, 4848, 5601, 50000, 49152, 49153, 49154,
+    ]
+    TOP_UDP_PORTS = [
+        53, 161, 123, 137, 138, 67, 68, 500, 4500, 1900, 5353, 514, 69, 162,
+        520, 631, 1434, 445, 135, 139, 1194, 5060, 11211, 1812, 1813, 49152,
+    ]
+
+    _learned = {}
+    _learned_lock = threading.Lock()
+
+    @staticmethod
+    def recheck_slice(ports, slice_index, slices):
+        """
+        Return the slice of ports covered by one rotation step.
+        Ports are interleaved (every Nth port) so each slice spreads across the range.
+        """
+        ports = sorted(ports)
+        return ports[slice_index % slices::slices]
+
+    @staticmethod
+    def plan_recheck(ports, last_open_ports, previous_slice_index, slices=DEFAULT_RECHECK_SLICES):
+        """
+        Plan a differential rescan of the requested ports.
+
+        Re-probes every port last seen open plus the next rotating slice of the
+        remaining ports, so that all requested ports are covered within `slices` runs.
+        Returns (ports_to_probe, slice_index).
+        """
+        requested = set(ports)
+        slice_index = 0 if previous_slice_index is None else (previous_slice_index + 1) % slices
+
+        probe = set(last_open_ports) & requested
+        probe.update(ScanPlanner.recheck_slice(requested, slice_index, slices))
+
+        return sorted(probe), slice_index
+
+    @staticmethod
+    def prioritize(ports, scan_type='stealth', learned=None):
+        """
+        Order ports so the most likely open ones are probed first.
+
+        Each port scores up to 1 for its rank in the built-in table and up to 1
+        for how many targets it was found open on in our own history
+        (`learned` maps port -> count). Ties keep numeric order.
+        """
+        top = ScanPlanner.TOP_UDP_PORTS if scan_type == 'udp' else ScanPlanner.TOP_TCP_PORTS
+        rank = {port: i for i, port in enumerate(top)}
+        learned = learned or {}
+        max_learned = max(learned.values(), default=0) or 1
+
+        def score(port):
+            builtin = 1 - rank[port] / len(top) if port in rank else 0
+            return builtin + learned.get(port, 0) / max_learned
+
+        return sorted(ports, key=lambda port: (-score(port), port))
+
+    @classmethod
+    def learned_port_frequency(cls, db_manager, protocol, ttl=3600):
+        """
+        Return {port: number of targets seen open} from scan history, cached per
+        process for `ttl` seconds so planning a scan does not query the history table.
+        """
+        with cls._learned_lock:
+            cached = cls._learned.get(protocol)
+            if cached and time.monotonic() - cached[0] < ttl:
+                return cached[1]
+
+        try:
+            frequency = db_manager.get_open_port_frequency(protocol)
+        except Exception as e:
+            print(f"Error loading port frequency history: {e}")
+            frequency = cached[1] if cached else {}
+
+        with cls._learned_lock:
+            cls._learned[protocol] = (time.monotonic(), frequency)
+        return frequency
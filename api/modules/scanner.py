@@ -1,9 +1,50 @@
-from scapy.all import IP, TCP, UDP, ICMP, sr1, srp, Ether, ARP
 import ipaddress
+import os
 import threading
 import time
 import concurrent.futures
-from queue import Queue
+from queue import Queue, Empty
+from types import SimpleNamespace
+from modules.portstate import PortStateVector
+from modules.packetio import PacketProbeEngine, resolve_sources
+
+_scapy = None
+_scapy_lock = threading.Lock()
+
+def load_scapy():
+    """
+    Import the scapy layers the scanner needs on first use.
+    Importing scapy.all pulls in every protocol layer and takes seconds, so it
+    is avoided and nothing is loaded until a scan actually runs.
+    """
+    global _scapy
+    if _scapy is None:
+        with _scapy_lock:
+            if _scapy is None:
+                from scapy.layers.inet import IP, TCP, UDP, ICMP
+                from scapy.layers.l2 import Ether, ARP
+                from scapy.sendrecv import sr1, srp
+                _scapy = SimpleNamespace(
+                    IP=IP, TCP=TCP, UDP=UDP, ICMP=ICMP, Ether=Ether, ARP=ARP, sr1=sr1, srp=srp
+                )
+    return _scapy
+
+class ProbeBudget:
+    """
+    Probe capacity shared by scans that run at the same time, such as the
+    targets of a bulk scan, so that together they stay within the limits of
+    a single scan: at most MAX_WORKERS scapy probes in flight (each followed
+    by the RATE_LIMIT pause), and RAW_SEND_RATE split evenly between the
+    `shares` scans on the raw packet backend.
+    """
+    
+    def __init__(self, shares=1):
+        self.shares = max(1, shares)
+        self.slots = threading.BoundedSemaphore(NetworkScanner.MAX_WORKERS)
+    
+    def send_rate(self):
+        """Raw packet send rate of one of the scans."""
+        return float(os.environ.get('RAW_SEND_RATE', 5000)) / self.shares
 
 class NetworkScanner:
     """
@@ -14,27 +55,35 @@ class NetworkScanner:
     MAX_WORKERS = 10  # Maximum number of concurrent worker threads
     RATE_LIMIT = 0.02  # 20ms between packets (50 packets per second)
     
+    # Multi-pass scanning: a fast first pass, then retries of unanswered ports only
+    FIRST_PASS_TIMEOUT = 0.3  # Seconds to wait for a reply on the first pass
+    DEFAULT_RETRIES = 2  # Extra passes over ports that did not answer
+    UNANSWERED = (PortStateVector.FILTERED, PortStateVector.OPEN_FILTERED)  # State codes that mean "no reply"
+    
     @staticmethod
     def _scan_port_stealth(target_ip, port, timeout=1):
         """
         Scan a single port using stealth SYN scan.
         """
+        scapy = load_scapy()
+        IP, TCP, sr1 = scapy.IP, scapy.TCP, scapy.sr1
         response = sr1(IP(dst=target_ip)/TCP(dport=port, flags="S"), timeout=timeout, verbose=0)
         if response and response.haslayer(TCP):
             if response[TCP].flags == 0x12:  # SYN-ACK
                 # Send RST to close connection
                 sr1(IP(dst=target_ip)/TCP(dport=port, flags="R"), timeout=timeout, verbose=0)
                 return port, "Open"
-            elif response[TCP].flags == 0x14:  # RST-ACK
+            elif response[TCP].flags & 0x04:  # RST or RST-ACK
                 return port, "Closed"
-        else:
-            return port, "Filtered"
+        return port, "Filtered"
     
     @staticmethod
     def _scan_port_connect(target_ip, port, timeout=1):
         """
         Scan a single port using full TCP connect scan.
         """
+        scapy = load_scapy()
+        IP, TCP, sr1 = scapy.IP, scapy.TCP, scapy.sr1
         response = sr1(IP(dst=target_ip)/TCP(dport=port, flags="S"), timeout=timeout, verbose=0)
         if response and response.haslayer(TCP):
             if response[TCP].flags == 0x12:
@@ -53,6 +102,8 @@ class NetworkScanner:
         """
         Scan a single port using UDP scan.
         """
+        scapy = load_scapy()
+        IP, UDP, ICMP, sr1 = scapy.IP, scapy.UDP, scapy.ICMP, scapy.sr1
         response = sr1(IP(dst=target_ip)/UDP(dport=port), timeout=timeout, verbose=0)
         if response is None:
             return port, "Open|Filtered"  # No response could mean open or filtered
@@ -65,40 +116,140 @@ class NetworkScanner:
             return port, "Open"
     
     @staticmethod
-    def stealth_port_scan(target_ip, ports, timeout=1):
+    def stealth_port_scan(target_ip, ports, timeout=1, on_result=None, retries=None, sources=None, budget=None):
         """
         Perform a stealth SYN port scan using multiple threads.
-        Returns a dict with port numbers as keys and status as values.
+        Returns a PortStateVector mapping port numbers to status.
         """
-        return NetworkScanner._threaded_port_scan(
-            NetworkScanner._scan_port_stealth, target_ip, ports, timeout
+        return NetworkScanner._multi_pass_scan(
+            NetworkScanner._scan_port_stealth, target_ip, ports, timeout, on_result, retries,
+            raw_protocol="tcp", sources=sources, budget=budget
         )
     
     @staticmethod
-    def connect_scan(target_ip, ports, timeout=1):
+    def connect_scan(target_ip, ports, timeout=1, on_result=None, retries=None, budget=None):
         """
         Perform a full TCP connect scan using multiple threads.
         """
-        return NetworkScanner._threaded_port_scan(
-            NetworkScanner._scan_port_connect, target_ip, ports, timeout
+        return NetworkScanner._multi_pass_scan(
+            NetworkScanner._scan_port_connect, target_ip, ports, timeout, on_result, retries, budget=budget
         )
     
     @staticmethod
-    def udp_scan(target_ip, ports, timeout=1):
+    def udp_scan(target_ip, ports, timeout=1, on_result=None, retries=None, sources=None, budget=None):
         """
         Perform a UDP scan using multiple threads.
         """
-        return NetworkScanner._threaded_port_scan(
-            NetworkScanner._scan_port_udp, target_ip, ports, timeout
+        return NetworkScanner._multi_pass_scan(
+            NetworkScanner._scan_port_udp, target_ip, ports, timeout, on_result, retries,
+            raw_protocol="udp", sources=sources, budget=budget
         )
     
     @staticmethod
-    def _threaded_port_scan(scan_func, target_ip, ports, timeout=1):
+    def pass_timeouts(timeout, retries):
+        """
+        Per-pass reply timeouts: start at FIRST_PASS_TIMEOUT and grow
+        geometrically so the final pass waits the full `timeout`.
+        """
+        if retries <= 0 or timeout <= 0:
+            return [timeout]
+        first = min(NetworkScanner.FIRST_PASS_TIMEOUT, timeout)
+        growth = (timeout / first) ** (1.0 / retries)
+        return [first * growth ** i for i in range(retries)] + [timeout]
+    
+    @staticmethod
+    def packet_engine(raw_protocol, target_ip, sources=None, budget=None):
+        """
+        Batched raw packet backend for a scan, or None to use scapy.
+        Enabled with SCAN_IO_BACKEND=packet where the platform supports it,
+        sending from SCAN_SOURCES by default. Explicit `sources` (see
+        packetio.parse_sources) need the raw backend and enable it. Sources
+        that are not usable on this host (e.g. a worker without the interface)
+        fall back to scapy, as an unavailable backend does. With a
+        ProbeBudget, the engine gets its share of the send rate.
+        """
+        if raw_protocol is None:
+            return None
+        if not sources:
+            if os.environ.get('SCAN_IO_BACKEND', 'scapy').lower() != 'packet':
+                return None
+            sources = [s for s in os.environ.get('SCAN_SOURCES', '').split(',') if s.strip()]
+        if not PacketProbeEngine.available(target_ip):
+            if sources:
+                print(f"Raw packet backend unavailable, scanning {target_ip} with scapy from the default source")
+            return None
+        try:
+            sources = resolve_sources(sources)
+        except ValueError as e:
+            print(f"Invalid scan sources ({e}), scanning {target_ip} with scapy from the default source")
+            return None
+        return PacketProbeEngine(raw_protocol, send_rate=budget.send_rate() if budget else None, sources=sources)
+    
+    @staticmethod
+    def _scan_pass(scan_func, engine, target_ip, ports, timeout, on_result, results, budget=None):
+        """Run one pass on the raw packet backend, falling back to scapy if it fails."""
+        if engine is not None and PacketProbeEngine.disabled_reason is None:
+            try:
+                return engine.scan(target_ip, ports, timeout, on_result, results)
+            except OSError as e:
+                # e.g. no CAP_NET_RAW: stop trying the raw backend in this process
+                PacketProbeEngine.disabled_reason = str(e)
+                print(f"Raw packet backend unavailable, using scapy: {e}")
+        return NetworkScanner._threaded_port_scan(scan_func, target_ip, ports, timeout, on_result, results, budget)
+    
+    @staticmethod
+    def _multi_pass_scan(scan_func, target_ip, ports, timeout=1, on_result=None, retries=None, raw_protocol=None, sources=None,
+                         budget=None):
+        """
+        Scan in several passes. The first pass uses a short timeout; each later
+        pass only re-probes the ports that got no reply, with a longer timeout,
+        until the full timeout has been tried. Ports that answer are reported
+        to on_result immediately; unanswered ones only after their last pass.
+        `raw_protocol` ("tcp" or "udp") allows the batched raw packet backend
+        for probes it can send, and `sources` spread them over several local
+        addresses and/or interfaces. A ProbeBudget shares probe capacity with
+        other scans running at the same time.
+        """
+        retries = NetworkScanner.DEFAULT_RETRIES if retries is None else retries
+        timeouts = NetworkScanner.pass_timeouts(timeout, retries)
+        unanswered = {PortStateVector.STATUS_NAMES[code] for code in NetworkScanner.UNANSWERED}
+        
+        # One vector per host, shared by every pass; later passes overwrite retried ports
+        results = PortStateVector.for_ports(ports)
+        pending = list(ports)
+        engine = NetworkScanner.packet_engine(raw_protocol, target_ip, sources, budget)
+        
+        for pass_number, pass_timeout in enumerate(timeouts):
+            last_pass = pass_number == len(timeouts) - 1
+            
+            def report(port, status):
+                if on_result and (last_pass or status not in unanswered):
+                    on_result(port, status)
+            
+            NetworkScanner._scan_pass(
+                scan_func, engine, target_ip, pending, pass_timeout, report, results, budget
+            )
+            
+            # Keep the original (priority) order for the next pass
+            retry = set(results.ports_with(*NetworkScanner.UNANSWERED))
+            pending = [port for port in pending if port in retry]
+            if not pending:
+                break
+        
+        return results
+    
+    @staticmethod
+    def _threaded_port_scan(scan_func, target_ip, ports, timeout=1, on_result=None, results=None, budget=None):
         """
         Generic threaded port scanning function.
         Uses ThreadPoolExecutor to manage worker threads and applies rate limiting.
+        If given, on_result(port, status) is called as soon as each port is scanned.
+        Results are written into `results` (a PortStateVector, allocated if not given).
+        With a ProbeBudget, each probe and its rate limiting pause take one of
+        the budget's slots, shared with the other scans using it.
         """
-        results = {}
+        if results is None:
+            results = PortStateVector.for_ports(ports)
         
         # Use semaphore to control rate limiting across threads
         port_queue = Queue()
@@ -108,13 +259,24 @@ class NetworkScanner:
             port_queue.put(port)
         
         def worker():
-            while not port_queue.empty():
+            while True:
                 try:
                     port = port_queue.get(block=False)
-                    port, status = scan_func(target_ip, port, timeout)
-                    results[port] = status
-                    # Apply rate limiting
-                    time.sleep(NetworkScanner.RATE_LIMIT)
+                except Empty:
+                    return
+                try:
+                    if budget:
+                        budget.slots.acquire()
+                    try:
+                        port, status = scan_func(target_ip, port, timeout)
+                        results[port] = status
+                        if on_result:
+                            on_result(port, status)
+                        # Apply rate limiting
+                        time.sleep(NetworkScanner.RATE_LIMIT)
+                    finally:
+                        if budget:
+                            budget.slots.release()
                 except Exception as e:
                     print(f"Error scanning port: {e}")
                 finally:
@@ -139,15 +301,23 @@ class NetworkScanner:
         return results
     
     @staticmethod
-    def discover_hosts(network):
+    def discover_hosts(network, exclude=None):
         """
-        Discover active hosts on a network using ARP.
+        Discover active hosts on a network using ARP. Addresses in `exclude`
+        (e.g. hosts already seen by passive discovery) are not probed.
         """
+        scapy = load_scapy()
+        Ether, ARP, srp = scapy.Ether, scapy.ARP, scapy.srp
         network = ipaddress.ip_network(network)
         
         # Create ARP request for all hosts in the network
+        pdst = str(network)
+        if exclude:
+            pdst = [str(host) for host in network.hosts() if str(host) not in exclude]
+            if not pdst:
+                return []
         ans, unans = srp(
-            Ether(dst="ff:ff:ff:ff:ff:ff")/ARP(pdst=str(network)),
+            Ether(dst="ff:ff:ff:ff:ff:ff")/ARP(pdst=pdst),
             timeout=5,
             verbose=0
         )
@@ -159,15 +329,17 @@ class NetworkScanner:
         return active_hosts
     
     @staticmethod
-    def scan_ports_async(scan_type, target_ip, ports, timeout=1):
+    def scan_ports_async(scan_type, target_ip, ports, timeout=1, on_result=None, retries=None, sources=None, budget=None):
         """
-        Perform the appropriate scan based on scan_type.
+        Perform the appropriate scan based on scan_type. `sources` only apply
+        to stealth and UDP scans; `budget` is a ProbeBudget shared with other
+        scans running at the same time.
         """
         if scan_type == 'stealth':
-            return NetworkScanner.stealth_port_scan(target_ip, ports, timeout)
+            return NetworkScanner.stealth_port_scan(target_ip, ports, timeout, on_result, retries, sources, budget)
         elif scan_type == 'connect':
-            return NetworkScanner.connect_scan(target_ip, ports, timeout)
+            return NetworkScanner.connect_scan(target_ip, ports, timeout, on_result, retries, budget)
         elif scan_type == 'udp':
-            return NetworkScanner.udp_scan(target_ip, ports, timeout)
+            return NetworkScanner.udp_scan(target_ip, ports, timeout, on_result, retries, sources, budget)
         else:
             raise ValueError(f"Unsupported scan type: {scan_type}")
\ No newline at end of file
@@ -0,0 +1,156 @@
+import heapq
+import os
+import random
+import threading
+import time
+
+class ScanScheduler:
+    """
+    Runs recurring scan schedules stored in the database.
+
+    Each schedule's targets are spread evenly across its interval (with random
+    jitter) instead of all firing at once, and the number of scheduled scans
+    running at the same time is capped by a global capacity budget.
+    """
+
+    # Advisory lock key that makes only one API process run the scheduler
+    LEADER_LOCK_KEY = 0x44574348
+
+    def __init__(self, db_manager, run_scan, max_concurrent=None, jitter=None, reload_interval=None, tick=1.0):
+        """
+        Initialize with explicit settings or use environment variables.
+        `run_scan(schedule, target)` is called from a worker thread and should
+        block until the scan has finished.
+        """
+        self.db_manager = db_manager
+        self.run_scan = run_scan
+        self.max_concurrent = max_concurrent or int(os.environ.get('SCHEDULER_MAX_CONCURRENT', 4))
+        self.jitter = jitter if jitter is not None else float(os.environ.get('SCHEDULER_JITTER', 0.1))
+        self.reload_interval = reload_interval or float(os.environ.get('SCHEDULER_RELOAD_INTERVAL', 60))
+        self.tick = tick
+
+        self.capacity = threading.BoundedSemaphore(self.max_concurrent)
+        self.schedules = {}
+        self.queue = []  # heap of (due_time, base_time, schedule_id, target)
+        self._thread = None
+        self._stop = threading.Event()
+        self._leader_conn = None
+
+    @staticmethod
+    def slot_offsets(target_count, interval):
+        """Evenly spaced start offsets (in seconds) for each target within an interval."""
+        if target_count == 0:
+            return []
+        step = interval / target_count
+        return [i * step for i in range(target_count)]
+
+    def _jittered(self, base_time, schedule):
+        """Apply random jitter of up to +/- `jitter` of one target's slot width."""
+        slot = schedule['interval_seconds'] / max(1, len(schedule['targets']))
+        return base_time + random.uniform(-self.jitter, self.jitter) * slot
+
+    def start(self):
+        """Start the scheduler thread if it is not already running."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        """Signal the scheduler thread to stop."""
+        self._stop.set()
+
+    def _acquire_leadership(self):
+        """
+        Take an advisory lock so that only one process schedules scans.
+        The lock is held for as long as its connection stays open.
+        """
+        if self._leader_conn is not None and not self._leader_conn.closed:
+            return True
+
+        self._leader_conn = self.db_manager.acquire_advisory_lock(self.LEADER_LOCK_KEY)
+        return self._leader_conn is not None
+
+    def reload(self, now=None):
+        """
+        Sync in-memory state with the enabled schedules in the database.
+        New targets are placed at their evenly spread offset from now, so a
+        restart does not make every target due at once.
+        """
+        now = now or time.time()
+        schedules = {s['schedule_id']: s for s in self.db_manager.get_schedules(enabled_only=True)}
+
+        wanted = set()
+
+        for schedule_id, schedule in schedules.items():
+            previous = self.schedules.get(schedule_id)
+            if previous is not None and (
+                previous['interval_seconds'] != schedule['interval_seconds']
+                or previous['targets'] != schedule['targets']
+            ):
+                # Re-spread the whole schedule when its interval or targets change
+                self.queue = [e for e in self.queue if e[2] != schedule_id]
+
+            queued = {(e[2], e[3]) for e in self.queue}
+            offsets = self.slot_offsets(len(schedule['targets']), schedule['interval_seconds'])
+
+            for target, offset in zip(schedule['targets'], offsets):
+                wanted.add((schedule_id, target))
+                if (schedule_id, target) not in queued:
+                    base_time = now + offset
+                    self.queue.append((self._jittered(base_time, schedule), base_time, schedule_id, target))
+
+        # Forget schedules and targets that were removed or disabled
+        self.queue = [e for e in self.queue if (e[2], e[3]) in wanted]
+        heapq.heapify(self.queue)
+        self.schedules = schedules
+
+    def _run(self):
+        """Main loop: launch due targets while capacity allows."""
+        next_reload = 0
+
+        while not self._stop.is_set():
+            try:
+                if not self._acquire_leadership():
+                    self._stop.wait(self.reload_interval)
+                    continue
+
+                now = time.time()
+                if now >= next_reload:
+                    self.reload(now)
+                    next_reload = now + self.reload_interval
+
+                while self.queue and self.queue[0][0] <= now:
+                    # Over budget: leave the target due and retry on the next tick
+                    if not self.capacity.acquire(blocking=False):
+                        break
+
+                    _, base_time, schedule_id, target = heapq.heappop(self.queue)
+                    schedule = self.schedules[schedule_id]
+
+                    # Keep the target's phase within the interval so jitter does not drift
+                    next_base = base_time + schedule['interval_seconds']
+                    while next_base <= now:
+                        next_base += schedule['interval_seconds']
+                    heapq.heappush(self.queue, (self._jittered(next_base, schedule), next_base, schedule_id, target))
+
+                    worker = threading.Thread(target=self._execute, args=(schedule, target))
+                    worker.daemon = True
+                    worker.start()
+            except Exception as e:
+                print(f"Error in scan scheduler: {e}")
+                if self._leader_conn is not None:
+                    self._leader_conn.close()
+                    self._leader_conn = None
+
+            self._stop.wait(self.tick)
+
+    def _execute(self, schedule, target):
+        """Run one scheduled scan and release its capacity slot."""
+        try:
+            self.run_scan(schedule, target)
+        except Exception as e:
+            print(f"Error running scheduled scan {schedule['schedule_id']} on {target}: {e}")
+        finally:
+            self.capacity.release()
@@ -0,0 +1,749 @@
+import fcntl
+import functools
+import ipaddress
+import json
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+from modules.db import DatabaseManager
+from modules.portstate import PortStateVector
+
+# Columns are converted back to Python values by their declared type, the way
+# psycopg2 returns them for the PostgreSQL schema
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+sqlite3.register_converter("TIMESTAMP", lambda value: datetime.fromisoformat(value.decode()))
+sqlite3.register_converter("JSONB", json.loads)
+sqlite3.register_converter("BOOLEAN", lambda value: value not in (b"0", b""))
+
+class _SQLiteCursor:
+    """
+    sqlite3 cursor that accepts the SQL DatabaseManager writes for psycopg2:
+    %s placeholders, and `= ANY(%s)` with a Python list, which becomes an IN
+    over the list sent as JSON.
+    """
+    
+    PLACEHOLDER = re.compile(r"=\s*ANY\(%s\)|%s|%%")
+    
+    def __init__(self, cursor):
+        self._cursor = cursor
+    
+    @staticmethod
+    @functools.lru_cache(maxsize=256)
+    def translate(query):
+        def replace(match):
+            token = match.group(0)
+            if token == "%%":
+                return "%"
+            if token == "%s":
+                return "?"
+            return "IN (SELECT value FROM json_each(?))"
+        return _SQLiteCursor.PLACEHOLDER.sub(replace, query)
+    
+    @staticmethod
+    def adapt(params):
+        return [json.dumps(p) if isinstance(p, (list, tuple)) else p for p in params or ()]
+    
+    def execute(self, query, params=None):
+        self._cursor.execute(self.translate(query), self.adapt(params))
+        return self
+    
+    def executemany(self, query, seq_of_params):
+        self._cursor.executemany(self.translate(query), [self.adapt(params) for params in seq_of_params])
+        return self
+    
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+class _SQLiteConnection:
+    """
+    A thread's sqlite3 connection, handed out by get_connection() for every
+    call. close() only ends the open transaction; the connection is reused.
+    """
+    
+    closed = False
+    
+    def __init__(self, conn):
+        self._conn = conn
+    
+    def cursor(self, name=None):
+        # Named (server-side) cursors have no equivalent; sqlite3 cursors already step through rows lazily
+        return _SQLiteCursor(self._conn.cursor())
+    
+    def commit(self):
+        self._conn.commit()
+    
+    def rollback(self):
+        self._conn.rollback()
+    
+    def close(self):
+        self._conn.rollback()
+
+class SQLiteDatabaseManager(DatabaseManager):
+    """
+    DatabaseManager on an embedded SQLite file, for scanner nodes too small to
+    run PostgreSQL.
+
+    Every DatabaseManager operation is available. Queries that are portable
+    run unchanged through a translating cursor; those that rely on PostgreSQL
+    features (unnest, intervals, row locks, advisory locks) are overridden
+    here. The database runs in WAL mode with one connection per thread, so
+    readers never block the scan threads writing results, and each write is a
+    local transaction instead of a network round trip. Finished scans can be
+    pushed to a central PostgreSQL database with sync_upstream().
+    """
+    
+    PORT_PROBED_SQL = "k.port IN (SELECT value FROM json_each(s.parameters, '$.ports'))"
+    
+    def __init__(self, path=None, busy_timeout=None):
+        """Initialize with explicit settings or use environment variables."""
+        super().__init__(read_dsns=[])
+        self.path = path or os.environ.get('SQLITE_PATH', 'dalang_watcher.db')
+        self.busy_timeout = busy_timeout or float(os.environ.get('SQLITE_BUSY_TIMEOUT', 30))
+        self._local = threading.local()
+    
+    def get_connection(self):
+        """Get this thread's connection to the database file."""
+        local = self._local
+        # A connection must not be shared with a forked child process
+        if getattr(local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, detect_types=sqlite3.PARSE_DECLTYPES)
+            conn.execute("PRAGMA journal_mode = WAL")
+            # In WAL mode NORMAL only syncs at checkpoints and stays consistent after a crash
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute("PRAGMA foreign_keys = ON")
+            local.conn, local.pid = _SQLiteConnection(conn), os.getpid()
+        return local.conn
+    
+    def acquire_advisory_lock(self, key):
+        """
+        Take an exclusive lock shared by every process using the database
+        file, held until the returned file is closed. Returns None if another
+        process holds it.
+        """
+        lock_file = open(f"{self.path}.lock-{key:x}", "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return None
+        return lock_file
+    
+    def init_db(self):
+        """Initialize the database schema."""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        conn = self.get_connection()
+        cur = conn.cursor()
+        
+        cur.execute("SELECT COUNT(*) = 0 FROM sqlite_master WHERE type = 'table' AND name = 'port_intervals'")
+        intervals_is_new = cur.fetchone()[0]
+        
+        # The same tables and indexes as the PostgreSQL schema
+        cur.executescript('''
+        BEGIN;
+
+        CREATE TABLE IF NOT EXISTS scan_groups (
+            group_id INTEGER PRIMARY KEY,
+            scan_type VARCHAR(50),
+            parameters JSONB,
+            target_count INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+
+        CREATE TABLE IF NOT EXISTS scans (
+            scan_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            scan_type VARCHAR(50),
+            target TEXT,
+            parameters JSONB,
+            status VARCHAR(20) DEFAULT 'running',
+            completed_at TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            group_id INTEGER REFERENCES scan_groups(group_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_scans_target_type ON scans(target, scan_type, created_at DESC);
+        CREATE INDEX IF NOT EXISTS idx_scans_group ON scans(group_id) WHERE group_id IS NOT NULL;
+
+        CREATE TABLE IF NOT EXISTS scan_results (
+            result_id INTEGER PRIMARY KEY,
+            scan_id INTEGER REFERENCES scans(scan_id),
+            target TEXT,
+            port INTEGER,
+            protocol VARCHAR(10),
+            status VARCHAR(20),
+            additional_data JSONB,
+            discovered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE INDEX IF NOT EXISTS idx_scan_results_target ON scan_results(target);
+        CREATE INDEX IF NOT EXISTS idx_scan_results_scan ON scan_results(scan_id);
+        CREATE INDEX IF NOT EXISTS idx_scan_results_discovered ON scan_results(discovered_at);
+
+        CREATE TABLE IF NOT EXISTS webhooks (
+            webhook_id INTEGER PRIMARY KEY,
+            url TEXT NOT NULL,
+            events JSONB,
+            secret TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+
+        CREATE TABLE IF NOT EXISTS scan_schedules (
+            schedule_id INTEGER PRIMARY KEY,
+            name TEXT,
+            targets JSONB NOT NULL,
+            ports JSONB NOT NULL,
+            scan_type VARCHAR(20) DEFAULT 'stealth',
+            mode VARCHAR(20) DEFAULT 'full',
+            timeout REAL DEFAULT 1,
+            interval_seconds INTEGER NOT NULL,
+            enabled BOOLEAN DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+
+        CREATE TABLE IF NOT EXISTS scan_jobs (
+            job_id INTEGER PRIMARY KEY,
+            scan_id INTEGER REFERENCES scans(scan_id),
+            target TEXT,
+            ports JSONB,
+            scan_type VARCHAR(20),
+            timeout REAL,
+            options JSONB,
+            status VARCHAR(20) DEFAULT 'pending',
+            worker_id TEXT,
+            attempts INTEGER DEFAULT 0,
+            claimed_at TIMESTAMP,
+            heartbeat_at TIMESTAMP,
+            completed_at TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE INDEX IF NOT EXISTS idx_scan_jobs_pending ON scan_jobs(job_id) WHERE status = 'pending';
+        CREATE INDEX IF NOT EXISTS idx_scan_jobs_scan ON scan_jobs(scan_id);
+
+        CREATE TABLE IF NOT EXISTS host_liveness (
+            target TEXT PRIMARY KEY,
+            alive BOOLEAN NOT NULL,
+            source VARCHAR(20),
+            checked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            expires_at TIMESTAMP NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS host_inventory (
+            ip TEXT PRIMARY KEY,
+            mac VARCHAR(17),
+            source VARCHAR(20),
+            first_seen TIMESTAMP NOT NULL,
+            last_seen TIMESTAMP NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_host_inventory_last_seen ON host_inventory(last_seen);
+
+        CREATE TABLE IF NOT EXISTS port_exposure (
+            protocol VARCHAR(10) NOT NULL,
+            port INTEGER NOT NULL,
+            target TEXT NOT NULL,
+            first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_scan_id INTEGER,
+            PRIMARY KEY (protocol, port, target)
+        );
+        CREATE INDEX IF NOT EXISTS idx_port_exposure_target ON port_exposure(target, protocol);
+
+        CREATE TABLE IF NOT EXISTS port_intervals (
+            interval_id INTEGER PRIMARY KEY,
+            target TEXT NOT NULL,
+            protocol VARCHAR(10) NOT NULL,
+            port INTEGER NOT NULL,
+            opened_at TIMESTAMP NOT NULL,
+            last_seen TIMESTAMP NOT NULL,
+            closed_at TIMESTAMP,
+            last_scan_id INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS idx_port_intervals_target ON port_intervals(target, opened_at, closed_at);
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_port_intervals_open ON port_intervals(target, protocol, port) WHERE closed_at IS NULL;
+
+        -- Finished scans already pushed upstream, and their scan ID there
+        CREATE TABLE IF NOT EXISTS upstream_sync (
+            scan_id INTEGER PRIMARY KEY REFERENCES scans(scan_id),
+            upstream_scan_id INTEGER NOT NULL,
+            synced_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+
+        COMMIT;
+        ''')
+        
+        self._complete_legacy_scans(cur)
+        if intervals_is_new:
+            self._backfill_port_intervals(cur)
+        conn.commit()
+        
+        cur.close()
+        conn.close()
+    
+    def create_scan_group(self, scan_type, targets, parameters, jobs=None):
+        """
+        Create a scan group and one child scan per target in a single transaction.
+        Returns (group_id, [(scan_id, target), ...]) in target order.
+        """
+        conn = self.get_connection()
+        cur = conn.cursor()
+        
+        cur.execute(
+            "INSERT INTO scan_groups (scan_type, parameters, target_count) VALUES (%s, %s, %s) RETURNING group_id",
+            (scan_type, json.dumps(parameters), len(targets))
+        )
+        group_id = cur.fetchone()[0]
+        
+        children = []
+        for target in targets:
+            cur.execute(
+                "INSERT INTO scans (scan_type, target, parameters, group_id) VALUES (%s, %s, %s, %s) RETURNING scan_id",
+                (scan_type, target, json.dumps(parameters), group_id)
+            )
+            children.append((cur.fetchone()[0], target))
+        
+        if jobs is not None:
+            # Shard by shard, so the first shards of all targets run first
+            ports, shard_size = jobs['ports'], jobs.get('shard_size', 1000)
+            options = json.dumps(jobs.get('options') or {})
+            cur.executemany(
+                "INSERT INTO scan_jobs (scan_id, target, ports, scan_type, timeout, options) VALUES (%s, %s, %s, %s, %s, %s)",
+                [
+                    (scan_id, target, json.dumps(ports[i:i + shard_size]), jobs['scan_type'], jobs['timeout'], options)
+                    for i in range(0, len(ports), shard_size)
+                    for scan_id, target in children
+                ]
+            )
+        
+        conn.commit()
+        cur.close()
+        conn.close()
+        
+        return group_id, children
+    
+    def create_scan_coalesced(self, scan_type, target, parameters, freshness, max_running_age=3600):
+        """
+        Create a scan record unless an identical port scan is already running or
+        completed within the freshness window (in seconds).
+        Returns (scan_id, reason) as DatabaseManager.create_scan_coalesced does.
+        """
+        conn = self.get_connection()
+        cur = conn.cursor()
+        
+        # Take the write lock first, so concurrent identical requests cannot both miss and create a scan
+        cur.execute("BEGIN IMMEDIATE")
+        cur.execute(
+            """
+            SELECT scan_id, status, parameters FROM scans
+            WHERE target = %s AND scan_type = %s AND json_extract(parameters, '$.ports') = json(%s)
+              AND ((status = 'running' AND created_at >= datetime('now', %s))
+                   OR (status = 'completed' AND completed_at >= datetime('now', %s)))
+            ORDER BY created_at DESC
+            """,
+            (target, scan_type, json.dumps(parameters.get("ports", [])),
+             f"-{max_running_age} seconds", f"-{freshness} seconds")
+        )
+        row = next((row for row in cur.fetchall() if self._coalesces_with(row[2], parameters)), None)
+        
+        if row:
+            scan_id, reason = row[0], ("in_flight" if row[1] == 'running' else "fresh")
+        else:
+            cur.execute(
+                "INSERT INTO scans (scan_type, target, parameters) VALUES (%s, %s, %s) RETURNING scan_id",
+                (scan_type, target, json.dumps(parameters))
+            )
+            scan_id, reason = cur.fetchone()[0], None
+        
+        conn.commit()
+        cur.close()
+        conn.close()
+        
+        return scan_id, reason
+    
+    @staticmethod
+    def _insert_port_results(cur, scan_id, target_ip, results, scan_type, services=None):
+        """Insert the open ports of a scan using an existing cursor."""
+        protocol = "TCP" if scan_type != 'udp' else "UDP"
+        services = services or {}
+        
+        if isinstance(results, PortStateVector):
+            results = results.open_results()
+        
+        opened = [(port, status) for port, status in results.items() if status == "Open" or status == "Open|Filtered"]
+        if not opened:
+            return
+        
+        cur.executemany(
+            "INSERT INTO scan_results (scan_id, target, port, protocol, status, additional_data) VALUES (%s, %s, %s, %s, %s, %s)",
+            [
+                (scan_id, target_ip, port, protocol, status, json.dumps(services[port]) if port in services else None)
+                for port, status in opened
+            ]
+        )
+        cur.executemany(
+            """
+            INSERT INTO port_exposure (protocol, port, target, last_scan_id) VALUES (%s, %s, %s, %s)
+            ON CONFLICT (protocol, port, target)
+            DO UPDATE SET last_seen = CURRENT_TIMESTAMP, last_scan_id = excluded.last_scan_id
+            """,
+            [(protocol, port, target_ip, scan_id) for port, _ in opened]
+        )
+        cur.executemany(
+            """
+            INSERT INTO port_intervals (target, protocol, port, opened_at, last_seen, last_scan_id)
+            VALUES (%s, %s, %s, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP, %s)
+            ON CONFLICT (target, protocol, port) WHERE closed_at IS NULL
+            DO UPDATE SET last_seen = CURRENT_TIMESTAMP, last_scan_id = excluded.last_scan_id
+            """,
+            [(target_ip, protocol, port, scan_id) for port, _ in opened]
+        )
+    
+    def record_host_liveness(self, entries, source, alive_ttl, dead_ttl):
+        """Upsert (target, alive) observations; entries expire after the TTL for their state."""
+        conn = self.get_connection()
+        cur = conn.cursor()
+        
+        cur.executemany(
+            """
+            INSERT INTO host_liveness (target, alive, source, checked_at, expires_at)
+            VALUES (%s, %s, %s, CURRENT_TIMESTAMP, datetime('now', %s))
+            ON CONFLICT (target) DO UPDATE SET
+                alive = excluded.alive, source = excluded.source,
+                checked_at = excluded.checked_at, expires_at = excluded.expires_at
+            """,
+            [
+                (target, alive, source, f"+{alive_ttl if alive else dead_ttl} seconds")
+                for target, alive in entries
+            ]
+        )
+        
+        conn.commit()
+        cur.close()
+        conn.close()
+    
+    def upsert_host_inventory(self, hosts):
+        """
+        Merge passively seen hosts (dicts with ip, mac, source, first_seen and
+        last_seen) into the inventory. The latest sighting decides the MAC.
+        """
+        conn = self.get_connection()
+        cur = conn.cursor()
+        
+        cur.executemany(
+            """
+            INSERT INTO host_inventory (ip, mac, source, first_seen, last_seen)
+            VALUES (%s, %s, %s, %s, %s)
+            ON CONFLICT (ip) DO UPDATE SET
+                mac = CASE WHEN excluded.last_seen >= host_inventory.last_seen THEN excluded.mac ELSE host_inventory.mac END,
+                source = CASE WHEN excluded.last_seen >= host_inventory.last_seen THEN excluded.source ELSE host_inventory.source END,
+                first_seen = MIN(host_inventory.first_seen, excluded.first_seen),
+                last_seen = MAX(host_inventory.last_seen, excluded.last_seen)
+            """,
+            [(host['ip'], host['mac'], host['source'], host['first_seen'], host['last_seen']) for host in hosts]
+        )
+        
+        conn.commit()
+        cur.close()
+        conn.close()
+    
+    def get_host_inventory(self, network=None, since=None, limit=None):
+        """Get inventory hosts, optionally only those in a CIDR network and/or seen since a time."""
+        conn = self.get_read_connection()
+        cur = conn.cursor()
+        
+        query = "SELECT ip, mac, source, first_seen, last_seen FROM host_inventory"
+        params = []
+        if since:
+            query += " WHERE last_seen >= %s"
+            params.append(since)
+        
+        cur.execute(query, params)
+        columns = [desc[0] for desc in cur.description]
+        hosts = [dict(zip(columns, row)) for row in cur.fetchall()]
+        
+        cur.close()
+        conn.close()
+        
+        # No inet type: filter and order by address here
+        if network:
+            network = ipaddress.ip_network(network, strict=False)
+            hosts = [host for host in hosts if ipaddress.ip_address(host['ip']) in network]
+        hosts.sort(key=lambda host: (ipaddress.ip_address(host['ip']).version, ipaddress.ip_address(host['ip'])))
+        return hosts[:limit] if limit else hosts
+    
+    def get_open_port_frequency(self, protocol, days=90):
+        """Count on how many distinct targets each port was found open recently."""
+        conn = self.get_connection()
+        cur = conn.cursor()
+        
+        cur.execute(
+            """
+            SELECT port, COUNT(DISTINCT target) FROM scan_results
+            WHERE port IS NOT NULL AND protocol = %s AND status = 'Open'
+              AND discovered_at >= datetime('now', %s)
+            GROUP BY port
+            """,
+            (protocol, f"-{days} days")
+        )
+        frequency = dict(cur.fetchall())
+        
+        cur.close()
+        conn.close()
+        
+        return frequency
+    
+    def get_scan_timing_history(self, targets, scan_type, max_scans=5):
+        """
+        Get {target: [(duration_seconds, port_count, timeout, open_count, retries, backend), ...]}
+        for the most recent completed scans of the given type on each target.
+        Queued scans are timed from their first claimed job.
+        """
+        conn = self.get_connection()
+        cur = conn.cursor()
+        
+        cur.execute(
+            """
+            WITH recent AS (
+                SELECT scan_id, target, parameters,
+                       (julianday(completed_at) - julianday(COALESCE(
+                           (SELECT MIN(j.claimed_at) FROM scan_jobs j WHERE j.scan_id = s.scan_id), created_at
+                       ))) * 86400 AS duration,
+                       ROW_NUMBER() OVER (PARTITION BY target ORDER BY created_at DESC) AS n
+                FROM scans s
+                WHERE target = ANY(%s) AND scan_type = %s AND status = 'completed'
+                  AND completed_at IS NOT NULL AND json_type(parameters, '$.ports') = 'array'
+            )
+            SELECT r.target, r.duration, json_array_length(r.parameters, '$.ports'),
+                   COALESCE(json_extract(r.parameters, '$.timeout'), 1), COUNT(sr.result_id),
+                   json_extract(r.parameters, '$.retries'), json_extract(r.parameters, '$.backend')
+            FROM recent r
+            LEFT JOIN scan_results sr ON sr.scan_id = r.scan_id AND sr.status = 'Open'
+            WHERE r.n <= %s
+            GROUP BY r.scan_id
+            """,
+            (list(targets), scan_type, max_scans)
+        )
+        
+        history = {}
+        for target, duration, port_count, timeout, open_count, retries, backend in cur.fetchall():
+            history.setdefault(target, []).append((float(duration), port_count, timeout, open_count, retries, backend))
+        
+        cur.close()
+        conn.close()
+        
+        return history
+    
+    def count_active_workers(self, within=60):
+        """Number of scanner workers that sent a job heartbeat in the last `within` seconds."""
+        conn = self.get_connection()
+        cur = conn.cursor()
+        
+        cur.execute(
+            "SELECT COUNT(DISTINCT worker_id) FROM scan_jobs WHERE heartbeat_at >= datetime('now', %s)",
+            (f"-{within} seconds",)
+        )
+        count = cur.fetchone()[0]
+        
+        cur.close()
+        conn.close()
+        
+        return count
+    
+    def claim_scan_job(self, worker_id):
+        """
+        Claim the oldest pending job for a worker. The single UPDATE runs under
+        SQLite's database write lock, so each job goes to exactly one worker.
+        Returns the job as a dict, or None if the queue is empty.
+        """
+        conn = self.get_connection()
+        cur = conn.cursor()
+        
+        cur.execute(
+            """
+            UPDATE scan_jobs
+            SET status = 'claimed', worker_id = %s, attempts = attempts + 1,
+                claimed_at = CURRENT_TIMESTAMP, heartbeat_at = CURRENT_TIMESTAMP
+            WHERE job_id = (SELECT job_id FROM scan_jobs WHERE status = 'pending' ORDER BY job_id LIMIT 1)
+            RETURNING job_id, scan_id, target, ports, scan_type, timeout, options, attempts
+            """,
+            (worker_id,)
+        )
+        row = cur.fetchone()
+        job = dict(zip([desc[0] for desc in cur.description], row)) if row else None
+        if job and job['attempts'] > 1:
+            self._discard_job_results(cur, job)
+        
+        conn.commit()
+        cur.close()
+        conn.close()
+        
+        return job
+    
+    def store_job_port_results(self, job_id, worker_id, results_by_target, scan_type):
+        """
+        Store port results found so far by a claimed job. Returns False,
+        storing nothing, if the job was reassigned to another worker.
+        """
+        conn = self.get_connection()
+        cur = conn.cursor()
+        
+        # The write lock keeps the job from being requeued while its results are written
+        cur.execute("BEGIN IMMEDIATE")
+        cur.execute(
+            "SELECT scan_id FROM scan_jobs WHERE job_id = %s AND worker_id = %s AND status = 'claimed'",
+            (job_id, worker_id)
+        )
+        row = cur.fetchone()
+        if row:
+            for target_ip, results in results_by_target.items():
+                self._insert_port_results(cur, row[0], target_ip, results, scan_type)
+        
+        conn.commit()
+        cur.close()
+        conn.close()
+        
+        return row is not None
+    
+    def complete_scan_job(self, job_id, worker_id, results=None, status="done", services=None, close_missing=True):
+        """
+        Mark a job finished, closing ports found no longer open and attaching
+        services in the same transaction. Returns (owned, scan_finished) as
+        DatabaseManager.complete_scan_job does.
+        """
+        conn = self.get_connection()
+        cur = conn.cursor()
+        
+        # The write lock is taken up front, so no other worker can finish a shard of the scan meanwhile
+        cur.execute("BEGIN IMMEDIATE")
+        cur.execute(
+            "SELECT scan_id, target, scan_type FROM scan_jobs WHERE job_id = %s AND worker_id = %s AND status = 'claimed'",
+            (job_id, worker_id)
+        )
+        row = cur.fetchone()
+        if not row:
+            conn.rollback()
+            cur.close()
+            conn.close()
+            return False, False
+        
+        scan_id, target_ip, scan_type = row
+        
+        if results and close_missing:
+            self._remove_closed_exposure(cur, target_ip, scan_type, results)
+        if services:
+            self._update_port_services(cur, scan_id, services)
+        
+        cur.execute(
+            "UPDATE scan_jobs SET status = %s, completed_at = CURRENT_TIMESTAMP WHERE job_id = %s",
+            (status, job_id)
+        )
+        
+        cur.execute(
+            """
+            SELECT COUNT(*) FILTER (WHERE status IN ('pending', 'claimed')),
+                   COUNT(*) FILTER (WHERE status = 'failed'),
+                   COUNT(*) FILTER (WHERE status = 'skipped'), COUNT(*)
+            FROM scan_jobs WHERE scan_id = %s
+            """,
+            (scan_id,)
+        )
+        remaining, failed, skipped, total = cur.fetchone()
+        
+        scan_finished = remaining == 0
+        if scan_finished:
+            scan_status = "failed" if failed else "skipped" if skipped == total else "completed"
+            cur.execute(
+                "UPDATE scans SET status = %s, completed_at = CURRENT_TIMESTAMP WHERE scan_id = %s",
+                (scan_status, scan_id)
+            )
+        
+        conn.commit()
+        cur.close()
+        conn.close()
+        
+        return True, scan_finished
+    
+    def requeue_stale_scan_jobs(self, stale_after, max_attempts=3):
+        """
+        Return jobs whose worker stopped sending heartbeats to the queue.
+        Returns a list of (job_id, worker_id) pairs that used up their attempts.
+        """
+        conn = self.get_connection()
+        cur = conn.cursor()
+        
+        cutoff = f"-{stale_after} seconds"
+        cur.execute(
+            """
+            UPDATE scan_jobs SET status = 'pending', worker_id = NULL
+            WHERE status = 'claimed' AND attempts < %s AND heartbeat_at < datetime('now', %s)
+            """,
+            (max_attempts, cutoff)
+        )
+        cur.execute(
+            """
+            SELECT job_id, worker_id FROM scan_jobs
+            WHERE status = 'claimed' AND attempts >= %s AND heartbeat_at < datetime('now', %s)
+            """,
+            (max_attempts, cutoff)
+        )
+        exhausted = cur.fetchall()
+        
+        conn.commit()
+        cur.close()
+        conn.close()
+        
+        return exhausted
+    
+    def sync_upstream(self, upstream, origin, batch_size=100):
+        """
+        Push finished scans that were not pushed yet, with their results, to
+        another DatabaseManager (normally the central PostgreSQL database),
+        `batch_size` scans per upstream transaction. Returns the number of
+        scans pushed.
+        """
+        pushed = 0
+        
+        while True:
+            conn = self.get_connection()
+            cur = conn.cursor()
+            
+            cur.execute(
+                """
+                SELECT s.* FROM scans s
+                LEFT JOIN upstream_sync u ON u.scan_id = s.scan_id
+                WHERE u.scan_id IS NULL AND s.status != 'running'
+                ORDER BY s.scan_id LIMIT %s
+                """,
+                (batch_size,)
+            )
+            columns = [desc[0] for desc in cur.description]
+            scans = [dict(zip(columns, row)) for row in cur.fetchall()]
+            if not scans:
+                cur.close()
+                conn.close()
+                return pushed
+            
+            by_id = {scan['scan_id']: scan for scan in scans}
+            for scan in scans:
+                scan['results'] = []
+            cur.execute("SELECT * FROM scan_results WHERE scan_id = ANY(%s) ORDER BY result_id", (list(by_id),))
+            columns = [desc[0] for desc in cur.description]
+            for row in cur.fetchall():
+                result = dict(zip(columns, row))
+                by_id[result['scan_id']]['results'].append(result)
+            cur.close()
+            conn.close()
+            
+            imported = upstream.import_scans(origin, scans)
+            
+            conn = self.get_connection()
+            cur = conn.cursor()
+            cur.executemany(
+                "INSERT OR REPLACE INTO upstream_sync (scan_id, upstream_scan_id) VALUES (%s, %s)",
+                list(imported.items())
+            )
+            conn.commit()
+            cur.close()
+            conn.close()
+            
+            pushed += len(scans)
@@ -0,0 +1,270 @@
+import bisect
+import collections
+import hashlib
+import ipaddress
+import os
+import random
+import socket
+import struct
+import time
+from modules.packetio import PacketProbeEngine, RxRing, SendPath, tcp_reply_filter
+
+class CyclicPermutation:
+    """
+    Visits every integer in 0..n-1 exactly once, in pseudo-random order,
+    using O(1) memory.
+
+    Walks the multiplicative group of integers modulo a prime p > n: starting
+    from a random element and repeatedly multiplying by a random generator of
+    the group visits every value 1..p-1 once. Values above n are skipped.
+    """
+
+    def __init__(self, n, rng=None):
+        self.n = n
+        rng = rng or random.SystemRandom()
+        self.prime = self.next_prime(n + 1)
+        self.generator = self.find_generator(self.prime, rng)
+        self.start = rng.randint(1, self.prime - 1)
+
+    def __len__(self):
+        return self.n
+
+    def __iter__(self):
+        if self.n == 0:
+            return
+        value = self.start
+        while True:
+            if value <= self.n:
+                yield value - 1
+            value = value * self.generator % self.prime
+            if value == self.start:
+                return
+
+    @staticmethod
+    def is_prime(n):
+        """Deterministic Miller-Rabin for n < 3.3e24."""
+        if n < 2:
+            return False
+        small = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41)
+        for p in small:
+            if n % p == 0:
+                return n == p
+        d, r = n - 1, 0
+        while d % 2 == 0:
+            d, r = d // 2, r + 1
+        for a in small:
+            x = pow(a, d, n)
+            if x in (1, n - 1):
+                continue
+            for _ in range(r - 1):
+                x = x * x % n
+                if x == n - 1:
+                    break
+            else:
+                return False
+        return True
+
+    @classmethod
+    def next_prime(cls, n):
+        """Smallest prime greater than n."""
+        candidate = n + 1
+        while not cls.is_prime(candidate):
+            candidate += 1
+        return candidate
+
+    @staticmethod
+    def prime_factors(n):
+        factors = set()
+        divisor = 2
+        while divisor * divisor <= n:
+            while n % divisor == 0:
+                factors.add(divisor)
+                n //= divisor
+            divisor += 1 if divisor == 2 else 2
+        if n > 1:
+            factors.add(n)
+        return factors
+
+    @classmethod
+    def find_generator(cls, prime, rng):
+        """A random primitive root modulo `prime`."""
+        if prime == 2:
+            return 1
+        order = prime - 1
+        factors = cls.prime_factors(order)
+        while True:
+            candidate = rng.randint(2, prime - 1)
+            if all(pow(candidate, order // q, prime) != 1 for q in factors):
+                return candidate
+
+class TargetSpace:
+    """
+    The target x port space of a sweep, addressed by a single index so a
+    permutation of 0..size-1 covers every (host, port) pair once. Only the
+    network boundaries and the port list are kept in memory.
+    """
+
+    def __init__(self, entries, ports):
+        networks = [ipaddress.ip_network(str(entry).strip(), strict=False) for entry in entries]
+        for network in networks:
+            if network.version != 4:
+                raise ValueError(f"Only IPv4 networks can be swept: {network}")
+
+        self.ports = list(ports)
+        self.ranges = []  # (first index, first address as int, host count)
+        hosts = 0
+        for network in ipaddress.collapse_addresses(networks):
+            first, count = int(network.network_address), network.num_addresses
+            if count > 2:
+                # Skip the network and broadcast addresses, as hosts() does
+                first, count = first + 1, count - 2
+            self.ranges.append((hosts, first, count))
+            hosts += count
+        self.starts = [start for start, _, _ in self.ranges]
+        self.host_count = hosts
+        self.size = hosts * len(self.ports)
+
+    def probe(self, index):
+        """(target address as int, port) for a position in the space."""
+        host, port_index = divmod(index, len(self.ports))
+        start, first, _ = self.ranges[bisect.bisect_right(self.starts, host) - 1]
+        return first + host - start, self.ports[port_index]
+
+class StatelessSweep:
+    """
+    Stateless randomized SYN scan over many hosts and ports.
+
+    Probes are sent in a pseudo-random permutation of the whole target x port
+    space, so load is spread evenly over targets, and nothing is kept per
+    probe: each probe's TCP sequence number is a keyed hash of its target and
+    port, and a reply is accepted if its acknowledgement number matches that
+    hash plus one. Memory stays flat however large the space is.
+
+    With several sources (local addresses and/or interfaces) probes are dealt
+    out to them in turn and each is paced to the send rate on its own.
+    """
+
+    # Recently reported (target, port) pairs, so retransmitted SYN-ACKs are reported once
+    DEDUP_WINDOW = 65536
+
+    def __init__(self, send_rate=None, batch_size=None, ring_frames=None, cooldown=None):
+        """Initialize with explicit settings or use environment variables."""
+        self.send_rate = send_rate or float(os.environ.get('SWEEP_SEND_RATE', os.environ.get('RAW_SEND_RATE', 5000)))
+        self.batch_size = batch_size or int(os.environ.get('RAW_BATCH_SIZE', 64))
+        self.ring_frames = ring_frames or int(os.environ.get('RAW_RX_RING_FRAMES', 2048))
+        self.cooldown = cooldown if cooldown is not None else float(os.environ.get('SWEEP_COOLDOWN', 5))
+        self.key = os.urandom(16)
+
+    @staticmethod
+    def available():
+        """Whether raw packet I/O can be used in this process."""
+        return PacketProbeEngine.available("0.0.0.0")
+
+    def cookie(self, address, port):
+        """Keyed hash of a probe's target and port, sent as its sequence number."""
+        digest = hashlib.blake2b(struct.pack("!IH", address, port), key=self.key, digest_size=4).digest()
+        return int.from_bytes(digest, "big")
+
+    def run(self, space, on_result=None, sources=None):
+        """
+        Probe every (host, port) of `space` once, then listen for `cooldown`
+        seconds. Calls on_result(target_ip, port, status) for each Open or
+        Closed reply and returns {"probes": ..., "open": ..., "closed": ...}.
+        `sources` are resolved (address, interface) pairs; by default probes
+        leave from the address routed to the first target.
+        """
+        if space.size == 0:
+            return {"probes": 0, "open": 0, "closed": 0}
+
+        first_target = str(ipaddress.IPv4Address(space.ranges[0][1]))
+        sources = sources or [(PacketProbeEngine.source_address(first_target), None)]
+        source_port = random.randint(32768, 60999)
+        recent = collections.OrderedDict()
+        counts = {"probes": 0, "open": 0, "closed": 0}
+
+        def build_template(source_ip):
+            """SYN template and checksum base; dst address, dst port, sequence and checksum are patched per probe."""
+            src = socket.inet_aton(source_ip)
+            template = struct.pack("!BBHHHBBH4s4s", 0x45, 0, 0, 0, 0, 64, socket.IPPROTO_TCP, 0, src, b"\0" * 4)
+            template += struct.pack("!HHIIBBHHH", source_port, 0, 0, 0, 5 << 4, 0x02, 64240, 0, 0)
+            pseudo = struct.pack("!4s4sBBH", src, b"\0" * 4, 0, socket.IPPROTO_TCP, 20)
+            return template, PacketProbeEngine.word_sum(pseudo + template[20:])
+
+        def handle(ring, base, snaplen):
+            ihl = (ring[base] & 0x0f) * 4
+            address = struct.unpack_from("!I", ring, base + 12)[0]
+            port, _, _, ack = struct.unpack_from("!HHII", ring, base + ihl)
+            flags = ring[base + ihl + 13]
+            if ack != (self.cookie(address, port) + 1) & 0xffffffff:
+                return
+            if flags & 0x12 == 0x12:
+                status = "Open"
+            elif flags & 0x04:
+                status = "Closed"
+            else:
+                return
+
+            key = (address, port)
+            if key in recent:
+                return
+            recent[key] = None
+            if len(recent) > self.DEDUP_WINDOW:
+                recent.popitem(last=False)
+
+            counts["open" if status == "Open" else "closed"] += 1
+            if on_result:
+                on_result(str(ipaddress.IPv4Address(address)), port, status)
+
+        def drain(wait):
+            rx_ring.drain(handle, wait)
+
+        # Replies to every source are matched by source port and cookie, on any interface
+        rx_ring = RxRing(tcp_reply_filter(source_port), self.ring_frames)
+        paths, templates = [], []
+        try:
+            for source_ip, interface in sources:
+                templates.append(build_template(source_ip))
+                paths.append(SendPath(source_ip, interface, None, len(templates[-1][0]),
+                                      self.batch_size, self.send_rate))
+            turn = 0
+
+            for index in CyclicPermutation(space.size):
+                address, port = space.probe(index)
+                sequence = self.cookie(address, port)
+                packed = struct.pack("!I", address)
+                path = paths[turn]
+                template, base_sum = templates[turn]
+                turn = (turn + 1) % len(paths)
+                checksum = PacketProbeEngine.fold(
+                    base_sum + (address >> 16) + (address & 0xffff) + port + (sequence >> 16) + (sequence & 0xffff)
+                )
+
+                slot = path.slot
+                path.sender.write(slot, template)
+                path.sender.patch(slot, 16, packed)
+                path.sender.patch(slot, 22, struct.pack("!HI", port, sequence))
+                path.sender.patch(slot, 36, struct.pack("!H", checksum))
+                path.sender.address(slot, packed)
+                path.slot += 1
+
+                if path.slot == self.batch_size:
+                    # Each path is paced to the send rate on its own, handling replies while it waits
+                    path.wait_turn(drain)
+                    counts["probes"] += path.slot
+                    path.send(path.slot)
+                    drain(0)
+
+            for path in paths:
+                if path.slot:
+                    counts["probes"] += path.slot
+                    path.send(path.slot)
+
+            deadline = time.monotonic() + self.cooldown
+            while time.monotonic() < deadline:
+                drain(min(0.1, deadline - time.monotonic()))
+        finally:
+            rx_ring.close()
+            for path in paths:
+                path.close()
+
+        return counts
@@ -0,0 +1,159 @@
+import concurrent.futures
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime
+from queue import Queue, Empty
+
+class WebhookDispatcher:
+    """
+    Pushes scan events to registered webhook URLs from a background thread.
+
+    Events are queued without blocking the caller, collected for a short
+    batching window and then POSTed to every subscribed webhook as a single
+    JSON batch. Failed deliveries are retried with exponential backoff.
+    Deliveries run on a pool of `max_concurrency` threads, so many webhooks
+    or batches queue up instead of each starting a thread.
+    """
+
+    EVENT_TYPES = ("scan.completed", "port.opened", "port.closed")
+
+    def __init__(self, db_manager, batch_window=None, max_retries=None, backoff=None, timeout=None,
+                 max_concurrency=None):
+        """Initialize with explicit settings or use environment variables."""
+        self.db_manager = db_manager
+        self.batch_window = batch_window or float(os.environ.get('WEBHOOK_BATCH_WINDOW', 5))
+        self.max_retries = max_retries if max_retries is not None else int(os.environ.get('WEBHOOK_MAX_RETRIES', 5))
+        self.backoff = backoff or float(os.environ.get('WEBHOOK_BACKOFF', 1))
+        self.timeout = timeout or float(os.environ.get('WEBHOOK_TIMEOUT', 5))
+        self.max_concurrency = max_concurrency or int(os.environ.get('WEBHOOK_MAX_CONCURRENCY', 4))
+        self.event_queue = Queue()
+        self._executor = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the background sender thread if it is not already running."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.max_concurrency, thread_name_prefix="webhook"
+                )
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run)
+                self._thread.daemon = True
+                self._thread.start()
+
+    def emit(self, event_type, payload):
+        """
+        Queue an event for delivery. Never blocks on the network.
+        """
+        self.start()
+        self.event_queue.put({
+            "event": event_type,
+            "timestamp": datetime.now().isoformat(),
+            "data": payload
+        })
+
+    def _run(self):
+        """Collect events for one batching window at a time and deliver them."""
+        while True:
+            # Block until the first event of a batch arrives
+            batch = [self.event_queue.get()]
+            deadline = time.monotonic() + self.batch_window
+
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.event_queue.get(timeout=remaining))
+                except Empty:
+                    break
+
+            try:
+                self._flush(batch)
+            except Exception as e:
+                print(f"Error delivering webhook batch: {e}")
+
+    def _flush(self, batch):
+        """Deliver a batch of events to every webhook subscribed to them."""
+        for webhook in self.db_manager.get_webhooks():
+            subscribed = webhook.get('events') or list(self.EVENT_TYPES)
+            events = [event for event in batch if event["event"] in subscribed]
+            if not events:
+                continue
+
+            # Deliver each webhook independently so a slow endpoint does not hold up the others
+            self._executor.submit(self._deliver, webhook, events)
+
+    def _deliver(self, webhook, events):
+        """POST a batch to one webhook, retrying with exponential backoff."""
+        body = json.dumps({"events": events, "count": len(events)}).encode('utf-8')
+        headers = {"Content-Type": "application/json"}
+
+        if webhook.get('secret'):
+            signature = hmac.new(webhook['secret'].encode('utf-8'), body, hashlib.sha256).hexdigest()
+            headers["X-Dalang-Signature"] = f"sha256={signature}"
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                req = urllib.request.Request(webhook['url'], data=body, headers=headers, method='POST')
+                with urllib.request.urlopen(req, timeout=self.timeout) as response:
+                    if response.status < 300:
+                        return True
+            except (urllib.error.URLError, OSError) as e:
+                print(f"Webhook delivery to {webhook['url']} failed (attempt {attempt + 1}): {e}")
+
+            if attempt < self.max_retries:
+                time.sleep(self.backoff * (2 ** attempt))
+
+        print(f"Giving up on webhook delivery to {webhook['url']} after {self.max_retries + 1} attempts")
+        return False
+
+    def notify_port_scan(self, scan_id, target_ip, ports, scan_type, results):
+        """Queue events for a finished port scan (results as a PortStateVector) and any port state changes."""
+        open_ports = results.open_ports()
+        protocol = "TCP" if scan_type != 'udp' else "UDP"
+
+        self.emit("scan.completed", {
+            "scan_id": scan_id,
+            "scan_type": f"port_scan_{scan_type}",
+            "target": target_ip,
+            "port_count": len(ports),
+            "open_ports": sorted(open_ports)
+        })
+
+        previous = self.db_manager.get_previous_port_state(target_ip, f"port_scan_{scan_type}", scan_id)
+        if previous is None:
+            return
+
+        opened, closed = self.port_changes(
+            previous["open_ports"], previous["ports"], open_ports, ports
+        )
+        for port in opened:
+            self.emit("port.opened", {
+                "scan_id": scan_id, "previous_scan_id": previous["scan_id"],
+                "target": target_ip, "port": port, "protocol": protocol
+            })
+        for port in closed:
+            self.emit("port.closed", {
+                "scan_id": scan_id, "previous_scan_id": previous["scan_id"],
+                "target": target_ip, "port": port, "protocol": protocol
+            })
+
+    @staticmethod
+    def port_changes(previous_open, previous_ports, current_open, current_ports):
+        """
+        Compare two sets of open ports, limited to the ports both scans covered.
+        Returns (opened, closed) as sorted lists.
+        """
+        scanned = set(previous_ports) & set(current_ports)
+        previous = set(previous_open) & scanned
+        current = set(current_open) & scanned
+        return sorted(current - previous), sorted(previous - current)
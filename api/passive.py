@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Dalang Watcher Passive Discovery
+
+Keeps the host inventory up to date from ARP and DHCP traffic seen on the
+local segments, without sending anything:
+
+    python passive.py --interface eth0     # listen (needs CAP_NET_RAW)
+    python passive.py --replay capture.pcap
+
+Hosts are readable from GET /api/hosts, and host discovery with fill_gaps
+only ARPs the addresses not seen recently.
+"""
+
+import argparse
+import signal
+import sys
+from modules.db import create_database_manager
+from modules.liveness import HostLiveness
+from modules.passive import PassiveDiscovery
+
+def main():
+    parser = argparse.ArgumentParser(description="Dalang Watcher Passive Discovery")
+    parser.add_argument("--interface", help="Interface to listen on (default: PASSIVE_INTERFACE or all interfaces)")
+    parser.add_argument("--replay", metavar="PCAP", help="Read a pcap file instead of listening, then exit")
+    args = parser.parse_args()
+
+    db_manager = create_database_manager()
+    db_manager.init_db()
+    discovery = PassiveDiscovery(db_manager, HostLiveness(db_manager), interface=args.interface)
+
+    if args.replay:
+        written = discovery.replay(args.replay)
+        for host in discovery.inventory():
+            print(f"{host['ip']:<15} {host['mac']}  {host['source']:<4}  {host['first_seen']} - {host['last_seen']}")
+        print(f"Wrote {written} hosts to the inventory")
+        return
+
+    if not PassiveDiscovery.available():
+        sys.exit("Passive discovery needs packet sockets (Linux, CAP_NET_RAW)")
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: discovery.stop())
+    try:
+        discovery.run()
+    except KeyboardInterrupt:
+        discovery.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Dalang Watcher Upstream Sync
+
+Pushes finished scans and their results from an edge node's local SQLite
+database (DB_BACKEND=sqlite) to the central PostgreSQL/TimescaleDB database,
+in batches, whenever the central database can be reached:
+
+    DB_BACKEND=sqlite python app.py          # edge API and scanner
+    UPSTREAM_DB_HOST=central.example.internal python sync.py
+"""
+
+import argparse
+import os
+import socket
+import threading
+from modules.db import DatabaseManager
+from modules.sqlite_db import SQLiteDatabaseManager
+
+class UpstreamSync:
+    """
+    Long-running loop that copies finished local scans to the upstream database
+    """
+
+    def __init__(self, local, upstream, origin=None, interval=None, batch_size=None):
+        """Initialize with explicit settings or use environment variables."""
+        self.local = local
+        self.upstream = upstream
+        self.origin = origin or os.environ.get('EDGE_NODE_ID', socket.gethostname())
+        self.interval = interval or float(os.environ.get('SYNC_INTERVAL', 300))
+        self.batch_size = batch_size or int(os.environ.get('SYNC_BATCH_SIZE', 100))
+        self._stop = threading.Event()
+
+    def sync_once(self):
+        """Push every finished scan not pushed yet. Returns the number of scans pushed."""
+        pushed = self.local.sync_upstream(self.upstream, self.origin, self.batch_size)
+        if pushed:
+            print(f"Pushed {pushed} scans upstream as {self.origin}")
+        return pushed
+
+    def run(self):
+        """Sync every `interval` seconds until stopped. Upstream outages are retried on the next round."""
+        print(f"Upstream sync for {self.origin} started")
+        self.local.init_db()
+        schema_ready = False
+
+        while not self._stop.is_set():
+            try:
+                if not schema_ready:
+                    self.upstream.init_db()
+                    schema_ready = True
+                self.sync_once()
+            except Exception as e:
+                print(f"Error syncing upstream: {e}")
+            self._stop.wait(self.interval)
+
+    def stop(self):
+        self._stop.set()
+
+def main():
+    parser = argparse.ArgumentParser(description="Dalang Watcher Upstream Sync")
+    parser.add_argument("--once", action="store_true", help="Push pending scans once and exit")
+    parser.add_argument("--origin", help="Name of this node upstream (default: EDGE_NODE_ID or the hostname)")
+    args = parser.parse_args()
+
+    upstream = DatabaseManager(
+        host=os.environ.get('UPSTREAM_DB_HOST'),
+        port=os.environ.get('UPSTREAM_DB_PORT'),
+        dbname=os.environ.get('UPSTREAM_DB_NAME'),
+        user=os.environ.get('UPSTREAM_DB_USER'),
+        password=os.environ.get('UPSTREAM_DB_PASSWORD'),
+        read_dsns=[]
+    )
+    sync = UpstreamSync(SQLiteDatabaseManager(), upstream, origin=args.origin)
+
+    if args.once:
+        sync.local.init_db()
+        sync.upstream.init_db()
+        sync.sync_once()
+    else:
+        sync.run()
+
+if __name__ == "__main__":
+    main()
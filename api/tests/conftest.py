@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The API is run from its own directory (python app.py), so modules are imported as "modules.*"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,57 @@
+import pytest
+from modules.sqlite_db import SQLiteDatabaseManager
+
+TARGET = "10.0.0.1"
+SCAN_TYPE = "port_scan_connect"
+
+@pytest.fixture
+def db(tmp_path):
+    manager = SQLiteDatabaseManager(str(tmp_path / "coalesce.db"))
+    manager.init_db()
+    return manager
+
+def parameters(**overrides):
+    base = {"ports": [22, 80, 443], "timeout": 1, "retries": 1, "backend": "connect", "liveness": "skip"}
+    base.update(overrides)
+    return base
+
+def test_identical_request_reuses_the_running_scan(db):
+    scan_id, reason = db.create_scan_coalesced(SCAN_TYPE, TARGET, parameters(), 300)
+    assert reason is None
+    assert db.create_scan_coalesced(SCAN_TYPE, TARGET, parameters(), 300) == (scan_id, "in_flight")
+
+@pytest.mark.parametrize("change", [
+    {"ports": [22, 80]},
+    {"timeout": 3},
+    {"retries": 0},
+    {"sources": ["192.0.2.10"]},
+    {"liveness": "off"},
+])
+def test_requests_with_different_results_are_not_coalesced(db, change):
+    scan_id, _ = db.create_scan_coalesced(SCAN_TYPE, TARGET, parameters(), 300)
+    other_id, reason = db.create_scan_coalesced(SCAN_TYPE, TARGET, parameters(**change), 300)
+    assert reason is None
+    assert other_id != scan_id
+
+def test_fingerprinted_scan_answers_a_plain_request(db):
+    scan_id, _ = db.create_scan_coalesced(SCAN_TYPE, TARGET, parameters(fingerprint=True), 300)
+    assert db.create_scan_coalesced(SCAN_TYPE, TARGET, parameters(), 300) == (scan_id, "in_flight")
+
+def test_plain_scan_does_not_answer_a_fingerprint_request(db):
+    scan_id, _ = db.create_scan_coalesced(SCAN_TYPE, TARGET, parameters(), 300)
+    other_id, reason = db.create_scan_coalesced(SCAN_TYPE, TARGET, parameters(fingerprint=True), 300)
+    assert reason is None
+    assert other_id != scan_id
+
+def test_schedule_and_recheck_bookkeeping_do_not_block_coalescing(db):
+    scan_id, _ = db.create_scan_coalesced(SCAN_TYPE, TARGET, parameters(schedule_id=4), 300)
+    assert db.create_scan_coalesced(SCAN_TYPE, TARGET, parameters(), 300) == (scan_id, "in_flight")
+
+def test_completed_scan_is_reused_but_failed_scan_is_not(db):
+    scan_id, _ = db.create_scan_coalesced(SCAN_TYPE, TARGET, parameters(), 300)
+    db.complete_scan(scan_id)
+    assert db.create_scan_coalesced(SCAN_TYPE, TARGET, parameters(), 300) == (scan_id, "fresh")
+
+    failed_id, _ = db.create_scan_coalesced(SCAN_TYPE, TARGET, parameters(timeout=2), 300)
+    db.complete_scan(failed_id, "failed")
+    assert db.create_scan_coalesced(SCAN_TYPE, TARGET, parameters(timeout=2), 300)[1] is None
@@ -0,0 +1,121 @@
+import socket
+import struct
+from datetime import datetime
+import pytest
+from modules.passive import LINKTYPE_ETHERNET, LINKTYPE_LINUX_SLL, PassiveDiscovery, read_pcap
+
+BROADCAST = b"\xff" * 6
+
+def mac(last):
+    return bytes((0xaa, 0xbb, 0xcc, 0x00, 0x00, last))
+
+def ethernet(payload, ethertype, vlan=None):
+    header = BROADCAST + mac(0xfe)
+    if vlan is not None:
+        header += struct.pack("!HH", 0x8100, vlan)
+    return header + struct.pack("!H", ethertype) + payload
+
+def arp(sender_mac, sender_ip, target_ip="192.168.1.1", op=2):
+    return struct.pack(
+        "!HHBBH6s4s6s4s", 1, 0x0800, 6, 4, op,
+        sender_mac, socket.inet_aton(sender_ip), b"\0" * 6, socket.inet_aton(target_ip)
+    )
+
+def dhcp(message_type, client_mac, ciaddr="0.0.0.0", yiaddr="0.0.0.0", protocol=socket.IPPROTO_UDP):
+    bootp = struct.pack(
+        "!BBBBIHH4s4s4s4s16s64s128sI", 2, 1, 6, 0, 0x1234, 0, 0,
+        socket.inet_aton(ciaddr), socket.inet_aton(yiaddr), b"\0" * 4, b"\0" * 4,
+        client_mac, b"", b"", 0x63825363
+    )
+    options = bytes((53, 1, message_type, 0, 255))
+    udp = struct.pack("!HHHH", 67, 68, 8 + len(bootp) + len(options), 0) + bootp + options
+    ip = struct.pack(
+        "!BBHHHBBH4s4s", 0x45, 0, 20 + len(udp), 0, 0, 64, protocol, 0,
+        socket.inet_aton("192.168.1.1"), socket.inet_aton("255.255.255.255")
+    )
+    return ip + udp
+
+def write_pcap(path, frames, linktype=LINKTYPE_ETHERNET):
+    with open(path, "wb") as f:
+        f.write(struct.pack("<IHHiIII", 0xa1b2c3d4, 2, 4, 0, 0, 65535, linktype))
+        for seconds, frame in frames:
+            f.write(struct.pack("<IIII", seconds, 0, len(frame), len(frame)))
+            f.write(frame)
+    return path
+
+class FakeDatabase:
+    def __init__(self):
+        self.batches = []
+
+    def upsert_host_inventory(self, hosts):
+        self.batches.append(hosts)
+
+T0 = 1740000000
+
+@pytest.fixture
+def capture(tmp_path):
+    """A small capture with ARP, DHCP and packets the parser must ignore."""
+    return write_pcap(tmp_path / "lan.pcap", [
+        (T0, ethernet(arp(mac(0x10), "192.168.1.10"), 0x0806)),
+        (T0 + 1, ethernet(arp(mac(0x99), "0.0.0.0", op=1), 0x0806)),  # ARP probe
+        (T0 + 2, ethernet(arp(mac(0x11), "192.168.1.11"), 0x0806, vlan=20)),
+        (T0 + 3, ethernet(dhcp(5, mac(0x20), yiaddr="192.168.1.20"), 0x0800)),  # ACK
+        (T0 + 4, ethernet(dhcp(3, mac(0x21), ciaddr="192.168.1.21"), 0x0800)),  # Renewal REQUEST
+        (T0 + 5, ethernet(dhcp(1, mac(0x22)), 0x0800)),  # DISCOVER
+        (T0 + 6, ethernet(dhcp(5, mac(0x23), yiaddr="192.168.1.23", protocol=socket.IPPROTO_TCP), 0x0800)),
+        (T0 + 7, ethernet(arp(mac(0x12), "192.168.1.12")[:20], 0x0806)),  # Truncated
+        (T0 + 8, ethernet(b"\0" * 40, 0x86dd)),  # IPv6
+        (T0 + 9, ethernet(arp(mac(0x30), "192.168.1.10"), 0x0806)),  # New MAC for .10
+    ])
+
+def test_read_pcap_yields_arp_and_ipv4_only(capture):
+    packets = list(read_pcap(capture))
+    assert len(packets) == 9
+    assert packets[0][:2] == (datetime.fromtimestamp(T0), 0x0806)
+    assert packets[0][3] == 14
+    # The 802.1Q tag moves the network header
+    assert packets[2][3] == 18
+
+def test_read_pcap_linux_sll(tmp_path):
+    header = struct.pack("!HHH8sH", 0, 1, 6, mac(0x40) + b"\0\0", 0x0806)
+    path = write_pcap(tmp_path / "any.pcap", [(T0, header + arp(mac(0x40), "10.0.0.40"))], LINKTYPE_LINUX_SLL)
+    discovery = PassiveDiscovery(FakeDatabase(), flush_interval=1)
+    assert discovery.replay(path) == 1
+    assert discovery.hosts["10.0.0.40"]["mac"] == "aa:bb:cc:00:00:40"
+
+def test_read_pcap_rejects_other_files(tmp_path):
+    path = tmp_path / "capture.pcapng"
+    path.write_bytes(b"\x0a\x0d\x0d\x0a" + b"\0" * 28)
+    with pytest.raises(ValueError):
+        list(read_pcap(path))
+
+def test_replay_builds_inventory(capture):
+    db = FakeDatabase()
+    discovery = PassiveDiscovery(db, flush_interval=1)
+
+    assert discovery.replay(capture) == 4
+    assert len(db.batches) == 1
+    hosts = {host["ip"]: host for host in discovery.inventory()}
+    assert sorted(hosts) == ["192.168.1.10", "192.168.1.11", "192.168.1.20", "192.168.1.21"]
+
+    assert hosts["192.168.1.10"]["mac"] == "aa:bb:cc:00:00:30"
+    assert hosts["192.168.1.10"]["first_seen"] == datetime.fromtimestamp(T0)
+    assert hosts["192.168.1.10"]["last_seen"] == datetime.fromtimestamp(T0 + 9)
+    assert hosts["192.168.1.11"]["source"] == "arp"
+    assert hosts["192.168.1.20"] == {
+        "ip": "192.168.1.20", "mac": "aa:bb:cc:00:00:20", "source": "dhcp",
+        "first_seen": datetime.fromtimestamp(T0 + 3), "last_seen": datetime.fromtimestamp(T0 + 3)
+    }
+    assert hosts["192.168.1.21"]["source"] == "dhcp"
+
+    # Nothing new since the flush
+    assert discovery.flush() == 0
+    assert [host["ip"] for host in discovery.inventory("192.168.1.16/28")] == ["192.168.1.20", "192.168.1.21"]
+
+def test_older_sighting_only_moves_first_seen():
+    discovery = PassiveDiscovery(FakeDatabase(), flush_interval=1)
+    discovery.observe("10.0.0.1", "aa:bb:cc:00:00:01", "arp", datetime(2025, 3, 2))
+    discovery.observe("10.0.0.1", "aa:bb:cc:00:00:02", "dhcp", datetime(2025, 3, 1))
+    host = discovery.hosts["10.0.0.1"]
+    assert host["mac"] == "aa:bb:cc:00:00:01"
+    assert (host["first_seen"], host["last_seen"]) == (datetime(2025, 3, 1), datetime(2025, 3, 2))
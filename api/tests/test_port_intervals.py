@@ -0,0 +1,103 @@
+import json
+from datetime import datetime
+import pytest
+from modules.sqlite_db import SQLiteDatabaseManager
+
+def at(day, hour=0):
+    return datetime(2025, 3, day, hour)
+
+@pytest.fixture
+def db(tmp_path):
+    manager = SQLiteDatabaseManager(str(tmp_path / "intervals.db"))
+    manager.init_db()
+    return manager
+
+def add_scan(db, scan_type, ports, completed_at, open_ports=(), status="completed", target="10.0.0.1"):
+    """
+    Insert a finished scan and its open results as an older version would
+    have. With status None, the scan predates the status and completed_at columns.
+    """
+    conn = db.get_connection()
+    cur = conn.cursor()
+    cur.execute(
+        "INSERT INTO scans (scan_type, target, parameters, status, completed_at, created_at) VALUES (%s, %s, %s, %s, %s, %s)",
+        (scan_type, target, json.dumps({"ports": ports, "timeout": 1}), status,
+         completed_at if status else None, completed_at)
+    )
+    scan_id = cur.lastrowid
+    protocol = "UDP" if scan_type == "port_scan_udp" else "TCP"
+    for port in open_ports:
+        cur.execute(
+            "INSERT INTO scan_results (scan_id, target, port, protocol, status, discovered_at) VALUES (%s, %s, %s, %s, %s, %s)",
+            (scan_id, target, port, protocol, "Open", completed_at)
+        )
+    conn.commit()
+    cur.close()
+    return scan_id
+
+def backfill(db):
+    """Drop the interval table and rebuild it from the history, as on upgrade."""
+    conn = db.get_connection()
+    conn.cursor().execute("DROP TABLE port_intervals")
+    conn.commit()
+    db.init_db()
+
+def intervals(db, protocol="TCP", target="10.0.0.1"):
+    return [
+        (row["port"], row["opened_at"], row["last_seen"], row["closed_at"], row["last_scan_id"])
+        for row in db.get_port_intervals(target, protocol=protocol)
+    ]
+
+def test_backfill_opens_and_closes_intervals(db):
+    first = add_scan(db, "port_scan_connect", [22, 80], at(1), open_ports=[22, 80])
+    second = add_scan(db, "port_scan_connect", [22, 80], at(2), open_ports=[22])
+    add_scan(db, "port_scan_connect", [22], at(3))
+    fourth = add_scan(db, "port_scan_connect", [22, 80], at(4), open_ports=[80])
+    backfill(db)
+
+    assert sorted(intervals(db)) == [
+        (22, at(1), at(2), at(3), second),
+        (80, at(1), at(1), at(2), first),
+        (80, at(4), at(4), None, fourth)
+    ]
+
+def test_backfill_closes_only_on_completed_scans_that_probed_the_port(db):
+    add_scan(db, "port_scan_stealth", [443], at(1), open_ports=[443])
+    add_scan(db, "port_scan_stealth", [22], at(2))  # Did not probe 443
+    add_scan(db, "port_scan_stealth", [443], at(3), status="failed")
+    add_scan(db, "port_scan_udp", [443], at(4))  # Other protocol
+    add_scan(db, "port_scan_stealth", [443], at(5, 12))
+    backfill(db)
+
+    assert [(port, closed_at) for port, _, _, closed_at, _ in intervals(db)] == [(443, at(5, 12))]
+
+def test_backfill_keeps_targets_and_protocols_apart(db):
+    add_scan(db, "port_scan_udp", [53], at(1), open_ports=[53])
+    add_scan(db, "port_scan_connect", [53], at(2))
+    add_scan(db, "port_scan_connect", [53], at(2), open_ports=[53], target="10.0.0.2")
+    add_scan(db, "port_scan_udp", [53], at(3), target="10.0.0.2")
+    backfill(db)
+
+    assert [(port, closed_at) for port, _, _, closed_at, _ in intervals(db, "UDP")] == [(53, None)]
+    assert intervals(db, "TCP") == []
+    assert [(port, closed_at) for port, _, _, closed_at, _ in intervals(db, "TCP", "10.0.0.2")] == [(53, None)]
+
+def test_point_in_time_lookup(db):
+    add_scan(db, "port_scan_connect", [22], at(1), open_ports=[22])
+    add_scan(db, "port_scan_connect", [22], at(3))
+    backfill(db)
+
+    assert [row["port"] for row in db.get_port_intervals("10.0.0.1", since=at(2), until=at(2))] == [22]
+    assert db.get_port_intervals("10.0.0.1", since=at(4), until=at(4)) == []
+
+def test_backfill_closes_intervals_on_scans_from_before_the_status_column(db):
+    legacy = add_scan(db, "port_scan_connect", [22, 80], at(1), open_ports=[22, 80], status=None)
+    add_scan(db, "port_scan_connect", [22, 80], at(2), open_ports=[22], status=None)
+    backfill(db)
+
+    assert sorted(intervals(db)) == [
+        (22, at(1), at(2), None, legacy + 1),
+        (80, at(1), at(1), at(2), legacy)
+    ]
+    scan = db.get_scan(legacy)
+    assert (scan["status"], scan["completed_at"]) == ("completed", at(1))
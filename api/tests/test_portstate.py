@@ -0,0 +1,51 @@
+import pytest
+from modules.portstate import PortStateVector
+
+def test_unscanned_ports_are_missing():
+    vector = PortStateVector(1024)
+    assert len(vector) == 0
+    assert 22 not in vector
+    assert vector.get(22) is None
+    with pytest.raises(KeyError):
+        vector[22]
+    # Ports beyond the preallocated range read as unscanned too
+    assert 70000 not in vector
+    assert vector.get(70000, "Unknown") == "Unknown"
+
+def test_set_and_get_statuses():
+    vector = PortStateVector.for_ports([22, 53, 80, 443])
+    vector[22] = "Open"
+    vector[53] = "Open|Filtered"
+    vector[80] = "Closed"
+    vector[443] = "Filtered"
+
+    assert len(vector) == 4
+    assert vector[22] == "Open"
+    assert vector[53] == "Open|Filtered"
+    assert list(vector) == [22, 53, 80, 443]
+    assert vector.items() == [(22, "Open"), (53, "Open|Filtered"), (80, "Closed"), (443, "Filtered")]
+
+    vector[80] = "Open"
+    assert vector[80] == "Open"
+    assert len(vector) == 4
+
+def test_unknown_status_is_rejected():
+    vector = PortStateVector(10)
+    with pytest.raises(KeyError):
+        vector[1] = "Maybe"
+
+def test_open_ports_and_results():
+    vector = PortStateVector.from_dict({443: "Open", 22: "Open|Filtered", 80: "Closed", 8080: "Open"})
+    assert vector.open_ports() == [22, 443, 8080]
+    assert vector.open_results() == {22: "Open|Filtered", 443: "Open", 8080: "Open"}
+    assert vector.ports_with(PortStateVector.CLOSED) == [80]
+
+def test_counts():
+    vector = PortStateVector.from_dict({1: "Open", 2: "Closed", 3: "Closed", 4: "Filtered"})
+    assert vector.counts() == {"Open": 1, "Closed": 2, "Filtered": 1, "Open|Filtered": 0}
+
+def test_bytes_round_trip():
+    vector = PortStateVector.from_dict({22: "Open", 65535: "Filtered"})
+    data = vector.to_bytes()
+    assert len(data) == 65536
+    assert PortStateVector.from_bytes(data).items() == vector.items()
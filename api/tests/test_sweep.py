@@ -0,0 +1,35 @@
+import random
+import pytest
+from modules.sweep import CyclicPermutation, TargetSpace
+
+@pytest.mark.parametrize("n", [0, 1, 2, 3, 10, 255, 1000, 65536])
+def test_permutation_visits_every_value_once(n):
+    values = list(CyclicPermutation(n, random.Random(n)))
+    assert len(values) == n
+    assert sorted(values) == list(range(n))
+
+def test_permutation_order_depends_on_seed():
+    first = list(CyclicPermutation(1000, random.Random(1)))
+    second = list(CyclicPermutation(1000, random.Random(2)))
+    assert first != second
+    assert first != sorted(first)
+
+def test_generator_is_primitive_root():
+    rng = random.Random(7)
+    for prime in (3, 5, 257, 65537):
+        generator = CyclicPermutation.find_generator(prime, rng)
+        assert len({pow(generator, k, prime) for k in range(1, prime)}) == prime - 1
+
+def test_primes():
+    assert [n for n in range(30) if CyclicPermutation.is_prime(n)] == [2, 3, 5, 7, 11, 13, 17, 19, 23, 29]
+    assert CyclicPermutation.next_prime(65536) == 65537
+    assert CyclicPermutation.is_prime(2 ** 61 - 1)
+    assert not CyclicPermutation.is_prime(3215031751)  # Strong pseudoprime to bases 2, 3, 5 and 7
+
+def test_permutation_covers_target_space():
+    space = TargetSpace(["10.0.0.0/30", "10.0.1.5"], [22, 80, 443])
+    assert space.host_count == 3
+    probes = [space.probe(index) for index in CyclicPermutation(space.size, random.Random(3))]
+    assert len(probes) == len(set(probes)) == 9
+    hosts = {address for address, _ in probes}
+    assert hosts == {0x0a000001, 0x0a000002, 0x0a000105}
@@ -0,0 +1,87 @@
+import hashlib
+import hmac
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+from modules.webhooks import WebhookDispatcher
+
+class FakeDatabase:
+    def __init__(self, webhooks):
+        self.webhooks = webhooks
+
+    def get_webhooks(self):
+        return self.webhooks
+
+@pytest.fixture
+def stub():
+    """Local HTTP endpoint answering with the queued status codes, then 200."""
+    received = []
+    statuses = []
+    delivered = threading.Event()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            received.append((dict(self.headers), body))
+            status = statuses.pop(0) if statuses else 200
+            self.send_response(status)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            if status < 300:
+                delivered.set()
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = f"http://127.0.0.1:{server.server_port}/hook"
+    server.received, server.statuses, server.delivered = received, statuses, delivered
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def dispatcher_for(webhooks):
+    return WebhookDispatcher(FakeDatabase(webhooks), batch_window=0.05, max_retries=2, backoff=0.01, timeout=2)
+
+def test_batch_is_posted_with_payload_and_signature(stub):
+    dispatcher = dispatcher_for([{"url": stub.url, "events": ["port.opened"], "secret": "s3cret"}])
+    dispatcher.emit("port.opened", {"scan_id": 1, "port": 22})
+    dispatcher.emit("scan.completed", {"scan_id": 1})
+    dispatcher.emit("port.opened", {"scan_id": 1, "port": 80})
+
+    assert stub.delivered.wait(5)
+    assert len(stub.received) == 1
+    headers, body = stub.received[0]
+    payload = json.loads(body)
+    assert payload["count"] == 2
+    assert [event["event"] for event in payload["events"]] == ["port.opened", "port.opened"]
+    assert [event["data"]["port"] for event in payload["events"]] == [22, 80]
+    expected = hmac.new(b"s3cret", body, hashlib.sha256).hexdigest()
+    assert headers["X-Dalang-Signature"] == f"sha256={expected}"
+
+def test_failed_delivery_is_retried(stub):
+    stub.statuses.extend([500, 503])
+    dispatcher = dispatcher_for([{"url": stub.url}])
+
+    assert dispatcher._deliver({"url": stub.url}, [{"event": "scan.completed", "data": {}}])
+    assert len(stub.received) == 3
+    assert len({body for _, body in stub.received}) == 1
+
+def test_delivery_gives_up_after_max_retries(stub):
+    stub.statuses.extend([500] * 5)
+    dispatcher = dispatcher_for([{"url": stub.url}])
+
+    assert not dispatcher._deliver({"url": stub.url}, [{"event": "scan.completed", "data": {}}])
+    assert len(stub.received) == 3
+
+def test_port_changes_only_compare_ports_both_scans_covered():
+    opened, closed = WebhookDispatcher.port_changes(
+        previous_open=[22, 80, 8080], previous_ports=[22, 80, 443, 8080],
+        current_open=[22, 443, 3389], current_ports=[22, 80, 443, 3389]
+    )
+    assert opened == [443]
+    assert closed == [80]
@@ -0,0 +1,74 @@
+import pytest
+from modules.portstate import PortStateVector
+from modules.scanner import NetworkScanner
+from modules.sqlite_db import SQLiteDatabaseManager
+from worker import ScanWorker
+
+TARGET = "10.0.0.1"
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setenv("RESULT_FLUSH_BATCH", "1")
+    manager = SQLiteDatabaseManager(str(tmp_path / "worker.db"))
+    manager.init_db()
+    return manager
+
+def queue_scan(db, ports):
+    scan_id = db.create_scan("port_scan_connect", TARGET, {"ports": ports, "timeout": 1})
+    db.enqueue_scan_jobs(scan_id, TARGET, ports, "connect", 1, 1000, {"liveness": "off"})
+    return scan_id
+
+def stored_ports(db, scan_id):
+    return sorted(result["port"] for result in db.get_results(scan_id))
+
+def fake_scan(statuses, during=None):
+    """scan_ports_async stand-in reporting `statuses` in order, calling during(port) after each."""
+    def scan_ports_async(scan_type, target_ip, ports, timeout=1, on_result=None, **kwargs):
+        results = PortStateVector.for_ports(ports)
+        for port, status in statuses.items():
+            results[port] = status
+            on_result(port, status)
+            if during:
+                during(port)
+        return results
+    return scan_ports_async
+
+def test_open_ports_are_stored_while_the_job_runs(db, monkeypatch):
+    scan_id = queue_scan(db, [22, 80, 443])
+    seen = {}
+    monkeypatch.setattr(NetworkScanner, "scan_ports_async", staticmethod(fake_scan(
+        {22: "Open", 80: "Closed", 443: "Open"}, during=lambda port: seen.setdefault(port, stored_ports(db, scan_id))
+    )))
+
+    worker = ScanWorker(db, worker_id="w1")
+    worker.process_job(db.claim_scan_job("w1"))
+
+    assert seen[22] == [22]
+    assert seen[80] == [22]
+    assert stored_ports(db, scan_id) == [22, 443]
+    assert db.get_scan(scan_id)["status"] == "completed"
+
+def test_reassigned_job_stops_writing_and_retry_stores_once(db, monkeypatch):
+    scan_id = queue_scan(db, [22, 80, 443])
+
+    def requeue(port):
+        if port == 22:
+            conn = db.get_connection()
+            conn.cursor().execute("UPDATE scan_jobs SET status = 'pending', worker_id = NULL")
+            conn.commit()
+
+    monkeypatch.setattr(NetworkScanner, "scan_ports_async", staticmethod(fake_scan(
+        {22: "Open", 80: "Open", 443: "Open"}, during=requeue
+    )))
+    ScanWorker(db, worker_id="w1").process_job(db.claim_scan_job("w1"))
+    # Written before the job was taken away; later results were dropped
+    assert stored_ports(db, scan_id) == [22]
+    assert db.get_scan(scan_id)["status"] == "running"
+
+    monkeypatch.setattr(NetworkScanner, "scan_ports_async", staticmethod(fake_scan({22: "Open", 443: "Open"})))
+    job = db.claim_scan_job("w2")
+    assert job["attempts"] == 2
+    ScanWorker(db, worker_id="w2").process_job(job)
+
+    assert stored_ports(db, scan_id) == [22, 443]
+    assert db.get_scan(scan_id)["status"] == "completed"
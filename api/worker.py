@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Dalang Watcher Scanner Worker
+
+Claims port scan shards from the scan_jobs queue in the database, scans them
+and stores the results. Run any number of workers, on this host or others,
+against the same database to scale out scanning:
+
+    SCAN_EXECUTION=queue python app.py      # API only queues scans
+    python worker.py                        # one or more scanner workers
+"""
+
+import argparse
+import os
+import socket
+import threading
+import uuid
+from modules.scanner import NetworkScanner
+from modules.db import PortResultBuffer, create_database_manager
+from modules.webhooks import WebhookDispatcher
+from modules.fingerprint import ServiceFingerprinter
+from modules.portstate import PortStateVector
+from modules.liveness import HostLiveness
+
+class ScanWorker:
+    """
+    Long-running loop that claims, scans and completes queued scan jobs
+    """
+    
+    def __init__(self, db_manager, worker_id=None, poll_interval=None, heartbeat_interval=None,
+                 stale_after=None, max_attempts=None):
+        """Initialize with explicit settings or use environment variables."""
+        self.db_manager = db_manager
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.poll_interval = poll_interval or float(os.environ.get('WORKER_POLL_INTERVAL', 2))
+        self.heartbeat_interval = heartbeat_interval or float(os.environ.get('WORKER_HEARTBEAT_INTERVAL', 10))
+        self.stale_after = stale_after or float(os.environ.get('WORKER_STALE_AFTER', 60))
+        self.max_attempts = max_attempts or int(os.environ.get('WORKER_MAX_ATTEMPTS', 3))
+        self.webhook_dispatcher = WebhookDispatcher(db_manager)
+        self.host_liveness = HostLiveness(db_manager)
+        self._stop = threading.Event()
+    
+    def run(self):
+        """Process jobs until stopped."""
+        print(f"Scanner worker {self.worker_id} started")
+        
+        while not self._stop.is_set():
+            try:
+                self.reap_stale_jobs()
+                job = self.db_manager.claim_scan_job(self.worker_id)
+            except Exception as e:
+                print(f"Error polling scan queue: {e}")
+                job = None
+            
+            if job is None:
+                self._stop.wait(self.poll_interval)
+                continue
+            
+            self.process_job(job)
+    
+    def stop(self):
+        """Stop after the current job."""
+        self._stop.set()
+    
+    def reap_stale_jobs(self):
+        """Requeue jobs of workers that stopped heartbeating and fail exhausted ones."""
+        exhausted = self.db_manager.requeue_stale_scan_jobs(self.stale_after, self.max_attempts)
+        for job_id, stale_worker_id in exhausted:
+            print(f"Scan job {job_id} failed after {self.max_attempts} attempts")
+            self.db_manager.complete_scan_job(job_id, stale_worker_id, status="failed")
+    
+    def process_job(self, job):
+        """
+        Scan one shard while sending heartbeats. Open ports are stored in
+        batches as they are found; the job is marked done at the end.
+        """
+        job_done = threading.Event()
+        lost = threading.Event()
+        
+        def heartbeat():
+            while not job_done.wait(self.heartbeat_interval):
+                try:
+                    if not self.db_manager.heartbeat_scan_job(job['job_id'], self.worker_id):
+                        lost.set()
+                        return
+                except Exception as e:
+                    print(f"Error sending heartbeat for scan job {job['job_id']}: {e}")
+        
+        heartbeat_thread = threading.Thread(target=heartbeat)
+        heartbeat_thread.daemon = True
+        heartbeat_thread.start()
+        
+        options = job.get('options') or {}
+        timeout, retries = job['timeout'], options.get("retries")
+        plan = "scan"
+        try:
+            # Hosts believed to be down are skipped, or get one fast pass when demoted
+            plan = self.host_liveness.plan(job['target'], job['ports'], options.get("liveness"), job['scan_type'])
+            if plan == "demote":
+                timeout, retries = min(timeout, NetworkScanner.FIRST_PASS_TIMEOUT), 0
+            
+            if plan == "skip":
+                results, services, status = None, None, "skipped"
+            else:
+                # Open ports are written in small batches as they are found, and
+                # fingerprinted while the rest of the shard is still being scanned
+                result_buffer = PortResultBuffer(
+                    self.db_manager, job['scan_id'], job['target'], job['scan_type'],
+                    job_id=job['job_id'], worker_id=self.worker_id
+                )
+                fingerprinter = ServiceFingerprinter(job['target']) if options.get("fingerprint") else None
+                
+                def on_result(port, status):
+                    result_buffer.on_result(port, status)
+                    if fingerprinter:
+                        fingerprinter.on_result(port, status)
+                
+                results = NetworkScanner.scan_ports_async(
+                    job['scan_type'], job['target'], job['ports'], timeout,
+                    on_result=on_result, retries=retries, sources=options.get("sources")
+                )
+                result_buffer.close()
+                services = fingerprinter.collect() if fingerprinter else None
+                status = "done"
+        except Exception as e:
+            print(f"Error during port scan job {job['job_id']}: {e}")
+            results, services, status = None, None, "failed"
+        finally:
+            job_done.set()
+        
+        if lost.is_set():
+            print(f"Scan job {job['job_id']} was reassigned; discarding results")
+            return
+        
+        if results is not None:
+            try:
+                # One shard without replies does not prove the host is down
+                self.host_liveness.record_scan(job['target'], job['scan_type'], results, allow_dead=False)
+            except Exception as e:
+                print(f"Error recording liveness of {job['target']}: {e}")
+        
+        owned, scan_finished = self.db_manager.complete_scan_job(
+            job['job_id'], self.worker_id, results, status, services, close_missing=plan != "demote"
+        )
+        if owned and scan_finished:
+            self.notify_scan_finished(job['scan_id'])
+    
+    def notify_scan_finished(self, scan_id):
+        """Queue webhook events once every shard of a scan has been stored."""
+        scan = self.db_manager.get_scan(scan_id)
+        if scan is None or scan['status'] != 'completed':
+            return
+        
+        scan_type = scan['scan_type'].replace('port_scan_', '', 1)
+        results = PortStateVector.from_dict({r['port']: r['status'] for r in self.db_manager.get_results(scan_id)})
+        self.webhook_dispatcher.notify_port_scan(
+            scan_id, scan['target'], scan['parameters'].get('ports', []), scan_type, results
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description="Dalang Watcher Scanner Worker")
+    parser.add_argument("--worker-id", help="Unique worker name (default: host-pid-random)")
+    args = parser.parse_args()
+    
+    ScanWorker(create_database_manager(), worker_id=args.worker_id).run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,16 @@
+"""
+Python client for the Dalang Watcher API.
+
+    from dalang_client import DalangClient, AsyncDalangClient
+"""
+
+from dalang_client.client import DalangClient, DalangAPIError
+
+__all__ = ["DalangClient", "AsyncDalangClient", "DalangAPIError"]
+
+def __getattr__(name):
+    # aiohttp is only needed by the async client, so it is imported on first use
+    if name == "AsyncDalangClient":
+        from dalang_client.async_client import AsyncDalangClient
+        return AsyncDalangClient
+    raise AttributeError(f"module 'dalang_client' has no attribute {name!r}")
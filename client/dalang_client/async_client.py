@@ -0,0 +1,133 @@
+import asyncio
+import json
+import os
+import aiohttp
+from dalang_client.client import DEFAULT_API_URL, DalangAPIError
+
+class AsyncDalangClient:
+    """
+    Asynchronous Dalang Watcher API client.
+
+    One aiohttp session with a bounded keep-alive connection pool is shared by
+    every call, and `max_concurrency` caps requests in flight, so thousands of
+    calls can be awaited together without opening thousands of connections.
+    """
+
+    def __init__(self, url=None, api_key=None, max_concurrency=10, timeout=30):
+        """Initialize with explicit settings or use the API_URL and API_KEY environment variables."""
+        self.url = (url or os.environ.get("API_URL", DEFAULT_API_URL)).rstrip("/")
+        self.max_concurrency = max_concurrency
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.headers = {}
+        api_key = api_key if api_key is not None else os.environ.get("API_KEY", "")
+        if api_key:
+            self.headers["X-API-Key"] = api_key
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    @property
+    def session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_concurrency, keepalive_timeout=60),
+                headers=self.headers,
+                timeout=self.timeout
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+    @staticmethod
+    async def _raise_for_error(response):
+        if response.status >= 400:
+            try:
+                message = (await response.json()).get("error")
+            except (aiohttp.ContentTypeError, ValueError):
+                message = await response.text()
+            raise DalangAPIError(response.status, message)
+
+    async def _request(self, method, endpoint, **kwargs):
+        async with self._semaphore:
+            async with self.session.request(method, f"{self.url}{endpoint}", **kwargs) as response:
+                await self._raise_for_error(response)
+                return await response.json()
+
+    async def health(self):
+        return await self._request("GET", "/api/health")
+
+    async def scan_ports(self, target, ports, scan_type="stealth", **options):
+        payload = {"target": target, "ports": ports, "scan_type": scan_type, **options}
+        return await self._request("POST", "/api/scan/ports", json=payload)
+
+    async def scan_many(self, targets, ports, scan_type="stealth", **options):
+        """Start one port scan per target concurrently. Returns responses in target order."""
+        return await asyncio.gather(*(
+            self.scan_ports(target, ports, scan_type, **options) for target in targets
+        ))
+
+    async def scan_bulk(self, targets, ports, scan_type="stealth", **options):
+        payload = {"targets": targets, "ports": ports, "scan_type": scan_type, **options}
+        return await self._request("POST", "/api/scan/bulk", json=payload)
+
+    async def scan_sweep(self, targets, ports, **options):
+        payload = {"targets": targets, "ports": ports, **options}
+        return await self._request("POST", "/api/scan/sweep", json=payload)
+
+    async def get_scans(self, target=None, limit=100, group_id=None):
+        params = {"limit": limit, "target": target, "group_id": group_id}
+        return await self._request("GET", "/api/scans", params={k: v for k, v in params.items() if v is not None})
+
+    async def get_results(self, scan_id=None, target=None):
+        params = {"scan_id": scan_id, "target": target}
+        return await self._request("GET", "/api/results", params={k: v for k, v in params.items() if v is not None})
+
+    async def get_results_batch(self, scan_ids=None, targets=None):
+        payload = {"scan_ids": list(scan_ids or []), "targets": list(targets or [])}
+        return (await self._request("POST", "/api/results/batch", json=payload))["results"]
+
+    async def iter_results_batch(self, scan_ids=None, targets=None):
+        """Async generator that decodes batch results one line at a time as they arrive."""
+        payload = {"scan_ids": list(scan_ids or []), "targets": list(targets or [])}
+        async with self._semaphore:
+            async with self.session.post(
+                f"{self.url}/api/results/batch", json=payload,
+                headers={"Accept": "application/x-ndjson"}
+            ) as response:
+                await self._raise_for_error(response)
+                async for line in response.content:
+                    line = line.strip()
+                    if line:
+                        yield json.loads(line)
+
+    async def get_exposure(self, ports, protocol="TCP", since=None):
+        params = {"port": ",".join(str(p) for p in ports), "protocol": protocol}
+        if since:
+            params["since"] = since
+        return await self._request("GET", "/api/exposure", params=params)
+
+    async def get_hosts(self, network=None, since=None, limit=None):
+        """Hosts seen by passive discovery."""
+        params = {"network": network, "since": since, "limit": limit}
+        response = await self._request("GET", "/api/hosts", params={k: v for k, v in params.items() if v is not None})
+        return response["hosts"]
+
+    async def get_port_state(self, target, at=None, protocol=None):
+        """Ports the target had open at `at` (ISO 8601, default now)."""
+        params = {"target": target, "at": at, "protocol": protocol}
+        return await self._request("GET", "/api/state", params={k: v for k, v in params.items() if v is not None})
+
+    async def get_port_timeline(self, target, since=None, until=None, protocol=None, ports=None):
+        """Intervals during which the target's ports were open, overlapping since..until."""
+        params = {"target": target, "since": since, "until": until, "protocol": protocol}
+        if ports:
+            params["port"] = ",".join(str(p) for p in ports)
+        response = await self._request("GET", "/api/state/timeline", params={k: v for k, v in params.items() if v is not None})
+        return response["intervals"]
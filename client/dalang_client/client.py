@@ -0,0 +1,131 @@
+import json
+import os
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_API_URL = "http://localhost:5000"
+
+class DalangAPIError(Exception):
+    """Raised when the API answers with an error status."""
+
+    def __init__(self, status, message):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+        self.message = message
+
+class DalangClient:
+    """
+    Synchronous Dalang Watcher API client.
+
+    All calls go through one requests.Session with a pooled keep-alive
+    connection adapter, so consecutive requests reuse TCP connections instead
+    of opening one per call.
+    """
+
+    def __init__(self, url=None, api_key=None, pool_size=10, timeout=30):
+        """Initialize with explicit settings or use the API_URL and API_KEY environment variables."""
+        self.url = (url or os.environ.get("API_URL", DEFAULT_API_URL)).rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        api_key = api_key if api_key is not None else os.environ.get("API_KEY", "")
+        if api_key:
+            self.session.headers["X-API-Key"] = api_key
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def _request(self, method, endpoint, **kwargs):
+        response = self.session.request(method, f"{self.url}{endpoint}", timeout=self.timeout, **kwargs)
+        if response.status_code >= 400:
+            try:
+                message = response.json().get("error", response.text)
+            except ValueError:
+                message = response.text
+            raise DalangAPIError(response.status_code, message)
+        return response
+
+    def health(self):
+        return self._request("GET", "/api/health").json()
+
+    def scan_ports(self, target, ports, scan_type="stealth", **options):
+        """Start a port scan. Extra options (timeout, mode, fingerprint, ...) are passed through."""
+        payload = {"target": target, "ports": ports, "scan_type": scan_type, **options}
+        return self._request("POST", "/api/scan/ports", json=payload).json()
+
+    def scan_bulk(self, targets, ports, scan_type="stealth", **options):
+        """Start one scan group over many IPs and CIDRs."""
+        payload = {"targets": targets, "ports": ports, "scan_type": scan_type, **options}
+        return self._request("POST", "/api/scan/bulk", json=payload).json()
+
+    def scan_sweep(self, targets, ports, **options):
+        """Start a stateless randomized sweep of the ports on every host of the given networks."""
+        payload = {"targets": targets, "ports": ports, **options}
+        return self._request("POST", "/api/scan/sweep", json=payload).json()
+
+    def scan_hosts(self, network, fill_gaps=False):
+        payload = {"network": network}
+        if fill_gaps:
+            payload["fill_gaps"] = True
+        return self._request("POST", "/api/scan/hosts", json=payload).json()
+
+    def get_scans(self, target=None, limit=100, group_id=None):
+        params = {"limit": limit, "target": target, "group_id": group_id}
+        return self._request("GET", "/api/scans", params={k: v for k, v in params.items() if v is not None}).json()
+
+    def get_scan_group(self, group_id):
+        return self._request("GET", f"/api/scan/groups/{group_id}").json()
+
+    def get_results(self, scan_id=None, target=None):
+        params = {"scan_id": scan_id, "target": target}
+        return self._request("GET", "/api/results", params={k: v for k, v in params.items() if v is not None}).json()
+
+    def get_results_batch(self, scan_ids=None, targets=None):
+        """Results of many scans and/or targets in one request."""
+        payload = {"scan_ids": list(scan_ids or []), "targets": list(targets or [])}
+        return self._request("POST", "/api/results/batch", json=payload).json()["results"]
+
+    def iter_results_batch(self, scan_ids=None, targets=None):
+        """Like get_results_batch, but decodes results one at a time as they stream in."""
+        payload = {"scan_ids": list(scan_ids or []), "targets": list(targets or [])}
+        response = self._request(
+            "POST", "/api/results/batch", json=payload, stream=True,
+            headers={"Accept": "application/x-ndjson"}
+        )
+        with response:
+            for line in response.iter_lines():
+                if line:
+                    yield json.loads(line)
+
+    def get_exposure(self, ports, protocol="TCP", since=None):
+        params = {"port": ",".join(str(p) for p in ports), "protocol": protocol}
+        if since:
+            params["since"] = since
+        return self._request("GET", "/api/exposure", params=params).json()
+
+    def get_hosts(self, network=None, since=None, limit=None):
+        """Hosts seen by passive discovery."""
+        params = {"network": network, "since": since, "limit": limit}
+        return self._request("GET", "/api/hosts", params={k: v for k, v in params.items() if v is not None}).json()["hosts"]
+
+    def get_port_state(self, target, at=None, protocol=None):
+        """Ports the target had open at `at` (ISO 8601, default now)."""
+        params = {"target": target, "at": at, "protocol": protocol}
+        return self._request("GET", "/api/state", params={k: v for k, v in params.items() if v is not None}).json()
+
+    def get_port_timeline(self, target, since=None, until=None, protocol=None, ports=None):
+        """Intervals during which the target's ports were open, overlapping since..until."""
+        params = {"target": target, "since": since, "until": until, "protocol": protocol}
+        if ports:
+            params["port"] = ",".join(str(p) for p in ports)
+        response = self._request("GET", "/api/state/timeline", params={k: v for k, v in params.items() if v is not None})
+        return response.json()["intervals"]
@@ -14,14 +14,32 @@ $$;
 CREATE EXTENSION IF NOT EXISTS timescaledb CASCADE;
 
 -- Create tables
+CREATE TABLE IF NOT EXISTS scan_groups (
+    group_id SERIAL PRIMARY KEY,
+    scan_type VARCHAR(50),
+    parameters JSONB,
+    target_count INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
 CREATE TABLE IF NOT EXISTS scans (
     scan_id SERIAL PRIMARY KEY,
     scan_type VARCHAR(50),
     target TEXT,
     parameters JSONB,
+    status VARCHAR(20) DEFAULT 'running',
+    completed_at TIMESTAMP,
+    group_id INTEGER REFERENCES scan_groups(group_id),
+    origin TEXT,
+    origin_scan_id INTEGER,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+CREATE INDEX IF NOT EXISTS idx_scans_group ON scans(group_id) WHERE group_id IS NOT NULL;
+
+-- Scans imported from edge nodes, by node name and scan ID on the node
+CREATE UNIQUE INDEX IF NOT EXISTS idx_scans_origin ON scans(origin, origin_scan_id) WHERE origin IS NOT NULL;
+
 CREATE TABLE IF NOT EXISTS scan_results (
     result_id SERIAL,
     scan_id INTEGER REFERENCES scans(scan_id),
@@ -34,8 +52,101 @@ CREATE TABLE IF NOT EXISTS scan_results (
     PRIMARY KEY (result_id, discovered_at)
 );
 
+CREATE TABLE IF NOT EXISTS webhooks (
+    webhook_id SERIAL PRIMARY KEY,
+    url TEXT NOT NULL,
+    events JSONB,
+    secret TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS scan_schedules (
+    schedule_id SERIAL PRIMARY KEY,
+    name TEXT,
+    targets JSONB NOT NULL,
+    ports JSONB NOT NULL,
+    scan_type VARCHAR(20) DEFAULT 'stealth',
+    mode VARCHAR(20) DEFAULT 'full',
+    timeout REAL DEFAULT 1,
+    interval_seconds INTEGER NOT NULL,
+    enabled BOOLEAN DEFAULT TRUE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Queue of port scan shards claimed by scanner workers
+CREATE TABLE IF NOT EXISTS scan_jobs (
+    job_id BIGSERIAL PRIMARY KEY,
+    scan_id INTEGER REFERENCES scans(scan_id),
+    target TEXT,
+    ports JSONB,
+    scan_type VARCHAR(20),
+    timeout REAL,
+    options JSONB,
+    status VARCHAR(20) DEFAULT 'pending',
+    worker_id TEXT,
+    attempts INTEGER DEFAULT 0,
+    claimed_at TIMESTAMP,
+    heartbeat_at TIMESTAMP,
+    completed_at TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_scan_jobs_pending ON scan_jobs(job_id) WHERE status = 'pending';
+CREATE INDEX IF NOT EXISTS idx_scan_jobs_scan ON scan_jobs(scan_id);
+
+-- Which hosts were recently seen up or down, each entry with its own expiry
+CREATE TABLE IF NOT EXISTS host_liveness (
+    target TEXT PRIMARY KEY,
+    alive BOOLEAN NOT NULL,
+    source VARCHAR(20),
+    checked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL
+);
+
+-- Hosts seen on the wire by passive discovery (ARP and DHCP)
+CREATE TABLE IF NOT EXISTS host_inventory (
+    ip TEXT PRIMARY KEY,
+    mac VARCHAR(17),
+    source VARCHAR(20),
+    first_seen TIMESTAMP NOT NULL,
+    last_seen TIMESTAMP NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_host_inventory_last_seen ON host_inventory(last_seen);
+
+-- Inverted index of currently open ports: (protocol, port) -> targets
+CREATE TABLE IF NOT EXISTS port_exposure (
+    protocol VARCHAR(10) NOT NULL,
+    port INTEGER NOT NULL,
+    target TEXT NOT NULL,
+    first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_scan_id INTEGER,
+    PRIMARY KEY (protocol, port, target)
+);
+
+CREATE INDEX IF NOT EXISTS idx_port_exposure_target ON port_exposure(target, protocol);
+
+-- Validity intervals of open ports: when each port of a target was found
+-- open, last seen open and found closed again (NULL while still open)
+CREATE TABLE IF NOT EXISTS port_intervals (
+    interval_id BIGSERIAL PRIMARY KEY,
+    target TEXT NOT NULL,
+    protocol VARCHAR(10) NOT NULL,
+    port INTEGER NOT NULL,
+    opened_at TIMESTAMP NOT NULL,
+    last_seen TIMESTAMP NOT NULL,
+    closed_at TIMESTAMP,
+    last_scan_id INTEGER
+);
+
+CREATE INDEX IF NOT EXISTS idx_port_intervals_target ON port_intervals(target, opened_at, closed_at);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_port_intervals_open ON port_intervals(target, protocol, port) WHERE closed_at IS NULL;
+
 -- Convert scan_results to a TimescaleDB hypertable
 SELECT create_hypertable('scan_results', 'discovered_at', if_not_exists => TRUE);
 
 -- Create an index on target for faster lookups
-CREATE INDEX IF NOT EXISTS idx_scan_results_target ON scan_results(target);
\ No newline at end of file
+CREATE INDEX IF NOT EXISTS idx_scan_results_target ON scan_results(target);
+
+-- Index for finding recent scans of a target (request coalescing, change detection)
+CREATE INDEX IF NOT EXISTS idx_scans_target_type ON scans(target, scan_type, created_at DESC);
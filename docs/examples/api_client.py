@@ -16,6 +16,9 @@ import requests
 # Default API URL (can be overridden with --url parameter or API_URL environment variable)
 DEFAULT_API_URL = "http://localhost:5000"
 
+# One session for all requests, so keep-alive connections are reused
+session = requests.Session()
+
 def get_api_url():
     """Get the API URL from environment variable or use default"""
     return os.environ.get("API_URL", DEFAULT_API_URL)
@@ -36,9 +39,9 @@ def make_request(method, endpoint, data=None, params=None):
     
     try:
         if method == "GET":
-            response = requests.get(url, params=params, headers=headers)
+            response = session.get(url, params=params, headers=headers)
         elif method == "POST":
-            response = requests.post(url, json=data, headers=headers)
+            response = session.post(url, json=data, headers=headers)
         else:
             raise ValueError(f"Unsupported HTTP method: {method}")
         
@@ -76,9 +79,17 @@ def get_results(scan_id=None, target=None):
     
     return make_request("GET", "/api/results", params=params)
 
-def get_scans(limit=10):
+def get_results_batch(scan_ids=None, targets=None):
+    """Get results for many scans and/or targets in one request"""
+    data = {"scan_ids": scan_ids or [], "targets": targets or []}
+    return make_request("POST", "/api/results/batch", data=data)["results"]
+
+def get_scans(limit=10, target=None):
     """Get information about previous scans"""
-    return make_request("GET", "/api/scans", params={"limit": limit})
+    params = {"limit": limit}
+    if target:
+        params["target"] = target
+    return make_request("GET", "/api/scans", params=params)
 
 def display_port_results(results):
     """Display port scan results in a table"""
@@ -158,12 +169,13 @@ def main():
     
     # Results command
     results_parser = subparsers.add_parser("results", help="Get scan results")
-    results_parser.add_argument("--scan-id", "-s", type=int, help="Filter by scan ID")
-    results_parser.add_argument("--target", "-t", help="Filter by target")
+    results_parser.add_argument("--scan-id", "-s", type=int, nargs="+", help="Filter by scan ID (several IDs are fetched in one request)")
+    results_parser.add_argument("--target", "-t", nargs="+", help="Filter by target (several targets are fetched in one request)")
     
     # Scans command
     scans_parser = subparsers.add_parser("scans", help="Get scan information")
     scans_parser.add_argument("--limit", "-l", type=int, default=10, help="Limit number of scans (default: 10)")
+    scans_parser.add_argument("--target", "-t", help="Only scans of this target")
     
     args = parser.parse_args()
     
@@ -194,14 +206,20 @@ def main():
         display_host_results(results)
     
     elif args.command == "results":
-        results = get_results(scan_id=args.scan_id, target=args.target)
+        if args.scan_id and len(args.scan_id) > 1 or args.target and len(args.target) > 1:
+            results = get_results_batch(args.scan_id, args.target)
+        else:
+            results = get_results(
+                scan_id=args.scan_id[0] if args.scan_id else None,
+                target=args.target[0] if args.target else None
+            )
         if "port" in results[0] if results else {}:
             display_port_results(results)
         else:
             display_host_results(results)
     
     elif args.command == "scans":
-        scans = get_scans(limit=args.limit)
+        scans = get_scans(limit=args.limit, target=args.target)
         display_scans(scans)
     
     else:
@@ -14,31 +14,34 @@ import os
 from datetime import datetime, timedelta
 from tabulate import tabulate
 
-API_BASE = "http://localhost:5000"
+API_BASE = os.environ.get("API_URL", "http://localhost:5000")
 
-def get_scan_history(target_ip, days=7):
-    """Get all scans for a specific target IP in the last X days"""
-    scans = requests.get(f"{API_BASE}/api/scans").json()
-    
-    # Filter scans for the target IP and port scans only
-    target_scans = [
-        scan for scan in scans 
-        if scan['target'] == target_ip and 'port_scan' in scan['scan_type']
-    ]
+# One session for all requests, so keep-alive connections are reused
+session = requests.Session()
+if os.environ.get("API_KEY"):
+    session.headers["X-API-Key"] = os.environ["API_KEY"]
+
+def get_scan_history(target_ip, limit=20):
+    """Get the most recent port scans of a target IP, newest first"""
+    scans = session.get(f"{API_BASE}/api/scans", params={"target": target_ip, "limit": limit}).json()
     
-    return target_scans
+    # The server filters by target; keep port scans only
+    return [scan for scan in scans if 'port_scan' in scan['scan_type']]
 
-def get_port_results(scan_id):
-    """Get port scan results for a specific scan ID"""
-    results = requests.get(f"{API_BASE}/api/results?scan_id={scan_id}").json()
+def get_port_results(*scan_ids):
+    """
+    Get the open ports of one or more scans in a single request.
+    Returns {scan_id: {port: info}}.
+    """
+    results = session.post(f"{API_BASE}/api/results/batch", json={"scan_ids": list(scan_ids)}).json()["results"]
     
     # Extract open ports
-    open_ports = {}
+    open_ports = {scan_id: {} for scan_id in scan_ids}
     for result in results:
         if result['status'] == 'Open':
             port = result['port']
             protocol = result['protocol']
-            open_ports[port] = {
+            open_ports[result['scan_id']][port] = {
                 'protocol': protocol,
                 'discovered_at': result['discovered_at']
             }
@@ -55,7 +58,7 @@ def scan_ports(target_ip, port_range, scan_type="connect"):
         ports = port_range if isinstance(port_range, list) else [int(port_range)]
     
     # Run the scan
-    response = requests.post(
+    response = session.post(
         f"{API_BASE}/api/scan/ports",
         json={"target": target_ip, "ports": ports, "scan_type": scan_type}
     ).json()
@@ -83,9 +86,6 @@ def detect_changes(target_ip, port_range="1-1024", scan_type="connect", wait_tim
     print(f"Waiting {wait_time} seconds for scan to complete...")
     time.sleep(wait_time)
     
-    # Get current open ports
-    current_ports = get_port_results(scan_id)
-    
     # Get previous scans
     previous_scans = get_scan_history(target_ip)
     
@@ -98,11 +98,13 @@ def detect_changes(target_ip, port_range="1-1024", scan_type="connect", wait_tim
     
     if not previous_scan:
         print(f"No previous scans found for {target_ip}. This is the baseline scan.")
-        display_current_ports(target_ip, current_ports)
+        display_current_ports(target_ip, get_port_results(scan_id)[scan_id])
         return
     
-    # Get previous open ports
-    previous_ports = get_port_results(previous_scan['scan_id'])
+    # Get current and previous open ports in one request
+    port_results = get_port_results(scan_id, previous_scan['scan_id'])
+    current_ports = port_results[scan_id]
+    previous_ports = port_results[previous_scan['scan_id']]
     
     # Compare and report changes
     new_ports = {port: info for port, info in current_ports.items() if port not in previous_ports}